@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Benchmark the partitioned convolution engine against direct and one-shot
+FFT convolution, and check that all of them agree.
+
+Direct np.convolve is O(N·M) and only run for short inputs (--direct-max).
+
+    python benchmarks/bench_convolution.py
+    python benchmarks/bench_convolution.py --durations 5 60 --blocks 512 4096
+"""
+import os
+import sys
+import argparse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from scipy import signal
+
+from benchmarks.bench_voice_filters import measure
+from benchmarks.signals import speech_like
+from utils.convolution import IMPULSE_RESPONSES, PartitionedConvolver
+
+
+def streamed(conv: PartitionedConvolver, y: np.ndarray) -> np.ndarray:
+    """Run `y` through a fresh stream one block at a time"""
+    stream = conv.stream()
+    B = conv.block_size
+    return np.concatenate([stream.process(y[i:i + B]) for i in range(0, len(y), B)])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--durations", type=float, nargs="+", default=[5, 15, 60])
+    parser.add_argument("--blocks", type=int, nargs="+", default=[1024, 4096])
+    parser.add_argument("--sr", type=int, default=44100)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--direct-max", type=float, default=5, help="longest input (s) for np.convolve")
+    args = parser.parse_args()
+
+    print(f"{'case':<36} {'ms':>9} {'rtf':>8} {'alloc MB':>9} {'max err':>9}")
+    for ir_name, make_ir in IMPULSE_RESPONSES.items():
+        ir = make_ir(args.sr)
+        for duration in args.durations:
+            y = speech_like(duration, args.sr)
+            n = len(y)
+
+            def report(label, fn):
+                seconds, alloc_mb, out = measure(fn, args.repeat)
+                err = float(np.max(np.abs(out[:n] - reference)))
+                print(f"{ir_name}/{duration:g}s {label:<26} {seconds * 1000:>9.1f} "
+                      f"{duration / seconds:>7.1f}x {alloc_mb:>9.1f} {err:>9.1e}")
+
+            reference = signal.fftconvolve(y, ir)[:n]
+            report("scipy fftconvolve", lambda: signal.fftconvolve(y, ir)[:n])
+            report("scipy oaconvolve", lambda: signal.oaconvolve(y, ir)[:n])
+            if duration <= args.direct_max:
+                report("np.convolve (direct)", lambda: np.convolve(y, ir)[:n])
+
+            for block in args.blocks:
+                conv = PartitionedConvolver(ir, block)
+                report(f"partitioned B={block} P={conv.partitions}", lambda: conv.convolve(y))
+                report(f"streamed B={block} ({block / args.sr * 1000:.0f} ms)", lambda: streamed(conv, y))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Compare the in-place float32 echo/radio/robot kernels with the original
+allocating implementations (kept here verbatim as the reference).
+
+    python benchmarks/bench_effects.py --durations 15 60
+"""
+import os
+import sys
+import argparse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import librosa
+from scipy import signal
+
+from benchmarks.bench_voice_filters import measure
+from benchmarks.signals import speech_like
+from utils.dsp_kernels import as_float32, ring_modulate_, normalize_
+from utils.voice_processor import VoiceProcessor
+
+
+def legacy_echo(y, sr):
+    delay = int(0.3 * sr)
+    delay_signal = np.zeros_like(y)
+    delay_signal[delay:] = y[:-delay] * 0.5
+    y = y + delay_signal
+    return librosa.util.normalize(y)
+
+
+def legacy_radio(y, sr):
+    sos = signal.butter(4, [300, 3000], 'bandpass', fs=sr, output='sos')
+    y = signal.sosfilt(sos, y)
+    noise = np.random.normal(0, 0.005, len(y))
+    y = y * 0.9 + noise * 0.1
+    return librosa.util.normalize(y)
+
+
+def legacy_ring(y, sr):
+    t = np.arange(len(y)) / sr
+    modulator = np.sin(2 * np.pi * 50 * t)
+    y = y * (1 + 0.3 * modulator)
+    return librosa.util.normalize(y)
+
+
+def ring(y, sr):
+    # The robot filter minus its (unchanged) librosa pitch shift
+    return normalize_(ring_modulate_(as_float32(y), sr))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--durations", type=float, nargs="+", default=[5, 15, 60])
+    parser.add_argument("--sr", type=int, default=44100)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    processor = VoiceProcessor()
+    cases = [
+        ("echo", legacy_echo, processor._apply_echo_filter),
+        ("radio", legacy_radio, processor._apply_radio_filter),
+        ("ring-mod", legacy_ring, ring),
+    ]
+
+    print(f"{'effect':<10} {'len':>5} {'legacy ms':>10} {'new ms':>8} {'speedup':>8} {'legacy MB':>10} {'new MB':>8}")
+    for duration in args.durations:
+        y = speech_like(duration, args.sr)
+        for name, legacy, current in cases:
+            old_s, old_mb, _ = measure(lambda: legacy(y.copy(), args.sr), args.repeat)
+            new_s, new_mb, _ = measure(lambda: current(y.copy(), args.sr), args.repeat)
+            print(
+                f"{name:<10} {duration:>4g}s {old_s * 1000:>10.1f} {new_s * 1000:>8.1f} "
+                f"{old_s / new_s:>7.1f}x {old_mb:>10.1f} {new_mb:>8.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
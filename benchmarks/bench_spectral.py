@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Measure the single-STFT deep filter chain against the previous one, which
+ran librosa pitch_shift, then time_stretch (an STFT/ISTFT round trip
+each) and a time-domain bass filter. Also sweeps FFT size / hop.
+
+    python benchmarks/bench_spectral.py
+    python benchmarks/bench_spectral.py --durations 15 60 --ffts 1024:256 2048:512
+"""
+import os
+import sys
+import argparse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import librosa
+from scipy import signal
+
+from benchmarks.bench_voice_filters import measure
+from benchmarks.signals import speech_like
+from utils.dsp_kernels import as_float32, butter_sos, normalize_
+from utils.spectral import spectral_chain, bass_shelf
+from utils.voice_params import default_params
+
+
+def legacy_deep(y, sr, params):
+    y = librosa.effects.pitch_shift(y, sr=sr, n_steps=params.pitch, bins_per_octave=24)
+    y = librosa.effects.time_stretch(y, rate=params.speed)
+    y = as_float32(y)
+    y_bass = signal.sosfilt(butter_sos(4, 200, "lowpass", sr), y)
+    y_bass *= np.float32(params.bass / 20)
+    y += y_bass
+    return normalize_(y)
+
+
+def spectral_deep(y, sr, params, n_fft, hop):
+    n = len(y)
+    pitch_rate = 2.0 ** (-params.pitch / 24)
+    stages = [bass_shelf(sr, n_fft, 200 * pitch_rate, params.bass / 20)]
+    y = spectral_chain(y, sr, n_fft=n_fft, hop_length=hop, stages=stages, stretch=pitch_rate * params.speed)
+    y = librosa.resample(y, orig_sr=sr / pitch_rate, target_sr=sr, res_type="soxr_hq")
+    y = librosa.util.fix_length(y, size=int(round(n / params.speed)))
+    return normalize_(as_float32(y))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--durations", type=float, nargs="+", default=[5, 15, 60])
+    parser.add_argument("--ffts", nargs="+", default=["1024:256", "2048:512", "4096:1024"],
+                        help="n_fft:hop pairs for the spectral chain")
+    parser.add_argument("--sr", type=int, default=44100)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    params = default_params()
+    print(f"params: {params}\n")
+    print(f"{'chain':<26} {'len':>5} {'ms':>9} {'rtf':>8} {'alloc MB':>9} {'saving':>7}")
+    for duration in args.durations:
+        y = speech_like(duration, args.sr)
+        legacy_s, legacy_mb, _ = measure(lambda: legacy_deep(y.copy(), args.sr, params), args.repeat)
+        print(f"{'legacy (2 STFTs)':<26} {duration:>4g}s {legacy_s * 1000:>9.1f} "
+              f"{duration / legacy_s:>7.1f}x {legacy_mb:>9.1f}")
+        for pair in args.ffts:
+            n_fft, hop = (int(v) for v in pair.split(":"))
+            seconds, alloc_mb, _ = measure(lambda: spectral_deep(y.copy(), args.sr, params, n_fft, hop), args.repeat)
+            print(f"{f'spectral {n_fft}/{hop}':<26} {duration:>4g}s {seconds * 1000:>9.1f} "
+                  f"{duration / seconds:>7.1f}x {alloc_mb:>9.1f} {1 - seconds / legacy_s:>6.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Per-note transcode overhead: the old pydub path (from_ogg + export, one
+ffmpeg spawn each) against a cold ffmpeg per step, the warm ffmpeg pool
+and the in-process soundfile codec, where libsndfile supports Opus.
+
+Short notes are where spawn and codec start-up dominate, so that is the
+default.
+
+    python benchmarks/bench_transcode.py
+    python benchmarks/bench_transcode.py --durations 3 30 --notes 50
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import subprocess
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from pydub import AudioSegment
+
+from benchmarks.signals import speech_like
+from utils.audio_codec import encode_opus, decode_args
+from utils.transcoder import Transcoder, soundfile_has_opus
+
+SR = 44100
+
+
+def pydub_note(src: str, work_dir: str):
+    audio = AudioSegment.from_ogg(src)
+    audio.export(os.path.join(work_dir, "pydub_out.ogg"), format="ogg")
+
+
+def cold_note(src: str, work_dir: str):
+    with open(src, "rb") as f:
+        pcm = subprocess.run(decode_args(SR), input=f.read(), capture_output=True, check=True).stdout
+    y = np.frombuffer(pcm, dtype=np.float32)
+    encode_opus(y, SR, os.path.join(work_dir, "cold_out.ogg"))
+
+
+def transcoder_note(transcoder: Transcoder):
+    def run(src: str, work_dir: str):
+        y = transcoder.decode_file(src, SR)
+        transcoder.encode(y, SR, os.path.join(work_dir, f"{transcoder.encode_backend}_out.ogg"))
+    return run
+
+
+def per_note(fn, src: str, work_dir: str, notes: int) -> float:
+    """Mean seconds per note over `notes` back-to-back notes (after one warm-up)"""
+    fn(src, work_dir)
+    start = time.perf_counter()
+    for _ in range(notes):
+        fn(src, work_dir)
+    return (time.perf_counter() - start) / notes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--durations", type=float, nargs="+", default=[3, 15])
+    parser.add_argument("--notes", type=int, default=20)
+    args = parser.parse_args()
+
+    warm = Transcoder("ffmpeg", spares=2)
+    cases = [
+        ("pydub (2 spawns)", pydub_note),
+        ("cold ffmpeg (2 spawns)", cold_note),
+        ("warm ffmpeg pool", transcoder_note(warm)),
+    ]
+    in_process = None
+    if soundfile_has_opus():
+        in_process = Transcoder("soundfile")
+        cases.append(("soundfile in-process", transcoder_note(in_process)))
+    else:
+        print("libsndfile without Ogg/Opus: skipping the in-process codec\n")
+
+    work_dir = tempfile.mkdtemp(prefix="bench_transcode_")
+    try:
+        print(f"{'path':<26} {'len':>5} {'ms/note':>9} {'vs pydub':>9}")
+        for duration in args.durations:
+            src = os.path.join(work_dir, f"seed_{duration:g}.ogg")
+            encode_opus(speech_like(duration, 48000), 48000, src)
+            baseline = None
+            for name, fn in cases:
+                seconds = per_note(fn, src, work_dir, args.notes)
+                baseline = baseline or seconds
+                print(f"{name:<26} {duration:>4g}s {seconds * 1000:>9.1f} {baseline / seconds:>8.2f}x")
+        print(f"\nWarm pool health: {warm.health()}")
+    finally:
+        warm.stop()
+        if in_process:
+            in_process.stop()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
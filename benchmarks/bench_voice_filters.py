@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Benchmark the VoiceProcessor filter chain
+
+Times every filter on synthetic speech of several lengths and sample rates,
+plus the full convert path split into decode / DSP / encode. Throughput is
+reported as a realtime factor (seconds of audio processed per second of
+wall time, higher is better).
+
+    python benchmarks/bench_voice_filters.py
+    python benchmarks/bench_voice_filters.py --save benchmarks/baselines/local.json
+    python benchmarks/bench_voice_filters.py --compare benchmarks/baselines/local.json
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import resource
+import tempfile
+import tracemalloc
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.signals import speech_like
+from utils.voice_processor import VoiceProcessor
+
+FILTERS = ["deep", "robot", "radio", "echo", "bass", "room", "hall"]
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak / 1024 / (1024 if sys.platform == "darwin" else 1)
+
+
+def measure(fn, repeat: int):
+    """Best-of-N wall time plus peak traced allocation of one run"""
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak / (1024 * 1024), result
+
+
+def bench_filters(processor, durations, rates, repeat):
+    results = {}
+    for sr in rates:
+        for duration in durations:
+            y = speech_like(duration, sr)
+            for name in FILTERS:
+                # Filters may work in place, so every run gets a fresh copy
+                seconds, alloc_mb, _ = measure(lambda: processor._apply_filter(y.copy(), sr, name), repeat)
+                key = f"filter:{name}@{sr}Hz/{duration:g}s"
+                results[key] = {
+                    "seconds": seconds,
+                    "rtf": duration / seconds,
+                    "alloc_mb": alloc_mb,
+                    "peak_rss_mb": peak_rss_mb(),
+                }
+                print(f"{key:<32} {seconds * 1000:9.1f} ms  rtf {duration / seconds:7.1f}x  alloc {alloc_mb:7.1f} MB")
+    return results
+
+
+def bench_batch(processor, duration, sizes, repeat, sr=44100):
+    """Batched apply_filter_batch vs one _apply_filter call per note"""
+    results = {}
+    for size in sizes:
+        # Slightly different lengths, as queued notes would have
+        notes = [speech_like(duration * (1 + 0.05 * i), sr, seed=i) for i in range(size)]
+        for name in FILTERS:
+            sequential, _, _ = measure(lambda: [processor._apply_filter(y.copy(), sr, name) for y in notes], repeat)
+            batched, alloc_mb, _ = measure(lambda: processor.apply_filter_batch([y.copy() for y in notes], sr, name), repeat)
+            key = f"batch:{name}x{size}/{duration:g}s"
+            results[key] = {
+                "seconds": batched,
+                "rtf": duration * size / batched,
+                "alloc_mb": alloc_mb,
+                "peak_rss_mb": peak_rss_mb(),
+            }
+            print(f"{key:<32} {batched * 1000:9.1f} ms  vs {sequential * 1000:9.1f} ms sequential  ({sequential / batched:4.2f}x)")
+    return results
+
+
+def bench_pipeline(processor, durations, repeat, work_dir):
+    """Full convert path with decode, DSP and encode timed separately"""
+    results = {}
+    for duration in durations:
+        y = speech_like(duration, 48000)
+        # Produce a real OGG voice note to decode
+        source_ogg = processor._encode(y, 48000, os.path.join(work_dir, f"seed_{duration:g}.ogg"))
+
+        stages = {}
+        seconds, alloc_mb, decoded = measure(lambda: processor._decode(source_ogg), repeat)
+        stages["decode"] = (seconds, alloc_mb)
+        pcm, sr = decoded
+
+        seconds, alloc_mb, processed = measure(lambda: processor._apply_filter(pcm.copy(), sr, "deep"), repeat)
+        stages["dsp"] = (seconds, alloc_mb)
+
+        out_ogg = os.path.join(work_dir, f"out_{duration:g}.ogg")
+        seconds, alloc_mb, _ = measure(lambda: processor._encode(processed, sr, out_ogg), repeat)
+        stages["encode"] = (seconds, alloc_mb)
+
+        stages["total"] = (sum(s for s, _ in stages.values()), max(a for _, a in stages.values()))
+        for stage, (seconds, alloc_mb) in stages.items():
+            key = f"pipeline:{stage}/{duration:g}s"
+            results[key] = {
+                "seconds": seconds,
+                "rtf": duration / seconds,
+                "alloc_mb": alloc_mb,
+                "peak_rss_mb": peak_rss_mb(),
+            }
+            print(f"{key:<32} {seconds * 1000:9.1f} ms  rtf {duration / seconds:7.1f}x  alloc {alloc_mb:7.1f} MB")
+    return results
+
+
+def compare(results, baseline_path, tolerance):
+    """Return the cases slower than the baseline by more than `tolerance`"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)["results"]
+
+    regressions = []
+    print(f"\nComparing with {baseline_path} (tolerance {tolerance:.0%})")
+    for key, current in results.items():
+        previous = baseline.get(key)
+        if not previous:
+            continue
+        ratio = current["seconds"] / previous["seconds"]
+        flag = "REGRESSION" if ratio > 1 + tolerance else ""
+        print(f"{key:<32} {ratio:6.2f}x {flag}")
+        if flag:
+            regressions.append(key)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--durations", type=float, nargs="+", default=[5, 15, 60])
+    parser.add_argument("--rates", type=int, nargs="+", default=[16000, 44100, 48000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--skip-pipeline", action="store_true", help="only time the DSP filters")
+    parser.add_argument("--batch-sizes", type=int, nargs="*", default=[2, 4],
+                        help="also time batched DSP at these batch sizes (none to skip)")
+    parser.add_argument("--save", help="write results to this JSON baseline")
+    parser.add_argument("--compare", help="compare against this JSON baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown before flagging")
+    args = parser.parse_args()
+
+    processor = VoiceProcessor()
+    results = bench_filters(processor, args.durations, args.rates, args.repeat)
+    if args.batch_sizes:
+        results.update(bench_batch(processor, min(args.durations), args.batch_sizes, args.repeat))
+
+    if not args.skip_pipeline:
+        work_dir = tempfile.mkdtemp(prefix="bench_")
+        try:
+            results.update(bench_pipeline(processor, args.durations, args.repeat, work_dir))
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"\nPeak RSS: {peak_rss_mb():.1f} MB")
+
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, "w") as f:
+            json.dump({
+                "meta": {
+                    "python": platform.python_version(),
+                    "machine": platform.machine(),
+                    "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+                    "durations": args.durations,
+                    "rates": args.rates,
+                },
+                "results": results,
+            }, f, indent=2)
+        print(f"Saved baseline to {args.save}")
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.tolerance)
+        if regressions:
+            print(f"\n❌ {len(regressions)} regression(s)")
+            sys.exit(1)
+        print("\n✅ No regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,307 @@
+"""
+In-memory stand-ins for Telegram, the UserBot and MongoDB used by the load test
+"""
+import os
+import time
+import random
+import asyncio
+import itertools
+from copy import deepcopy
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from database import user_targets
+
+
+async def _latency(mean: float):
+    """Simulated network latency (exponentially distributed around `mean`)"""
+    if mean > 0:
+        await asyncio.sleep(random.expovariate(1 / mean))
+
+
+class InMemoryDatabase:
+    """Implements the `database.Database` API on plain dicts"""
+
+    def __init__(self, latency: float = 0.002):
+        self.latency = latency
+        self.users: Dict[int, dict] = {}
+        self.groups: Dict[int, dict] = {}
+        self.voices = []
+        self.rate_windows: Dict[str, float] = {}
+
+    async def connect(self):
+        return True
+
+    async def disconnect(self):
+        pass
+
+    async def add_user(self, user_id: int, username: str = None, first_name: str = None):
+        await _latency(self.latency)
+        user_data = {
+            "user_id": user_id,
+            "username": username,
+            "first_name": first_name,
+            "is_active": False,
+            "voice_filter": "deep",
+            "chat_id": None,
+            "group_title": None,
+            "targets": [],
+            "created_at": datetime.now(),
+            "last_seen": datetime.now()
+        }
+        self.users.setdefault(user_id, {}).update(user_data)
+        return user_data
+
+    async def get_user(self, user_id: int):
+        await _latency(self.latency)
+        user = self.users.get(user_id)
+        return deepcopy(user) if user else None
+
+    async def update_user(self, user_id: int, data: Dict):
+        await _latency(self.latency)
+        data["last_seen"] = datetime.now()
+        if user_id in self.users:
+            self.users[user_id].update(data)
+
+    async def set_active(self, user_id: int, active: bool = True):
+        await self.update_user(user_id, {"is_active": active})
+
+    async def set_filter(self, user_id: int, filter_name: str):
+        await self.update_user(user_id, {"voice_filter": filter_name})
+
+    async def set_voice_params(self, user_id: int, params: Dict):
+        await self.update_user(user_id, {"voice_params": params})
+
+    async def set_group(self, user_id: int, chat_id: int, title: str, username: str = None,
+                        add: bool = False):
+        target = {"chat_id": chat_id, "title": title, "username": username}
+        targets = [target]
+        if add:
+            targets = [t for t in user_targets(self.users.get(user_id)) if t["chat_id"] != chat_id] + targets
+        await self._set_targets(user_id, targets)
+        self.groups[chat_id] = {"chat_id": chat_id, "title": title, "username": username, "owner_id": user_id}
+
+    async def remove_target(self, user_id: int, chat_id: int) -> List[Dict]:
+        targets = [t for t in user_targets(self.users.get(user_id)) if t["chat_id"] != chat_id]
+        await self._set_targets(user_id, targets)
+        return targets
+
+    async def _set_targets(self, user_id: int, targets: List[Dict]):
+        primary = targets[0] if targets else {"chat_id": None, "title": None, "username": None}
+        await self.update_user(user_id, {
+            "targets": targets,
+            "chat_id": primary["chat_id"],
+            "group_title": primary["title"],
+            "group_username": primary["username"]
+        })
+
+    async def add_voice_record(self, user_id: int, duration: float, filter_used: str,
+                               cpu_seconds: float = 0.0):
+        await _latency(self.latency)
+        self.voices.append({
+            "user_id": user_id,
+            "duration": duration,
+            "cpu_seconds": cpu_seconds,
+            "filter": filter_used,
+            "timestamp": datetime.now()
+        })
+
+    def _usage_since(self, since: datetime) -> Dict[int, dict]:
+        usage = {}
+        for voice in self.voices:
+            if voice["timestamp"] >= since:
+                entry = usage.setdefault(voice["user_id"], {"voices": 0, "seconds": 0, "cpu_seconds": 0})
+                entry["voices"] += 1
+                entry["seconds"] += voice["duration"]
+                entry["cpu_seconds"] += voice["cpu_seconds"]
+        return usage
+
+    async def get_daily_usage(self, user_id: int):
+        await _latency(self.latency)
+        midnight = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        return self._usage_since(midnight).get(user_id, {"voices": 0, "seconds": 0, "cpu_seconds": 0})
+
+    async def get_top_usage(self, limit: int = 5):
+        await _latency(self.latency)
+        usage = self._usage_since(datetime.now().replace(hour=0, minute=0, second=0, microsecond=0))
+        top = sorted(usage.items(), key=lambda item: item[1]["cpu_seconds"], reverse=True)[:limit]
+        return [{"user_id": user_id, **entry} for user_id, entry in top]
+
+    async def get_user_stats(self, user_id: int):
+        await _latency(self.latency)
+        filter_stats = {}
+        for voice in self.voices:
+            if voice["user_id"] == user_id:
+                filter_stats[voice["filter"]] = filter_stats.get(voice["filter"], 0) + 1
+        return {"total_voices": sum(filter_stats.values()), "filter_stats": filter_stats}
+
+    async def hit_rate_window(self, key: str, cost: float, expires_at: datetime) -> float:
+        await _latency(self.latency)
+        self.rate_windows[key] = self.rate_windows.get(key, 0) + cost
+        return self.rate_windows[key]
+
+    async def get_all_users(self):
+        return [deepcopy(u) for u in self.users.values()]
+
+    async def count_users(self) -> int:
+        await _latency(self.latency)
+        return len(self.users)
+
+    async def iter_user_ids(self, batch_size: int = 500):
+        for user_id in list(self.users):
+            await _latency(self.latency)
+            yield user_id
+
+    async def get_active_users(self):
+        return [deepcopy(u) for u in self.users.values() if u.get("is_active")]
+
+
+class FakeUserBotManager:
+    """Pretends every user is in a voice chat; play_audio just costs upload time"""
+
+    def __init__(self, latency: float = 0.15):
+        self.latency = latency
+        self.clients = {}
+        self.active_chats: Dict[int, List[int]] = {}
+        self.played = 0
+
+    async def start_client(self, user_id: int):
+        return None
+
+    async def join_voice_chat(self, user_id: int, chat_id: int) -> bool:
+        chats = self.active_chats.setdefault(user_id, [])
+        if chat_id not in chats:
+            chats.append(chat_id)
+        return True
+
+    async def leave_voice_chat(self, user_id: int, chat_id: Optional[int] = None) -> bool:
+        if chat_id is None:
+            self.active_chats.pop(user_id, None)
+        elif chat_id in self.active_chats.get(user_id, []):
+            self.active_chats[user_id].remove(chat_id)
+        return True
+
+    async def deliver_audio(self, user_id: int, audio_path: str,
+                            chat_ids: Optional[List[int]] = None) -> Dict[int, Optional[str]]:
+        chat_ids = chat_ids if chat_ids is not None else self.active_chats.get(user_id, [])
+        if user_id not in self.active_chats or not os.path.exists(audio_path):
+            return {chat_id: "UserBot not ready" for chat_id in chat_ids}
+        # One upload, then the sends
+        await _latency(self.latency)
+        await asyncio.gather(*(_latency(self.latency / 5) for _ in chat_ids))
+        self.played += len(chat_ids)
+        return {chat_id: None for chat_id in chat_ids}
+
+    async def play_audio(self, user_id: int, audio_path: str) -> bool:
+        results = await self.deliver_audio(user_id, audio_path)
+        return bool(results) and all(error is None for error in results.values())
+
+    async def stop_client(self, user_id: int):
+        self.active_chats.pop(user_id, None)
+
+    async def stop_all(self):
+        self.active_chats.clear()
+
+
+class _FakeContent:
+    def __init__(self, data: bytes, latency: float):
+        self.data = data
+        self.latency = latency
+
+    async def iter_chunked(self, size: int):
+        for offset in range(0, len(self.data), size):
+            await _latency(self.latency)
+            yield self.data[offset:offset + size]
+
+
+class _FakeResponse:
+    def __init__(self, data: bytes, latency: float):
+        self.content = _FakeContent(data, latency)
+
+    def raise_for_status(self):
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class _FakeSession:
+    def __init__(self, api: "FakeTelegramAPI"):
+        self.api = api
+
+    def get(self, url, **kwargs):
+        self.api.calls["download"] = self.api.calls.get("download", 0) + 1
+        # Spread the simulated transfer time over the chunks
+        return _FakeResponse(self.api.voice_bytes, self.api.latency / 4)
+
+    async def close(self):
+        pass
+
+
+class FakeTelegramAPI:
+    """
+    Replaces `Bot.request`, `Bot.download_file` and the bot's HTTP session so
+    handlers run unchanged without touching the network. Every file download
+    serves `voice_bytes`. The last text sent or edited into each chat is kept
+    in `last_text`, so callers can see how a handler answered.
+    """
+
+    def __init__(self, voice_bytes: bytes, latency: float = 0.03):
+        self.voice_bytes = voice_bytes
+        self.latency = latency
+        self.calls: Dict[str, int] = {}
+        self.last_text: Dict[int, str] = {}
+        self._message_ids = itertools.count(1_000_000)
+
+    def install(self, bot):
+        bot.request = self.request
+        bot.download_file = self.download_file
+        session = _FakeSession(self)
+
+        async def get_session():
+            return session
+        bot.get_session = get_session
+
+    def _message(self, data: dict) -> dict:
+        chat_id = int(data.get("chat_id", 0))
+        return {
+            "message_id": int(data.get("message_id") or next(self._message_ids)),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "text": data.get("text", ""),
+        }
+
+    async def request(self, method, data=None, files=None, **kwargs):
+        data = data or {}
+        self.calls[method] = self.calls.get(method, 0) + 1
+        await _latency(self.latency)
+
+        if method in ("sendMessage", "editMessageText"):
+            self.last_text[int(data.get("chat_id", 0))] = data.get("text", "")
+            return self._message(data)
+        if method == "getFile":
+            file_id = data["file_id"]
+            return {
+                "file_id": file_id,
+                "file_unique_id": file_id,
+                "file_size": len(self.voice_bytes),
+                "file_path": f"voice/{file_id}.oga",
+            }
+        if method == "getMe":
+            return {"id": 1, "is_bot": True, "first_name": "LoadTest", "username": "loadtest_bot"}
+        if method == "answerCallbackQuery":
+            return True
+        raise NotImplementedError(f"FakeTelegramAPI does not implement {method}")
+
+    async def download_file(self, file_path, destination=None, *args, destination_file=None, **kwargs):
+        await _latency(self.latency)
+        target = destination_file or destination
+        if isinstance(target, str):
+            with open(target, "wb") as f:
+                f.write(self.voice_bytes)
+        else:
+            target.write(self.voice_bytes)
+        return target
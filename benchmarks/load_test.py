@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Load test: many simulated users sending voice notes through the real Dispatcher
+
+Telegram's Bot API, the Telethon UserBot and MongoDB are replaced by
+in-memory fakes (benchmarks/fakes.py) with simulated latency; the handlers,
+VoiceService and DSP run unchanged. Concurrency ramps through the given
+levels and each level reports p50/p95/p99 handler latency, throughput and
+event-loop lag. Only notes the bot reports as played count towards latency
+and throughput; "busy" replies (a full DSP queue, quotas) are counted as
+rejected and any other failure reply as an error.
+
+    python benchmarks/load_test.py --levels 10 100 1000 --notes 2
+    python benchmarks/load_test.py --no-dsp   # bot/IO overhead only
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Config is read at import time; never pick up real credentials from .env
+os.environ.update({
+    "BOT_TOKEN": "123456:LOAD-TEST-TOKEN",
+    "API_ID": "1",
+    "API_HASH": "load-test",
+    "OWNER_ID": "1",
+    "METRICS_PORT": "0",
+    # Simulated users send far faster than the per-user throttle allows
+    "THROTTLE_ENABLED": "false",
+})
+
+from benchmarks.fakes import InMemoryDatabase, FakeUserBotManager, FakeTelegramAPI
+from benchmarks.signals import speech_like
+
+# Swap the global singletons before any handler module binds them
+import database
+import utils.userbot_manager as userbot_module
+
+database.db = InMemoryDatabase()
+userbot_module.userbot_manager = FakeUserBotManager()
+
+from aiogram import types
+from bot import bot, dp
+from handlers import messages
+
+FIRST_USER_ID = 10_000_000
+
+
+def percentile(values, q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def make_voice_bytes(seconds: float) -> bytes:
+    """Encode a synthetic voice note once with the real encoder"""
+    work_dir = tempfile.mkdtemp(prefix="loadtest_")
+    processor = messages.voice_service.processor
+    ogg_path = processor._encode(speech_like(seconds, 48000), 48000, os.path.join(work_dir, "seed.ogg"))
+    with open(ogg_path, "rb") as f:
+        data = f.read()
+    processor.cleanup_file(ogg_path)
+    os.rmdir(work_dir)
+    return data
+
+
+async def seed_users(count: int):
+    for i in range(count):
+        user_id = FIRST_USER_ID + i
+        await database.db.add_user(user_id, f"user{i}", "Load")
+        await database.db.set_group(user_id, -100_000 - i, f"Group {i}")
+        await database.db.set_active(user_id, True)
+        await userbot_module.userbot_manager.join_voice_chat(user_id, -100_000 - i)
+
+
+class UpdateFactory:
+    def __init__(self, voice_seconds: int, voice_size: int):
+        self.voice_seconds = voice_seconds
+        self.voice_size = voice_size
+        self.update_id = 0
+
+    def voice(self, user_id: int) -> types.Update:
+        self.update_id += 1
+        file_id = f"voice_{user_id}_{self.update_id}"
+        return types.Update(**{
+            "update_id": self.update_id,
+            "message": {
+                "message_id": self.update_id,
+                "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private"},
+                "from": {"id": user_id, "is_bot": False, "first_name": "Load"},
+                "voice": {
+                    "file_id": file_id,
+                    "file_unique_id": file_id,
+                    "duration": self.voice_seconds,
+                    "mime_type": "audio/ogg",
+                    "file_size": self.voice_size,
+                },
+            },
+        })
+
+
+async def sample_loop_lag(samples: list, interval: float = 0.05):
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        samples.append(loop.time() - start - interval)
+
+
+async def simulated_user(user_id: int, notes: int, think_time: float, factory: UpdateFactory,
+                         api: FakeTelegramAPI, latencies: list, rejected: list, errors: list):
+    for _ in range(notes):
+        # Spread arrivals so a level isn't one synchronised burst
+        await asyncio.sleep(random.uniform(0, think_time))
+        api.last_text.pop(user_id, None)
+        start = time.perf_counter()
+        try:
+            await dp.process_update(factory.voice(user_id))
+        except Exception as e:
+            errors.append(f"{type(e).__name__}: {e}")
+            continue
+        elapsed = time.perf_counter() - start
+
+        # Handlers report failures as the final status text rather than raising
+        reply = api.last_text.get(user_id, "")
+        if reply.startswith("✅"):
+            latencies.append(elapsed)
+        elif reply.startswith(("⏳", "📊")):
+            # Turned away up front (queue full, quota), not processed
+            rejected.append(reply)
+        else:
+            errors.append(reply or "no reply")
+
+
+async def run_level(concurrency: int, args, factory: UpdateFactory, api: FakeTelegramAPI) -> dict:
+    latencies, rejected, errors, lag = [], [], [], []
+    lag_task = asyncio.create_task(sample_loop_lag(lag))
+    start = time.perf_counter()
+    await asyncio.gather(*[
+        simulated_user(FIRST_USER_ID + i, args.notes, args.think_time, factory, api, latencies, rejected, errors)
+        for i in range(concurrency)
+    ])
+    elapsed = time.perf_counter() - start
+    lag_task.cancel()
+
+    return {
+        "concurrency": concurrency,
+        "notes": len(latencies),
+        "rejected": len(rejected),
+        "errors": len(errors),
+        "throughput": len(latencies) / elapsed if elapsed else 0.0,
+        "p50": percentile(latencies, 0.50),
+        "p95": percentile(latencies, 0.95),
+        "p99": percentile(latencies, 0.99),
+        "lag_p99": percentile(lag, 0.99),
+        "lag_max": max(lag, default=0.0),
+        "first_error": errors[0] if errors else "",
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--levels", type=int, nargs="+", default=[10, 50, 200, 1000])
+    parser.add_argument("--notes", type=int, default=2, help="voice notes per simulated user")
+    parser.add_argument("--voice-seconds", type=float, default=5)
+    parser.add_argument("--think-time", type=float, default=1.0, help="max random delay before each note")
+    parser.add_argument("--api-latency", type=float, default=0.03, help="mean Bot API latency (s)")
+    parser.add_argument("--db-latency", type=float, default=0.002, help="mean Mongo latency (s)")
+    parser.add_argument("--upload-latency", type=float, default=0.15, help="mean UserBot upload latency (s)")
+    parser.add_argument("--no-dsp", action="store_true", help="skip DSP to measure bot overhead only")
+    args = parser.parse_args()
+
+    database.db.latency = args.db_latency
+    userbot_module.userbot_manager.latency = args.upload_latency
+
+    voice_bytes = make_voice_bytes(args.voice_seconds)
+    api = FakeTelegramAPI(voice_bytes, latency=args.api_latency)
+    api.install(bot)
+
+    if args.no_dsp:
+        processor = messages.voice_service.processor
+
+        # Still goes through the job queue, but each "render" just writes the seed note
+        def passthrough(signals, sr, filter_type, output_paths, params=None, tier=None):
+            for path in output_paths:
+                with open(path, "wb") as f:
+                    f.write(voice_bytes)
+            return output_paths
+        processor.render_batch = passthrough
+
+    await seed_users(max(args.levels))
+    factory = UpdateFactory(int(args.voice_seconds), len(voice_bytes))
+
+    print(f"{'users':>7} {'notes':>6} {'rej':>5} {'err':>5} {'notes/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'lag p99':>8} {'lag max':>8}")
+    for level in args.levels:
+        r = await run_level(level, args, factory, api)
+        print(
+            f"{r['concurrency']:>7} {r['notes']:>6} {r['rejected']:>5} {r['errors']:>5} {r['throughput']:>8.1f} "
+            f"{r['p50']:>7.2f}s {r['p95']:>7.2f}s {r['p99']:>7.2f}s {r['lag_p99']:>7.3f}s {r['lag_max']:>7.3f}s"
+        )
+        if r["first_error"]:
+            print(f"        first error: {r['first_error']}")
+
+    session = await bot.get_session()
+    await session.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
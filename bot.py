@@ -10,6 +10,30 @@ bot = Bot(token=Config.BOT_TOKEN, parse_mode="HTML")
 storage = MemoryStorage()
 dp = Dispatcher(bot, storage=storage)
 
+# Rate-limited outbound sends and edits
+from utils.outbox import Outbox
+outbox = Outbox(
+    bot, Config.OUTBOX_RATE,
+    chat_rate=Config.OUTBOX_CHAT_RATE,
+    group_rate=Config.OUTBOX_GROUP_RATE,
+    broadcast_rate=Config.BROADCAST_RATE
+)
+
+# Middlewares
+from utils.metrics_middleware import MetricsMiddleware
+dp.middleware.setup(MetricsMiddleware())
+
+if Config.THROTTLE_ENABLED:
+    from database import db
+    from utils.rate_limit import RateLimiter
+    from utils.throttle_middleware import ThrottlingMiddleware
+    dp.middleware.setup(ThrottlingMiddleware(
+        RateLimiter(Config.THROTTLE_RATE, Config.THROTTLE_BURST, store=db if Config.THROTTLE_SHARED else None),
+        costs=Config.THROTTLE_COSTS,
+        buckets=Config.THROTTLE_BUCKETS,
+        exempt=(Config.OWNER_ID,)
+    ))
+
 # Import handlers (they will import dp from here)
 from handlers import commands, messages, callbacks
 
@@ -24,9 +48,22 @@ async def on_startup():
     print(f"👤 Owner: {Config.OWNER_ID}")
     print("=" * 50)
 
+    # Event loop watchdog
+    from utils.loop_monitor import loop_monitor
+    loop_monitor.start()
+
+    # Temp file sweeper
+    from utils.temp_storage import temp_storage
+    temp_storage.start()
+
+    # Prometheus endpoint
+    if Config.METRICS_PORT:
+        from utils.metrics_server import metrics_server
+        await metrics_server.start(Config.METRICS_PORT)
+
     # Send to owner
     try:
-        await bot.send_message(
+        await outbox.send_message(
             Config.OWNER_ID,
             f"✅ Bot started successfully!\n\n"
             f"Username: @{me.username}\n"
@@ -44,3 +81,17 @@ async def on_shutdown():
     # Cleanup
     from utils.userbot_manager import userbot_manager
     await userbot_manager.stop_all()
+
+    await messages.voice_service.jobs.stop()
+
+    from utils.transcoder import transcoder
+    transcoder.stop()
+
+    from utils.metrics_server import metrics_server
+    await metrics_server.stop()
+
+    from utils.loop_monitor import loop_monitor
+    await loop_monitor.stop()
+
+    from utils.temp_storage import temp_storage
+    await temp_storage.stop()
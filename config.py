@@ -17,16 +17,134 @@ class Config:
     # Owner
     OWNER_ID = int(os.getenv("OWNER_ID", 0))
     
-    # Voice Settings
+    # Voice Settings (defaults; users can tune their own with /tune)
     VOICE_PITCH_SHIFT = int(os.getenv("VOICE_PITCH_SHIFT", -4))
     VOICE_BASS_BOOST = int(os.getenv("VOICE_BASS_BOOST", 8))
     VOICE_REVERB = float(os.getenv("VOICE_REVERB", 0.15))
     VOICE_SPEED = float(os.getenv("VOICE_SPEED", 0.92))
     
+    # Spectral pipeline of the deep filter (gate threshold above each bin's noise floor; 0 disables it)
+    STFT_N_FFT = int(os.getenv("STFT_N_FFT", 2048))
+    STFT_HOP = int(os.getenv("STFT_HOP", 512))
+    SPECTRAL_GATE_DB = float(os.getenv("SPECTRAL_GATE_DB", 0))
+    SPECTRAL_GATE_REDUCTION_DB = float(os.getenv("SPECTRAL_GATE_REDUCTION_DB", 12))
+    
+    # Opus encoder (mono, VoIP mode)
+    VOICE_OPUS_BITRATE = int(os.getenv("VOICE_OPUS_BITRATE", 32))  # kbps
+    VOICE_OPUS_FRAME_MS = float(os.getenv("VOICE_OPUS_FRAME_MS", 20))
+    VOICE_OPUS_COMPLEXITY = int(os.getenv("VOICE_OPUS_COMPLEXITY", 10))  # 0-10
+    
+    # Silence trimming before DSP
+    VAD_ENABLED = os.getenv("VAD_ENABLED", "true").lower() in ("1", "true", "yes")
+    VAD_THRESHOLD_DB = float(os.getenv("VAD_THRESHOLD_DB", 12))  # above the note's noise floor
+    VAD_PADDING_MS = float(os.getenv("VAD_PADDING_MS", 200))
+    VAD_MAX_PAUSE = float(os.getenv("VAD_MAX_PAUSE", 0))  # seconds; 0 keeps internal pauses
+    
+    # Preview clip sent to the sender while a long note is still processing
+    PREVIEW_SECONDS = float(os.getenv("PREVIEW_SECONDS", 4))  # 0 disables previews
+    PREVIEW_MIN_SECONDS = float(os.getenv("PREVIEW_MIN_SECONDS", 15))  # shorter notes go out whole
+    
+    # Transcoder: auto (in-process decode when libsndfile has Opus), soundfile or ffmpeg
+    TRANSCODER_BACKEND = os.getenv("TRANSCODER_BACKEND", "auto").lower()
+    TRANSCODER_SPARES = int(os.getenv("TRANSCODER_SPARES", 2))  # warm ffmpeg processes per command
+    TRANSCODER_HEALTH_INTERVAL = float(os.getenv("TRANSCODER_HEALTH_INTERVAL", 30))
+    TRANSCODER_POOL_IDLE = float(os.getenv("TRANSCODER_POOL_IDLE", 300))  # seconds before degraded-tier pools stop
+    # In-process decodes buffer the download; bigger or slower ones stream into ffmpeg instead
+    TRANSCODER_BUFFER_BYTES = int(os.getenv("TRANSCODER_BUFFER_KB", 256)) * 1024
+    TRANSCODER_BUFFER_SECONDS = float(os.getenv("TRANSCODER_BUFFER_SECONDS", 1))
+    TRANSCODER_TIMEOUT = float(os.getenv("TRANSCODER_TIMEOUT", 60))  # seconds before a stuck ffmpeg is killed
+    
+    # DSP job queue
+    DSP_WORKERS = int(os.getenv("DSP_WORKERS", 2))
+    DSP_BATCH_MAX = int(os.getenv("DSP_BATCH_MAX", 4))
+    DSP_BATCH_PAD_RATIO = float(os.getenv("DSP_BATCH_PAD_RATIO", 1.5))  # max longest/shortest in a batch
+    DSP_MAX_QUEUE = int(os.getenv("DSP_MAX_QUEUE", 100))
+    OUTPUT_CACHE_BYTES = int(os.getenv("OUTPUT_CACHE_MB", 32)) * 1024 * 1024
+    PCM_STORE_RAM_BYTES = int(os.getenv("PCM_STORE_RAM_MB", 64)) * 1024 * 1024
+    PCM_STORE_DISK_BYTES = int(os.getenv("PCM_STORE_DISK_MB", 256)) * 1024 * 1024
+    
+    # Per-user, per-handler throttling: token buckets of THROTTLE_BURST refilled at THROTTLE_RATE/s
+    THROTTLE_ENABLED = os.getenv("THROTTLE_ENABLED", "true").lower() in ("1", "true", "yes")
+    THROTTLE_RATE = float(os.getenv("THROTTLE_RATE", 0.5))
+    THROTTLE_BURST = float(os.getenv("THROTTLE_BURST", 10))
+    # handler=cost pairs; unlisted handlers cost 1
+    THROTTLE_COSTS = {
+        name.strip(): float(cost)
+        for name, _, cost in (
+            pair.partition("=") for pair in os.getenv(
+                "THROTTLE_COSTS", "handle_voice=2,handle_replay_callback=2,cmd_on=5,cmd_debug=3,cmd_testuserbot=10"
+            ).split(",")
+        )
+        if name.strip() and cost.strip()
+    }
+    # handler=handler pairs sharing one bucket (replays cost the same DSP as new notes)
+    THROTTLE_BUCKETS = {
+        name.strip(): bucket.strip()
+        for name, _, bucket in (
+            pair.partition("=") for pair in os.getenv(
+                "THROTTLE_BUCKETS", "handle_replay_callback=handle_voice"
+            ).split(",")
+        )
+        if name.strip() and bucket.strip()
+    }
+    THROTTLE_SHARED = os.getenv("THROTTLE_SHARED", "false").lower() in ("1", "true", "yes")  # Mongo-backed windows
+    
+    # Per-user daily quotas (0 = unlimited; the owner is exempt)
+    DAILY_AUDIO_SECONDS = int(os.getenv("DAILY_AUDIO_SECONDS", 0))  # seconds of voice sent per day
+    DAILY_CPU_SECONDS = float(os.getenv("DAILY_CPU_SECONDS", 0))  # DSP worker CPU seconds per day
+    
+    # Load-adaptive quality: queue depths (with every worker busy) for the reduced and economy tiers
+    QUALITY_ADAPTIVE = os.getenv("QUALITY_ADAPTIVE", "true").lower() in ("1", "true", "yes")
+    QUALITY_TIER_DEPTHS = [int(d) for d in os.getenv("QUALITY_TIER_DEPTHS", "4,12").split(",") if d.strip()]
+    QUALITY_BUSY_UTILISATION = float(os.getenv("QUALITY_BUSY_UTILISATION", 1.0))
+    QUALITY_RECOVER_RATIO = float(os.getenv("QUALITY_RECOVER_RATIO", 0.5))
+    QUALITY_HOLD_SECONDS = float(os.getenv("QUALITY_HOLD_SECONDS", 15))
+    
+    # Outbound Bot API pacing: (per second, burst) overall, per private chat, per group
+    OUTBOX_RATE = (float(os.getenv("OUTBOX_RATE", 25)), float(os.getenv("OUTBOX_BURST", 25)))
+    OUTBOX_CHAT_RATE = (float(os.getenv("OUTBOX_CHAT_RATE", 1)), float(os.getenv("OUTBOX_CHAT_BURST", 3)))
+    OUTBOX_GROUP_RATE = (float(os.getenv("OUTBOX_GROUP_RATE", 0.33)), float(os.getenv("OUTBOX_GROUP_BURST", 3)))
+    # Broadcasts get their own lower rate, leaving OUTBOX_RATE headroom for everything else
+    BROADCAST_RATE = (float(os.getenv("BROADCAST_RATE", 15)), float(os.getenv("BROADCAST_BURST", 15)))
+    BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", 15))
+    
+    # Telethon RPC pacing: (per second, burst) by default, per method and per chat
+    TELETHON_RPC_RATE = (float(os.getenv("TELETHON_RPC_RATE", 5)), float(os.getenv("TELETHON_RPC_BURST", 10)))
+    TELETHON_METHOD_RATES = {
+        name.strip(): tuple(float(v) for v in rate.split(":", 1))
+        for name, _, rate in (
+            pair.partition("=") for pair in os.getenv(
+                "TELETHON_METHOD_RATES", "send_file=1:3,send_message=1:3,JoinGroupCallRequest=0.2:2"
+            ).split(",")
+        )
+        if name.strip() and ":" in rate
+    }
+    TELETHON_CHAT_RATE = (float(os.getenv("TELETHON_CHAT_RATE", 0.5)), float(os.getenv("TELETHON_CHAT_BURST", 3)))
+    TELETHON_RPC_DEADLINE = float(os.getenv("TELETHON_RPC_DEADLINE", 60))  # seconds a call may wait and retry
+    TELETHON_MAX_FLOOD_WAIT = float(os.getenv("TELETHON_MAX_FLOOD_WAIT", 30))  # longer FloodWaits fail at once
+    
     # Bot Settings
     LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+    LOG_MAX_BYTES = int(os.getenv("LOG_MAX_MB", 10)) * 1024 * 1024
+    LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", 5))
+    LOG_RATE_WINDOW = float(os.getenv("LOG_RATE_WINDOW", 60))
+    LOG_RATE_BURST = int(os.getenv("LOG_RATE_BURST", 5))
     MAX_VOICE_SIZE = int(os.getenv("MAX_VOICE_SIZE", 20)) * 1024 * 1024
     CLEANUP_HOURS = int(os.getenv("CLEANUP_HOURS", 24))
+    TEMP_QUOTA_BYTES = int(os.getenv("TEMP_QUOTA_MB", 500)) * 1024 * 1024
+    TEMP_JOB_RESERVE = int(os.getenv("TEMP_JOB_RESERVE_MB", 16)) * 1024 * 1024
+    TEMP_SWEEP_MINUTES = float(os.getenv("TEMP_SWEEP_MINUTES", 10))
+    MAX_TARGETS = int(os.getenv("MAX_TARGETS", 5))  # groups one user's voice can fan out to
+    FANOUT_CONCURRENCY = int(os.getenv("FANOUT_CONCURRENCY", 3))  # concurrent sends per note
+    DOWNLOAD_RETRIES = int(os.getenv("DOWNLOAD_RETRIES", 3))
+    DOWNLOAD_BACKOFF = float(os.getenv("DOWNLOAD_BACKOFF", 0.5))
+    DOWNLOAD_TIMEOUT = float(os.getenv("DOWNLOAD_TIMEOUT", 60))
+    DOWNLOAD_CHUNK_SIZE = int(os.getenv("DOWNLOAD_CHUNK_KB", 64)) * 1024
+    
+    # Monitoring (0 disables the /metrics HTTP endpoint)
+    METRICS_PORT = int(os.getenv("METRICS_PORT", 0))
+    LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", 0.1))
+    LOOP_STALL_THRESHOLD = float(os.getenv("LOOP_STALL_THRESHOLD", 0.5))
     
     @classmethod
     def debug_info(cls):
@@ -122,7 +240,8 @@ class Config:
             ("VOICE_SPEED", cls.VOICE_SPEED, False),
             ("LOG_LEVEL", cls.LOG_LEVEL, False),
             ("MAX_VOICE_SIZE", cls.MAX_VOICE_SIZE // (1024*1024), False),
-            ("CLEANUP_HOURS", cls.CLEANUP_HOURS, False)
+            ("CLEANUP_HOURS", cls.CLEANUP_HOURS, False),
+            ("METRICS_PORT", cls.METRICS_PORT, False)
         ]
         
         status = []
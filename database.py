@@ -1,13 +1,50 @@
 # database.py
 from motor.motor_asyncio import AsyncIOMotorClient
 from datetime import datetime
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
+from pymongo import monitoring, ReturnDocument
 from pymongo.errors import DuplicateKeyError, OperationFailure
 from config import Config
+from utils.metrics import MONGO_COMMAND_SECONDS, MONGO_COMMAND_FAILURES
 import logging
 
 logger = logging.getLogger(__name__)
 
+
+class CommandMetricsListener(monitoring.CommandListener):
+    """Feeds MongoDB command latency into the metrics registry"""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        MONGO_COMMAND_SECONDS.observe(event.duration_micros / 1e6, command=event.command_name)
+
+    def failed(self, event):
+        MONGO_COMMAND_SECONDS.observe(event.duration_micros / 1e6, command=event.command_name)
+        MONGO_COMMAND_FAILURES.inc(command=event.command_name)
+
+
+def _midnight() -> datetime:
+    """Start of today, in the same local time as voice record timestamps"""
+    return datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def user_targets(user: Optional[Dict]) -> List[Dict]:
+    """Groups a user's voice goes to; users saved before multi-target support only have chat_id"""
+    if not user:
+        return []
+    if user.get("targets"):
+        return user["targets"]
+    if user.get("chat_id"):
+        return [{
+            "chat_id": user["chat_id"],
+            "title": user.get("group_title"),
+            "username": user.get("group_username")
+        }]
+    return []
+
+
 class Database:
     def __init__(self):
         self.client: Optional[AsyncIOMotorClient] = None
@@ -15,7 +52,10 @@ class Database:
         
     async def connect(self):
         """Connect to MongoDB and create indexes with robust fallbacks."""
-        self.client = AsyncIOMotorClient(Config.MONGO_URI)
+        self.client = AsyncIOMotorClient(
+            Config.MONGO_URI,
+            event_listeners=[CommandMetricsListener()]
+        )
         self.db = self.client[Config.DB_NAME]
         
         # users: unique user_id
@@ -77,6 +117,10 @@ class Database:
         # voices: compound index for fast queries by user and time
         await self.db.voices.create_index([("user_id", 1), ("timestamp", -1)])
         
+        # rate_limits: shared throttling windows, removed by Mongo once expired
+        if Config.THROTTLE_SHARED:
+            await self.db.rate_limits.create_index("expires_at", expireAfterSeconds=0)
+        
         return True
         
     async def disconnect(self):
@@ -94,6 +138,7 @@ class Database:
             "voice_filter": "deep",
             "chat_id": None,
             "group_title": None,
+            "targets": [],
             "created_at": datetime.now(),
             "last_seen": datetime.now()
         }
@@ -120,12 +165,19 @@ class Database:
     async def set_filter(self, user_id: int, filter_name: str):
         await self.update_user(user_id, {"voice_filter": filter_name})
         
-    async def set_group(self, user_id: int, chat_id: int, title: str, username: str = None):
-        await self.update_user(user_id, {
-            "chat_id": chat_id,
-            "group_title": title,
-            "group_username": username
-        })
+    async def set_voice_params(self, user_id: int, params: Dict):
+        await self.update_user(user_id, {"voice_params": params})
+        
+    async def set_group(self, user_id: int, chat_id: int, title: str, username: str = None,
+                        add: bool = False):
+        """Set the user's target group, or with `add` append it to their targets"""
+        target = {"chat_id": chat_id, "title": title, "username": username}
+        if add:
+            user = await self.get_user(user_id)
+            targets = [t for t in user_targets(user) if t["chat_id"] != chat_id] + [target]
+        else:
+            targets = [target]
+        await self._set_targets(user_id, targets)
         
         # Also save to groups collection
         await self.db.groups.update_one(
@@ -142,15 +194,66 @@ class Database:
             upsert=True
         )
         
+    async def remove_target(self, user_id: int, chat_id: int) -> List[Dict]:
+        user = await self.get_user(user_id)
+        targets = [t for t in user_targets(user) if t["chat_id"] != chat_id]
+        await self._set_targets(user_id, targets)
+        return targets
+        
+    async def _set_targets(self, user_id: int, targets: List[Dict]):
+        # chat_id / group_title mirror the first target for code that expects a single group
+        primary = targets[0] if targets else {"chat_id": None, "title": None, "username": None}
+        await self.update_user(user_id, {
+            "targets": targets,
+            "chat_id": primary["chat_id"],
+            "group_title": primary["title"],
+            "group_username": primary["username"]
+        })
+        
     # Stats
-    async def add_voice_record(self, user_id: int, duration: int, filter_used: str):
+    async def add_voice_record(self, user_id: int, duration: float, filter_used: str,
+                               cpu_seconds: float = 0.0):
         await self.db.voices.insert_one({
             "user_id": user_id,
             "duration": duration,
+            "cpu_seconds": cpu_seconds,
             "filter": filter_used,
             "timestamp": datetime.now()
         })
         
+    async def get_daily_usage(self, user_id: int) -> Dict:
+        """Notes, audio seconds and DSP CPU seconds recorded for the user since midnight"""
+        pipeline = [
+            {"$match": {"user_id": user_id, "timestamp": {"$gte": _midnight()}}},
+            {"$group": {
+                "_id": None,
+                "voices": {"$sum": 1},
+                "seconds": {"$sum": "$duration"},
+                "cpu_seconds": {"$sum": "$cpu_seconds"}
+            }}
+        ]
+        async for doc in self.db.voices.aggregate(pipeline):
+            return {"voices": doc["voices"], "seconds": doc["seconds"], "cpu_seconds": doc["cpu_seconds"]}
+        return {"voices": 0, "seconds": 0, "cpu_seconds": 0}
+        
+    async def get_top_usage(self, limit: int = 5) -> List[Dict]:
+        """Today's heaviest DSP users, by CPU seconds"""
+        pipeline = [
+            {"$match": {"timestamp": {"$gte": _midnight()}}},
+            {"$group": {
+                "_id": "$user_id",
+                "voices": {"$sum": 1},
+                "seconds": {"$sum": "$duration"},
+                "cpu_seconds": {"$sum": "$cpu_seconds"}
+            }},
+            {"$sort": {"cpu_seconds": -1}},
+            {"$limit": limit}
+        ]
+        return [
+            {"user_id": doc["_id"], "voices": doc["voices"], "seconds": doc["seconds"], "cpu_seconds": doc["cpu_seconds"]}
+            async for doc in self.db.voices.aggregate(pipeline)
+        ]
+        
     async def get_user_stats(self, user_id: int):
         count = await self.db.voices.count_documents({"user_id": user_id})
         
@@ -171,10 +274,30 @@ class Database:
             "filter_stats": filter_stats
         }
         
+    # Throttling
+    async def hit_rate_window(self, key: str, cost: float, expires_at: datetime) -> float:
+        """Add `cost` to a shared rate limit window and return its new total"""
+        doc = await self.db.rate_limits.find_one_and_update(
+            {"_id": key},
+            {"$inc": {"used": cost}, "$setOnInsert": {"expires_at": expires_at}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return doc["used"]
+        
     async def get_all_users(self):
         cursor = self.db.users.find({})
         return await cursor.to_list(length=None)
         
+    async def count_users(self) -> int:
+        return await self.db.users.count_documents({})
+        
+    async def iter_user_ids(self, batch_size: int = 500):
+        """Every user_id, streamed from a cursor rather than loaded at once"""
+        cursor = self.db.users.find({}, {"user_id": 1, "_id": 0}).batch_size(batch_size)
+        async for doc in cursor:
+            yield doc["user_id"]
+            
     async def get_active_users(self):
         cursor = self.db.users.find({"is_active": True})
         return await cursor.to_list(length=None)
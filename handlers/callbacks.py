@@ -3,14 +3,20 @@
 Callback query handlers (Aiogram v2)
 """
 from aiogram import types
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+from aiogram.utils.exceptions import MessageNotModified
 from database import db
+from utils.userbot_manager import userbot_manager
+from utils.voice_params import PARAM_SPECS, default_params, known_filter, params_from_user, step_param
+from handlers.commands import TUNE_TEXT, groups_view, tune_keyboard
+from handlers.messages import voice_service
 from bot import dp
 
 
 @dp.callback_query_handler(lambda c: c.data and c.data.startswith('filter_'))
 async def handle_filter_callback(callback_query: types.CallbackQuery):
     """Handle filter selection"""
-    filter_type = callback_query.data.split('_')[1]
+    filter_type = known_filter(callback_query.data.split('_')[1])
     user_id = callback_query.from_user.id
 
     await db.set_filter(user_id, filter_type)
@@ -20,11 +26,86 @@ async def handle_filter_callback(callback_query: types.CallbackQuery):
         "robot": "🤖 Robot",
         "radio": "📻 Radio",
         "echo": "🌌 Echo",
-        "bass": "🎵 Bass Boost"
+        "bass": "🎵 Bass Boost",
+        "room": "🏠 Room",
+        "hall": "🏛️ Hall"
     }
 
+    # Offer a replay only if there is a last note to re-filter
+    keyboard = None
+    if voice_service.pcm.has(user_id):
+        keyboard = InlineKeyboardMarkup().add(
+            InlineKeyboardButton("🔁 Replay last note with this filter", callback_data="replay_last")
+        )
+
     await callback_query.message.edit_text(
         f"✅ Filter updated to: <b>{filter_names.get(filter_type, 'Deep')}</b>\n\n"
-        f"Now send a voice note to test!"
+        f"Now send a voice note to test!",
+        reply_markup=keyboard
     )
     await callback_query.answer()
+
+
+@dp.callback_query_handler(lambda c: c.data == 'replay_last')
+async def handle_replay_callback(callback_query: types.CallbackQuery):
+    """Re-filter the last voice note without re-downloading it"""
+    await callback_query.answer("🔮 Processing your last voice note...")
+    await callback_query.message.edit_text("🔮 Processing your last voice note...")
+
+    success, result = await voice_service.replay_last(callback_query.from_user.id)
+
+    await callback_query.message.edit_text(result)
+
+
+@dp.callback_query_handler(lambda c: c.data and c.data.startswith('tune_'))
+async def handle_tune_callback(callback_query: types.CallbackQuery):
+    """Step a deep voice parameter up/down, or reset all of them"""
+    action = callback_query.data[len('tune_'):]
+    if action == "noop":
+        await callback_query.answer()
+        return
+
+    user_id = callback_query.from_user.id
+    if action == "reset":
+        params = default_params()
+    else:
+        name, _, direction = action.rpartition('_')
+        if name not in PARAM_SPECS or direction not in ("up", "down"):
+            await callback_query.answer()
+            return
+        user = await db.get_user(user_id)
+        current = params_from_user(user)
+        params = step_param(current, name, 1 if direction == "up" else -1)
+        if params == current:
+            await callback_query.answer("Limit reached")
+            return
+
+    await db.set_voice_params(user_id, params.as_dict())
+
+    try:
+        await callback_query.message.edit_text(TUNE_TEXT, reply_markup=tune_keyboard(params))
+    except MessageNotModified:
+        # Reset while already at the defaults
+        pass
+    await callback_query.answer()
+
+
+@dp.callback_query_handler(lambda c: c.data and c.data.startswith('rmgc_'))
+async def handle_remove_group_callback(callback_query: types.CallbackQuery):
+    """Remove one target group and leave its voice chat"""
+    user_id = callback_query.from_user.id
+    try:
+        chat_id = int(callback_query.data[len('rmgc_'):])
+    except ValueError:
+        await callback_query.answer()
+        return
+
+    targets = await db.remove_target(user_id, chat_id)
+    await userbot_manager.leave_voice_chat(user_id, chat_id)
+
+    if targets:
+        text, keyboard = groups_view(targets)
+        await callback_query.message.edit_text(text, reply_markup=keyboard)
+    else:
+        await callback_query.message.edit_text("No groups left. Use /setgc to set one.")
+    await callback_query.answer("Group removed")
@@ -1,16 +1,19 @@
 """
 Command handlers (Aiogram v2)
 """
+from html import escape
+
 from aiogram import types
 from aiogram.dispatcher import FSMContext
 from aiogram.dispatcher.filters import Command
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 
 from config import Config
-from database import db
+from database import db, user_targets
 from utils.userbot_manager import userbot_manager
+from utils.voice_params import PARAM_SPECS, VoiceParams, params_from_user, format_param
 from handlers.states import UserStates
-from bot import dp  # ✅ yahi se main Dispatcher le rahe hain, naya nahi bana rahe
+from bot import dp, outbox  # ✅ yahi se main Dispatcher le rahe hain, naya nahi bana rahe
 
 
 @dp.message_handler(Command("start"), chat_type=types.ChatType.PRIVATE)
@@ -38,7 +41,10 @@ I convert your voice to Instagram/TikTok trending deep voice and play in voice c
 /off - Deactivate bot
 /stop - Leave VC
 /setgc - Set group chat
+/addgc - Add another group
+/groups - List/remove groups
 /filter - Change voice filter
+/tune - Tune pitch, bass, reverb & speed
 /status - Check status
 /debug - Debug UserBot status
 /configcheck - Check config
@@ -67,7 +73,8 @@ async def cmd_on(message: types.Message):
         await message.reply("Please use /start first!")
         return
 
-    if not user.get("chat_id"):
+    targets = user_targets(user)
+    if not targets:
         await message.reply("Please set group chat first using /setgc")
         return
 
@@ -78,12 +85,15 @@ async def cmd_on(message: types.Message):
     # Activate
     await db.set_active(user_id, True)
 
-    # Join VC
-    chat_id = user["chat_id"]
-    success = await userbot_manager.join_voice_chat(user_id, chat_id)
+    # Join VC in every target group
+    joined = 0
+    for target in targets:
+        joined += await userbot_manager.join_voice_chat(user_id, target["chat_id"])
 
-    if success:
+    if joined == len(targets):
         await message.reply("✅ Bot activated and joined voice chat!")
+    elif joined:
+        await message.reply(f"⚠️ Bot activated but joined only {joined}/{len(targets)} voice chats. Check permissions.")
     else:
         await message.reply("⚠️ Bot activated but couldn't join VC. Check permissions.")
 
@@ -115,9 +125,51 @@ async def cmd_stop(message: types.Message):
 async def cmd_setgc(message: types.Message, state: FSMContext):
     """Set group chat"""
     await UserStates.waiting_for_gc_link.set()
+    await state.update_data(add=False)
     await message.reply("Please send your group link (e.g., https://t.me/groupname or @groupname):")
 
 
+def groups_view(targets):
+    """Text and remove-buttons for the /groups list"""
+    keyboard = InlineKeyboardMarkup(row_width=1)
+    for target in targets:
+        keyboard.add(InlineKeyboardButton(
+            f"❌ {target.get('title') or target['chat_id']}", callback_data=f"rmgc_{target['chat_id']}"
+        ))
+
+    lines = [f"• {escape(str(t.get('title') or t['chat_id']))}" for t in targets]
+    text = (
+        f"👥 <b>Your Groups ({len(targets)}/{Config.MAX_TARGETS}):</b>\n\n" + "\n".join(lines) +
+        "\n\nVoice notes go to all of them. Tap a group to remove it."
+    )
+    return text, keyboard
+
+
+@dp.message_handler(Command("addgc"), chat_type=types.ChatType.PRIVATE)
+async def cmd_addgc(message: types.Message, state: FSMContext):
+    """Add another target group chat"""
+    user = await db.get_user(message.from_user.id)
+    if len(user_targets(user)) >= Config.MAX_TARGETS:
+        await message.reply(f"❌ You already have {Config.MAX_TARGETS} groups. Remove one with /groups first.")
+        return
+
+    await UserStates.waiting_for_gc_link.set()
+    await state.update_data(add=True)
+    await message.reply("Please send the link of the group to add (e.g., https://t.me/groupname or @groupname):")
+
+
+@dp.message_handler(Command("groups"), chat_type=types.ChatType.PRIVATE)
+async def cmd_groups(message: types.Message):
+    """List target groups, with buttons to remove them"""
+    targets = user_targets(await db.get_user(message.from_user.id))
+    if not targets:
+        await message.reply("No groups set. Use /setgc first!")
+        return
+
+    text, keyboard = groups_view(targets)
+    await message.reply(text, reply_markup=keyboard)
+
+
 @dp.message_handler(state=UserStates.waiting_for_gc_link, chat_type=types.ChatType.PRIVATE)
 async def process_gc_link(message: types.Message, state: FSMContext):
     """Process group link"""
@@ -140,15 +192,23 @@ async def process_gc_link(message: types.Message, state: FSMContext):
         chat = await bot.get_chat(f"@{username}")
 
         # Save to DB
+        data = await state.get_data()
+        previous = [] if data.get("add") else user_targets(await db.get_user(user_id))
         await db.set_group(
             user_id=user_id,
             chat_id=chat.id,
             title=chat.title,
-            username=username
+            username=username,
+            add=data.get("add", False)
         )
 
+        # /setgc replaces the targets, so leave the voice chats of the groups it dropped
+        for target in previous:
+            if target["chat_id"] != chat.id:
+                await userbot_manager.leave_voice_chat(user_id, target["chat_id"])
+
         await message.reply(
-            f"✅ Group set successfully!\n\n"
+            f"✅ Group {'added' if data.get('add') else 'set'} successfully!\n\n"
             f"<b>Group:</b> {chat.title}\n"
             f"<b>ID:</b> <code>{chat.id}</code>\n\n"
             f"Now use /on to activate!"
@@ -172,7 +232,9 @@ async def cmd_filter(message: types.Message):
         ("🤖 Robot", "robot"),
         ("📻 Radio", "radio"),
         ("🌌 Echo", "echo"),
-        ("🎵 Bass", "bass")
+        ("🎵 Bass", "bass"),
+        ("🏠 Room", "room"),
+        ("🏛️ Hall", "hall")
     ]
 
     for name, value in filters:
@@ -184,11 +246,47 @@ async def cmd_filter(message: types.Message):
         "• <b>Robot</b>: Robotic effect\n"
         "• <b>Radio</b>: AM radio effect\n"
         "• <b>Echo</b>: Echo/Delay effect\n"
-        "• <b>Bass</b>: Bass boosted",
+        "• <b>Bass</b>: Bass boosted\n"
+        "• <b>Room</b>: Small room ambience\n"
+        "• <b>Hall</b>: Concert hall reverb",
         reply_markup=keyboard
     )
 
 
+def tune_keyboard(params: VoiceParams) -> InlineKeyboardMarkup:
+    """One ➖ value ➕ row per parameter"""
+    keyboard = InlineKeyboardMarkup(row_width=3)
+    for name, spec in PARAM_SPECS.items():
+        keyboard.row(
+            InlineKeyboardButton("➖", callback_data=f"tune_{name}_down"),
+            InlineKeyboardButton(
+                f"{spec.label}: {format_param(name, getattr(params, name))}",
+                callback_data="tune_noop"
+            ),
+            InlineKeyboardButton("➕", callback_data=f"tune_{name}_up"),
+        )
+    keyboard.row(InlineKeyboardButton("↩️ Reset", callback_data="tune_reset"))
+    return keyboard
+
+
+TUNE_TEXT = (
+    "🎚️ <b>Tune Deep Voice</b>\n\n"
+    "Adjust pitch, bass, reverb and speed for the <b>Deep</b> filter.\n"
+    "Changes apply to your next voice note."
+)
+
+
+@dp.message_handler(Command("tune"), chat_type=types.ChatType.PRIVATE)
+async def cmd_tune(message: types.Message):
+    """Edit per-user deep voice parameters"""
+    user = await db.get_user(message.from_user.id)
+    if not user:
+        await message.reply("Please use /start first!")
+        return
+
+    await message.reply(TUNE_TEXT, reply_markup=tune_keyboard(params_from_user(user)))
+
+
 @dp.message_handler(Command("status"), chat_type=types.ChatType.PRIVATE)
 async def cmd_status(message: types.Message):
     """Check bot status"""
@@ -199,13 +297,16 @@ async def cmd_status(message: types.Message):
         await message.reply("Please use /start first!")
         return
 
+    targets = user_targets(user)
+    groups = "".join(f"\n• {escape(str(t.get('title') or t['chat_id']))}" for t in targets) or " Not set"
+
     status_text = f"""
 📊 <b>Bot Status</b>
 
 <b>User:</b> @{message.from_user.username or 'N/A'}
 <b>User ID:</b> <code>{user_id}</code>
 
-<b>Group:</b> {user.get('group_title', 'Not set')}
+<b>Groups ({len(targets)}/{Config.MAX_TARGETS}):</b>{groups}
 <b>Filter:</b> {user.get('voice_filter', 'deep').title()}
 <b>Status:</b> {'🟢 Active' if user.get('is_active') else '🔴 Inactive'}
 """
@@ -240,9 +341,74 @@ async def cmd_stats(message: types.Message):
     for filter_name, count in stats.get('filter_stats', {}).items():
         stats_text += f"• {filter_name.title()}: {count}\n"
 
+    top_usage = await db.get_top_usage()
+    if top_usage:
+        stats_text += "\n<b>Top DSP Usage Today:</b>\n"
+        for usage in top_usage:
+            stats_text += (
+                f"• <code>{usage['user_id']}</code>: {usage['voices']} notes, "
+                f"{usage['seconds']:.0f}s audio, {usage['cpu_seconds']:.1f}s CPU\n"
+            )
+
     await message.reply(stats_text)
 
 
+@dp.message_handler(Command("broadcast"), chat_type=types.ChatType.PRIVATE)
+async def cmd_broadcast(message: types.Message):
+    """Send a message to every user, streaming them from the database"""
+    if message.from_user.id != Config.OWNER_ID:
+        await message.reply("❌ Owner only command!")
+        return
+
+    text = message.get_args()
+    if not text:
+        await message.reply("Usage: /broadcast <message>")
+        return
+    # Checked and claimed with no await in between, so a double-tap can't start two
+    if outbox.broadcasting:
+        await message.reply("⏳ A broadcast is already running.")
+        return
+    outbox.broadcasting = True
+
+    try:
+        total = await db.count_users()
+        status = await message.reply(f"📣 Broadcasting to {total} users...")
+
+        async def progress(counts: dict):
+            done = sum(counts.values())
+            await outbox.edit_text(
+                status.chat.id, status.message_id,
+                f"📣 Broadcasting... {done}/{total}\n\n"
+                f"✅ Sent: {counts['sent']}\n"
+                f"🚫 Unreachable: {counts['unreachable']}\n"
+                f"❌ Failed: {counts['failed']}"
+            )
+
+        counts = await outbox.broadcast(
+            db.iter_user_ids(), text, progress=progress, concurrency=Config.BROADCAST_CONCURRENCY
+        )
+    finally:
+        outbox.broadcasting = False
+    await message.reply(
+        f"✅ Broadcast finished: {counts['sent']} sent, "
+        f"{counts['unreachable']} unreachable, {counts['failed']} failed."
+    )
+
+
+@dp.message_handler(Command("metrics"), chat_type=types.ChatType.PRIVATE)
+async def cmd_metrics(message: types.Message):
+    """Dump pipeline timings"""
+    if message.from_user.id != Config.OWNER_ID:
+        await message.reply("❌ Owner only command!")
+        return
+
+    from utils.metrics import metrics
+
+    # Telegram caps messages at 4096 chars
+    summary = escape(metrics.render_summary())[:3800]
+    await message.reply(f"📊 <b>Pipeline Metrics</b>\n\n<pre>{summary}</pre>", parse_mode="HTML")
+
+
 @dp.message_handler(Command("debug"), chat_type=types.ChatType.PRIVATE)
 async def cmd_debug(message: types.Message):
     """Debug UserBot and VC status"""
@@ -266,14 +432,23 @@ async def cmd_debug(message: types.Message):
     # 2. Check active voice chat
     active_vc = userbot_manager.active_chats.get(user_id)
     if active_vc:
-        debug_info.append(f"✅ <b>Voice Chat:</b> Joined (Chat ID: <code>{active_vc}</code>)")
+        chat_ids = ", ".join(f"<code>{chat_id}</code>" for chat_id in active_vc)
+        debug_info.append(f"✅ <b>Voice Chat:</b> Joined (Chat ID: {chat_ids})")
     else:
         debug_info.append("❌ <b>Voice Chat:</b> Not joined")
     
     # 3. Get user's configured chat ID from database
     user_data = await db.get_user(user_id)
-    config_chat_id = user_data.get("chat_id") if user_data else None
-    debug_info.append(f"📁 <b>Configured Group ID in DB:</b> <code>{config_chat_id}</code>")
+    config_chat_ids = ", ".join(f"<code>{t['chat_id']}</code>" for t in user_targets(user_data)) or "<code>None</code>"
+    debug_info.append(f"📁 <b>Configured Group ID in DB:</b> {config_chat_ids}")
+    
+    # 4. DSP load and the quality tier new notes get
+    from handlers.messages import voice_service
+    load = voice_service.admission.status()
+    debug_info.append(
+        f"⚙️ <b>Quality Tier:</b> {load['tier']} "
+        f"(queue {load['depth']}, workers busy {load['busy']}/{load['workers']})"
+    )
     
     # Send with HTML parsing
     await message.reply("\n".join(debug_info), parse_mode="HTML")
@@ -434,7 +609,10 @@ async def cmd_help(message: types.Message):
 /off - Deactivate bot
 /stop - Leave voice chat
 /setgc - Set group chat
+/addgc - Add another group
+/groups - List/remove groups
 /filter - Change voice filter
+/tune - Tune pitch, bass, reverb & speed
 /status - Check bot status
 
 <b>🔧 Debug Commands:</b>
@@ -445,6 +623,8 @@ async def cmd_help(message: types.Message):
 
 <b>👑 Owner Commands:</b>
 /stats - View bot statistics
+/broadcast - Message all users
+/metrics - View pipeline timings
 
 <b>⚡ Quick Guide:</b>
 1. Add bot to group (make admin)
@@ -2,12 +2,14 @@
 """
 Message handlers (Aiogram v2)
 """
+import time
+
 from aiogram import types
 from aiogram.dispatcher import FSMContext
 
 from src.voice_service import VoiceService
 from database import db
-from bot import dp  # same global dispatcher
+from bot import dp, outbox  # same global dispatcher
 
 voice_service = VoiceService()
 
@@ -15,15 +17,26 @@ voice_service = VoiceService()
 @dp.message_handler(content_types=types.ContentType.VOICE, chat_type=types.ChatType.PRIVATE)
 async def handle_voice(message: types.Message):
     """Handle voice messages"""
+    received_at = time.perf_counter()
     processing_msg = await message.reply("🔮 Processing your voice...")
 
     user_id = message.from_user.id
     voice_file_id = message.voice.file_id
 
+    async def send_preview(path: str):
+        with open(path, "rb") as f:
+            await message.reply_voice(f, caption="🎧 Preview, full voice is on its way...")
+
     # Process voice
-    success, result = await voice_service.process_voice(user_id, voice_file_id, message.bot)
+    success, result = await voice_service.process_voice(
+        user_id, voice_file_id, message.bot,
+        received_at=received_at, file_size=message.voice.file_size,
+        file_unique_id=message.voice.file_unique_id,
+        duration=message.voice.duration,
+        on_preview=send_preview
+    )
 
-    await processing_msg.edit_text(result)
+    await outbox.edit_text(processing_msg.chat.id, processing_msg.message_id, result)
 
 
 @dp.message_handler(content_types=types.ContentType.TEXT, chat_type=types.ChatType.PRIVATE)
@@ -3,17 +3,11 @@
 import os
 import asyncio
 import logging
-from datetime import datetime
 
-# Setup logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(f"logs/bot_{datetime.now().strftime('%Y%m%d')}.log"),
-        logging.StreamHandler()
-    ]
-)
+from utils.log_setup import setup_logging
+
+# Setup logging (queue based, so file writes never block the event loop)
+log_listener = setup_logging()
 logger = logging.getLogger(__name__)
 
 async def main():
@@ -47,6 +41,7 @@ async def main():
         await on_shutdown()
         await db.disconnect()
         logger.info("👋 Bot stopped")
+        log_listener.stop()
 
 if __name__ == "__main__":
     # Create required directories
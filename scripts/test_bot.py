@@ -8,9 +8,100 @@ import os
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-async def test_all():
-    """Test all components"""
+def test_dsp_dtypes():
+    """Every filter stage must stay float32 (no float64 intermediates)"""
+    import numpy as np
+    import librosa
+    from scipy import fft as sp_fft
+    from scipy import signal
+    from utils.voice_params import VoiceParams
+    from utils.quality import TIERS
+    from utils.voice_processor import VoiceProcessor
+
+    seen = []
+
+    def probe(owner, name):
+        original = getattr(owner, name)
+
+        def wrapper(*args, **kwargs):
+            result = original(*args, **kwargs)
+            if isinstance(result, np.ndarray):
+                seen.append((name, result.dtype))
+            return result
+        setattr(owner, name, wrapper)
+        return original
+
+    # The names the filters call, as they look them up (librosa.stft etc. in utils/spectral.py)
+    stages = [
+        (librosa, "stft"),
+        (librosa, "phase_vocoder"),
+        (librosa, "istft"),
+        (librosa, "resample"),
+        (librosa.effects, "pitch_shift"),  # still used directly by the robot filter
+        (signal, "sosfilt"),  # bandpass, bass boost, reverb IR design
+        (sp_fft, "rfft"),  # partitioned convolution reverb
+        (sp_fft, "irfft"),
+    ]
+
+    def check(label, y, sr, filter_type, params=None, tier=None):
+        seen.clear()
+        out = processor._apply_filter(y.copy(), sr, filter_type, params, tier)
+        bad = sorted({name for name, dtype in seen if dtype == np.float64})
+        assert out.dtype == np.float32, f"{label}: output is {out.dtype}"
+        assert not bad, f"{label}: float64 intermediates from {', '.join(bad)}"
+
+    originals = [(owner, name, probe(owner, name)) for owner, name in stages]
+    try:
+        processor = VoiceProcessor()
+        for tier in TIERS:
+            sr = tier.sample_rate
+            t = np.arange(sr * 2, dtype=np.float32) / sr
+            y = (0.5 * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+            for filter_type in VoiceProcessor.FILTERS:
+                check(f"{filter_type}@{tier.name}", y, sr, filter_type, tier=tier)
+            # Deep with every stage switched on: bass shelf, pitch, speed and reverb
+            tuned = VoiceParams(pitch=-6, bass=10, reverb=0.3, speed=0.9)
+            check(f"deep (tuned)@{tier.name}", y, sr, "deep", tuned, tier)
+    finally:
+        for owner, name, original in originals:
+            setattr(owner, name, original)
+
+
+def test_filters():
+    """Every filter runs on a short tone and returns finite float32 audio"""
+    import numpy as np
+    from utils.voice_processor import VoiceProcessor
+
+    processor = VoiceProcessor()
+    sr = 44100
+    t = np.arange(sr, dtype=np.float32) / sr
+    y = (0.5 * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+    for filter_type in VoiceProcessor.FILTERS:
+        out = processor._apply_filter(y.copy(), sr, filter_type)
+        assert out.dtype == np.float32, f"{filter_type}: output is {out.dtype}"
+        assert out.size and np.isfinite(out).all(), f"{filter_type}: empty or non-finite output"
+
+
+async def test_all() -> bool:
+    """Test all components; False if any failed"""
     print("\n🧪 Testing InstaVoice Bot Components...")
+    ok = True
+    
+    # Test filters
+    try:
+        test_filters()
+        print("✅ Filters: every filter runs")
+    except Exception as e:
+        print(f"❌ Filters: {e}")
+        ok = False
+    
+    # Test DSP
+    try:
+        test_dsp_dtypes()
+        print("✅ DSP: float32 end-to-end")
+    except Exception as e:
+        print(f"❌ DSP: {e}")
+        ok = False
     
     # Test config
     try:
@@ -19,7 +110,7 @@ async def test_all():
         print("✅ Config: Valid")
     except Exception as e:
         print(f"❌ Config: {e}")
-        return
+        return False
     
     # Test database
     try:
@@ -29,8 +120,13 @@ async def test_all():
         await db.disconnect()
     except Exception as e:
         print(f"❌ Database: {e}")
+        ok = False
     
-    print("\n✅ All tests passed! Bot is ready.")
+    if ok:
+        print("\n✅ All tests passed! Bot is ready.")
+    else:
+        print("\n❌ Some tests failed.")
+    return ok
 
 if __name__ == "__main__":
-    asyncio.run(test_all())
+    sys.exit(0 if asyncio.run(test_all()) else 1)
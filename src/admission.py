@@ -0,0 +1,84 @@
+"""
+Load-adaptive admission control for the DSP queue
+
+Picks the quality tier each new note is processed at from the job
+queue's backlog. Degrading is immediate, and can skip tiers, once every
+worker is busy and the queue is past a tier's depth. Recovering goes one
+tier at a time, only after the tier has been held for `hold_seconds` and
+the queue has drained below `recover_ratio` of the depth that triggered
+it, so a queue hovering at a threshold doesn't flap between tiers.
+"""
+import time
+import logging
+from typing import Sequence
+
+from utils.quality import TIERS, QualityTier
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+QUALITY_TIER = metrics.gauge("voice_quality_tier", "Active DSP quality tier (0 = full quality)")
+QUALITY_NOTES = metrics.counter("voice_quality_notes_total", "Notes admitted per quality tier", ("tier",))
+QUALITY_SWITCHES = metrics.counter(
+    "voice_quality_switches_total", "Switches into each quality tier", ("tier",)
+)
+
+
+class AdmissionController:
+    def __init__(self, jobs, depths: Sequence[int], busy_utilisation: float = 1.0,
+                 recover_ratio: float = 0.5, hold_seconds: float = 15, enabled: bool = True):
+        """`depths[i]` is the queue depth that moves notes down to TIERS[i + 1]"""
+        self.jobs = jobs
+        self.depths = list(depths)[:len(TIERS) - 1]
+        self.busy_utilisation = busy_utilisation
+        self.recover_ratio = recover_ratio
+        self.hold_seconds = hold_seconds
+        self.enabled = enabled
+        self.level = 0
+        self._changed_at = 0.0
+        QUALITY_TIER.set_function(lambda: self.level)
+
+    @property
+    def tier(self) -> QualityTier:
+        return TIERS[self.level]
+
+    def _wanted(self, depth: int) -> int:
+        if self.jobs.utilisation < self.busy_utilisation:
+            # A worker is free, so the backlog is about to shrink anyway
+            return 0
+        return sum(depth >= threshold for threshold in self.depths)
+
+    def admit(self) -> QualityTier:
+        """Tier for a note entering the pipeline now"""
+        if self.enabled:
+            self._update(len(self.jobs.pending))
+        tier = self.tier
+        QUALITY_NOTES.inc(tier=tier.name)
+        return tier
+
+    def _update(self, depth: int):
+        now = time.monotonic()
+        wanted = self._wanted(depth)
+        if wanted > self.level:
+            self._switch(wanted, depth, now)
+        elif (wanted < self.level and now - self._changed_at >= self.hold_seconds
+              and depth < self.depths[self.level - 1] * self.recover_ratio):
+            self._switch(self.level - 1, depth, now)
+
+    def _switch(self, level: int, depth: int, now: float):
+        logger.info(
+            "DSP quality %s -> %s (queue depth %d, utilisation %.0f%%)",
+            TIERS[self.level].name, TIERS[level].name, depth, self.jobs.utilisation * 100
+        )
+        self.level = level
+        self._changed_at = now
+        QUALITY_SWITCHES.inc(tier=TIERS[level].name)
+
+    def status(self) -> dict:
+        return {
+            "tier": self.tier.name,
+            "level": self.level,
+            "depth": len(self.jobs.pending),
+            "busy": self.jobs.busy,
+            "workers": self.jobs.workers,
+        }
@@ -0,0 +1,192 @@
+"""
+DSP job scheduler
+
+Voice jobs are queued and picked up by a fixed number of workers which run
+the DSP and encoding in a thread pool, off the event loop. When a worker
+takes a job it also takes any other queued jobs with the same filter and
+parameters (and a similar length) and processes them as one vectorised batch.
+"""
+import time
+import asyncio
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, NamedTuple, Optional
+
+import numpy as np
+
+from utils.voice_params import VoiceParams
+from utils.quality import QualityTier
+from utils.metrics import metrics, QUEUE_WAIT_SECONDS
+
+logger = logging.getLogger(__name__)
+
+QUEUE_DEPTH = metrics.gauge("voice_queue_depth", "Voice jobs waiting for a DSP worker")
+WORKERS_BUSY = metrics.gauge("voice_dsp_workers_busy", "DSP workers currently processing a batch")
+BATCH_SIZE = metrics.histogram(
+    "voice_dsp_batch_size", "Voice notes processed per DSP batch",
+    buckets=(1, 2, 3, 4, 6, 8, 12, 16)
+)
+
+
+class QueueFull(Exception):
+    pass
+
+
+class QueueStopped(Exception):
+    pass
+
+
+class JobResult(NamedTuple):
+    path: str
+    cpu_seconds: float  # this note's share of its batch's worker CPU time
+
+
+class VoiceJob:
+    def __init__(self, y: np.ndarray, sr: int, filter_type: str, output_path: str,
+                 params: Optional[VoiceParams] = None, tier: Optional[QualityTier] = None):
+        self.y = y
+        self.sr = sr
+        self.filter_type = filter_type
+        self.params = params
+        self.tier = tier
+        self.output_path = output_path
+        self.enqueued_at = time.perf_counter()
+        self.future = asyncio.get_running_loop().create_future()
+
+    @property
+    def batch_key(self):
+        return self.filter_type, self.sr, self.params, self.tier
+
+
+class VoiceJobQueue:
+    def __init__(self, processor, workers: int = 2, batch_max: int = 4,
+                 max_queue: int = 100, pad_ratio: float = 1.5):
+        self.processor = processor
+        self.workers = workers
+        self.batch_max = batch_max
+        self.max_queue = max_queue
+        self.pad_ratio = pad_ratio
+        self.pending = deque()
+        self.busy = 0
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Condition] = None
+        QUEUE_DEPTH.set_function(lambda: len(self.pending))
+
+    @property
+    def utilisation(self) -> float:
+        return self.busy / self.workers if self.workers else 0.0
+
+    def start(self):
+        if self._tasks:
+            return
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="dsp")
+        self._wakeup = asyncio.Condition()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """Stop the workers; jobs still queued or in progress fail with QueueStopped"""
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        # Let cancelled workers fail their in-flight batches before we return
+        await asyncio.gather(*tasks, return_exceptions=True)
+        while self.pending:
+            job = self.pending.popleft()
+            if not job.future.done():
+                job.future.set_exception(QueueStopped("voice queue stopped"))
+        if self._executor:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    async def submit(self, y: np.ndarray, sr: int, filter_type: str, output_path: str,
+                     params: Optional[VoiceParams] = None, urgent: bool = False,
+                     tier: Optional[QualityTier] = None) -> JobResult:
+        """Queue a note and wait for its encoded output; `urgent` jobs go to the front"""
+        if len(self.pending) >= self.max_queue:
+            raise QueueFull(f"{len(self.pending)} voice jobs already queued")
+        self.start()
+
+        job = VoiceJob(y, sr, filter_type, output_path, params, tier)
+        if urgent:
+            self.pending.appendleft(job)
+        else:
+            self.pending.append(job)
+        async with self._wakeup:
+            self._wakeup.notify()
+        return await job.future
+
+    def _take_batch(self) -> List[VoiceJob]:
+        """Next job plus compatible ones; jobs whose caller already gave up are dropped"""
+        first = None
+        while self.pending and first is None:
+            job = self.pending.popleft()
+            if not job.future.done():
+                first = job
+        if first is None:
+            return []
+        batch = [first]
+        for job in list(self.pending):
+            if len(batch) >= self.batch_max:
+                break
+            if job.future.done():
+                self.pending.remove(job)
+                continue
+            # Padding a short note up to a much longer one would waste more than batching saves
+            shorter, longer = sorted((len(job.y), len(first.y)))
+            if job.batch_key == first.batch_key and shorter * self.pad_ratio >= longer:
+                self.pending.remove(job)
+                batch.append(job)
+        return batch
+
+    def _render(self, batch: List[VoiceJob]):
+        """Render a batch on a worker thread, measuring that thread's CPU time"""
+        first = batch[0]
+        start = time.thread_time()
+        paths = self.processor.render_batch(
+            [job.y for job in batch], first.sr, first.filter_type,
+            [job.output_path for job in batch], first.params, first.tier
+        )
+        return paths, time.thread_time() - start
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            async with self._wakeup:
+                await self._wakeup.wait_for(lambda: self.pending)
+                batch = self._take_batch()
+            if not batch:
+                continue
+
+            now = time.perf_counter()
+            for job in batch:
+                QUEUE_WAIT_SECONDS.observe(now - job.enqueued_at)
+            BATCH_SIZE.observe(len(batch))
+
+            self.busy += 1
+            WORKERS_BUSY.set(self.busy)
+            try:
+                paths, cpu_seconds = await loop.run_in_executor(self._executor, self._render, batch)
+                total = sum(len(job.y) for job in batch) or 1
+                for job, path in zip(batch, paths):
+                    if job.future.done():
+                        continue
+                    if isinstance(path, Exception):
+                        job.future.set_exception(path)
+                    else:
+                        job.future.set_result(JobResult(path, cpu_seconds * len(job.y) / total))
+            except asyncio.CancelledError:
+                # stop() cancelled us mid-batch; don't leave its callers waiting
+                for job in batch:
+                    if not job.future.done():
+                        job.future.set_exception(QueueStopped("voice queue stopped"))
+                raise
+            except Exception as e:
+                logger.exception("DSP batch of %d failed: %s", len(batch), e)
+                for job in batch:
+                    if not job.future.done():
+                        job.future.set_exception(e)
+            finally:
+                self.busy -= 1
+                WORKERS_BUSY.set(self.busy)
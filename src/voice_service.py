@@ -2,54 +2,262 @@
 Voice processing service
 """
 import os
+import time
 import asyncio
-from typing import Tuple
+import logging
+from html import escape
+from typing import Awaitable, Callable, Optional, Tuple
 from config import Config
 from utils.voice_processor import VoiceProcessor
 from utils.userbot_manager import userbot_manager
-from database import db
+from utils.temp_storage import temp_storage, QuotaExceeded
+from src.job_queue import VoiceJobQueue, QueueFull
+from utils.audio_codec import ogg_duration
+from src.admission import AdmissionController
+from utils.output_cache import OutputCache
+from utils.pcm_store import PCMStore
+from utils.voice_params import params_from_user, params_for_filter
+from utils.quality import FULL_QUALITY
+from database import db, user_targets
+from utils.metrics import metrics, PIPELINE_SECONDS, JOBS_IN_FLIGHT, FIRST_AUDIO_SECONDS, QUOTA_REJECTIONS
+
+logger = logging.getLogger(__name__)
+
+# Called with the path of an encoded preview clip; must finish using it before returning
+PreviewSink = Callable[[str], Awaitable]
 
 class VoiceService:
     def __init__(self):
         self.processor = VoiceProcessor()
+        self.jobs = VoiceJobQueue(
+            self.processor,
+            workers=Config.DSP_WORKERS,
+            batch_max=Config.DSP_BATCH_MAX,
+            max_queue=Config.DSP_MAX_QUEUE,
+            pad_ratio=Config.DSP_BATCH_PAD_RATIO,
+        )
+        self.admission = AdmissionController(
+            self.jobs,
+            depths=Config.QUALITY_TIER_DEPTHS,
+            busy_utilisation=Config.QUALITY_BUSY_UTILISATION,
+            recover_ratio=Config.QUALITY_RECOVER_RATIO,
+            hold_seconds=Config.QUALITY_HOLD_SECONDS,
+            enabled=Config.QUALITY_ADAPTIVE,
+        )
+        self.outputs = OutputCache(Config.OUTPUT_CACHE_BYTES)
+        self.pcm = PCMStore(
+            os.path.join(temp_storage.root, "pcm_spill"),
+            ram_bytes=Config.PCM_STORE_RAM_BYTES,
+            disk_bytes=Config.PCM_STORE_DISK_BYTES,
+        )
+        
+    async def process_voice(self, user_id: int, voice_file_id: str, bot,
+                            received_at: Optional[float] = None,
+                            file_size: Optional[int] = None,
+                            file_unique_id: Optional[str] = None,
+                            duration: Optional[float] = None,
+                            on_preview: Optional[PreviewSink] = None) -> Tuple[bool, str]:
+        """Process and play voice; long notes get a preview clip passed to `on_preview` first"""
+        started = received_at if received_at is not None else time.perf_counter()
+            
+        # Reject oversize notes before any network I/O
+        if file_size and file_size > Config.MAX_VOICE_SIZE:
+            return False, f"Voice note too large! Max {Config.MAX_VOICE_SIZE // (1024 * 1024)} MB."
+            
+        return await self._timed(started, self._process_voice(
+            user_id, voice_file_id, bot, file_unique_id,
+            started=started, duration=duration, on_preview=on_preview
+        ))
         
-    async def process_voice(self, user_id: int, voice_file_id: str, bot) -> Tuple[bool, str]:
-        """Process and play voice"""
+    async def replay_last(self, user_id: int) -> Tuple[bool, str]:
+        """Re-run the user's last note through their current filter, skipping download and decode"""
+        started = time.perf_counter()
+        return await self._timed(started, self._process_voice(user_id, None, None, replay=True, started=started))
+        
+    async def _timed(self, started: float, pipeline) -> Tuple[bool, str]:
+        JOBS_IN_FLIGHT.inc()
+        try:
+            success, result = await pipeline
+        finally:
+            JOBS_IN_FLIGHT.dec()
+        PIPELINE_SECONDS.observe(time.perf_counter() - started, result="ok" if success else "error")
+        return success, result
+        
+    async def _process_voice(self, user_id: int, voice_file_id: Optional[str], bot,
+                             file_unique_id: Optional[str] = None,
+                             replay: bool = False, started: Optional[float] = None,
+                             duration: Optional[float] = None,
+                             on_preview: Optional[PreviewSink] = None) -> Tuple[bool, str]:
+        started = started if started is not None else time.perf_counter()
+        previewed = False
+        cpu_seconds = 0.0
         try:
             # Check user
-            user = await db.get_user(user_id)
+            with metrics.span("get_user"):
+                user = await db.get_user(user_id)
             if not user or not user.get("is_active"):
                 return False, "Bot is not active. Use /on first!"
                 
-            if not user.get("chat_id"):
+            targets = user_targets(user)
+            if not targets:
                 return False, "No group configured. Use /setgc first!"
                 
-            # Download voice
-            voice_path = await self.processor.download_voice_note(voice_file_id, bot)
-            if not voice_path:
-                return False, "Failed to download voice!"
+            stored = None
+            if replay:
+                stored = self.pcm.get(user_id)
+                if stored is None:
+                    return False, "No recent voice note to replay. Send one first!"
+                file_unique_id = stored.file_unique_id
+                duration = len(stored.y) / stored.sr
                 
-            # Process with user's filter
-            filter_type = user.get("voice_filter", "deep")
-            processed_path = await self.processor.convert_to_deep_voice(voice_path, filter_type)
-            
-            if not processed_path:
-                return False, "Voice processing failed!"
+            # Daily quotas are checked before anything is downloaded or queued
+            usage = await self._daily_usage(user_id)
+            over_quota = self._quota_error(usage, duration)
+            if over_quota:
+                return False, over_quota
                 
-            # Play in VC
-            success = await userbot_manager.play_audio(user_id, processed_path)
+            # User's filter and its (quantised) parameters
+            filter_type = user.get("voice_filter", "deep")
+            params = params_for_filter(filter_type, params_from_user(user))
+            cache_key = (file_unique_id, filter_type, params) if file_unique_id else None
             
-            # Cleanup
-            self.processor.cleanup_file(voice_path)
-            if processed_path != voice_path:
-                self.processor.cleanup_file(processed_path)
+            try:
+                # Scratch files live in a per-job dir removed when the block exits
+                async with temp_storage.job() as work_dir:
+                    processed_path = os.path.join(work_dir, "voice.ogg")
+                    cached = self.outputs.get(cache_key) if cache_key else None
+                    if cached is not None:
+                        await asyncio.to_thread(self._write_file, processed_path, cached)
+                        if not duration:
+                            duration = ogg_duration(cached)
+                    else:
+                        # Quality tier for this note, from the current DSP backlog
+                        tier = self.admission.admit()
+                        if stored is not None:
+                            y, sr = stored.y, stored.sr
+                        else:
+                            # Download and decode voice, at the tier's sample rate
+                            decoded = await self.processor.download_and_decode(voice_file_id, bot, tier.sample_rate)
+                            if decoded is None:
+                                return False, "Failed to download voice!"
+                            y, sr = decoded
+                            # Kept for "replay with this filter"; may spill an older note to disk
+                            await asyncio.to_thread(self.pcm.put, user_id, y, sr, file_unique_id)
+                            if not duration:
+                                # Telegram reports whole seconds, and 0 for very short notes
+                                duration = len(y) / sr
+                                over_quota = self._quota_error(usage, duration)
+                                if over_quota:
+                                    return False, over_quota
+                        
+                        # A long note's opening seconds jump the queue, so the sender hears
+                        # something while the full note is still waiting for a worker
+                        preview = None
+                        if on_preview is not None:
+                            preview = self._queue_preview(y, sr, filter_type, work_dir, params, tier)
+                        # DSP + encode run in the job queue's thread pool, batched with similar notes
+                        full = asyncio.ensure_future(
+                            self.jobs.submit(y, sr, filter_type, processed_path, params, tier=tier)
+                        )
+                        if preview is not None:
+                            previewed = await self._send_preview(preview, on_preview, started)
+                        result = await full
+                        cpu_seconds += result.cpu_seconds
+                        if preview is not None and not preview.cancelled() and preview.exception() is None:
+                            cpu_seconds += preview.result().cpu_seconds
+                        processed_path = result.path
+                        if not processed_path:
+                            return False, "Voice processing failed!"
+                        # Degraded renders aren't cached, so they never outlive the burst; that
+                        # includes full-tier replays of a note decoded at a degraded rate
+                        if cache_key and tier.name == FULL_QUALITY.name and sr == FULL_QUALITY.sample_rate:
+                            self.outputs.put(cache_key, await asyncio.to_thread(self._read_file, processed_path))
+                        
+                    # Upload once, play in every target group
+                    results = await userbot_manager.deliver_audio(
+                        user_id, processed_path, [t["chat_id"] for t in targets]
+                    )
+            except (QuotaExceeded, QueueFull):
+                return False, "⏳ Bot is busy right now, please try again in a minute."
                 
-            if success:
+            delivered = sum(error is None for error in results.values())
+            if delivered and not previewed:
+                FIRST_AUDIO_SECONDS.observe(time.perf_counter() - started, via="full")
+            if delivered:
                 # Record stats
-                await db.add_voice_record(user_id, 0, filter_type)
-                return True, "✅ Voice played successfully!"
-            else:
+                await db.add_voice_record(user_id, round(duration or 0, 2), filter_type, round(cpu_seconds, 3))
+            if len(targets) == 1:
+                if delivered:
+                    return True, "✅ Voice played successfully!"
                 return False, "Failed to play in voice chat!"
+            return delivered > 0, self._fanout_report(targets, results)
                 
         except Exception as e:
             return False, f"Error: {str(e)}"
+            
+    def _queue_preview(self, y, sr: int, filter_type: str, work_dir: str, params,
+                       tier) -> Optional[asyncio.Future]:
+        """Queue the first PREVIEW_SECONDS at the front of the DSP queue, for notes long enough to need it"""
+        if Config.PREVIEW_SECONDS <= 0 or len(y) < Config.PREVIEW_MIN_SECONDS * sr:
+            return None
+        clip = y[:int(Config.PREVIEW_SECONDS * sr)]
+        preview_path = os.path.join(work_dir, "preview.ogg")
+        return asyncio.ensure_future(
+            self.jobs.submit(clip, sr, filter_type, preview_path, params, urgent=True, tier=tier)
+        )
+        
+    @staticmethod
+    async def _send_preview(preview: asyncio.Future, on_preview: PreviewSink, started: float) -> bool:
+        """Hand the rendered clip to `on_preview`; a failed preview never fails the note"""
+        try:
+            path = (await preview).path
+            if not path:
+                return False
+            with metrics.span("preview"):
+                await on_preview(path)
+        except Exception as e:
+            logger.warning("Preview not sent: %s", e)
+            return False
+        FIRST_AUDIO_SECONDS.observe(time.perf_counter() - started, via="preview")
+        return True
+        
+    @staticmethod
+    async def _daily_usage(user_id: int) -> Optional[dict]:
+        """Today's usage, or None when no quota applies to this user"""
+        if not (Config.DAILY_AUDIO_SECONDS or Config.DAILY_CPU_SECONDS) or user_id == Config.OWNER_ID:
+            return None
+        with metrics.span("quota"):
+            return await db.get_daily_usage(user_id)
+            
+    @staticmethod
+    def _quota_error(usage: Optional[dict], duration: Optional[float]) -> Optional[str]:
+        if usage is None:
+            return None
+        if Config.DAILY_CPU_SECONDS and usage["cpu_seconds"] >= Config.DAILY_CPU_SECONDS:
+            QUOTA_REJECTIONS.inc(kind="cpu")
+            return "📊 Daily processing limit reached. Try again tomorrow!"
+        if Config.DAILY_AUDIO_SECONDS and usage["seconds"] + (duration or 0) > Config.DAILY_AUDIO_SECONDS:
+            QUOTA_REJECTIONS.inc(kind="audio")
+            left = max(Config.DAILY_AUDIO_SECONDS - usage["seconds"], 0)
+            return f"📊 Daily limit of {Config.DAILY_AUDIO_SECONDS // 60} min of voice reached ({left:.0f}s left today). Try again tomorrow!"
+        return None
+        
+    @staticmethod
+    def _fanout_report(targets, results) -> str:
+        delivered = sum(error is None for error in results.values())
+        lines = [f"{'✅' if delivered == len(targets) else '⚠️'} Voice played in {delivered}/{len(targets)} groups:"]
+        for target in targets:
+            error = results.get(target["chat_id"], "not sent")
+            name = escape(str(target.get("title") or target["chat_id"]))
+            lines.append(f"✅ {name}" if error is None else f"❌ {name}: {escape(error)}")
+        return "\n".join(lines)
+        
+    @staticmethod
+    def _read_file(path: str) -> bytes:
+        with open(path, "rb") as f:
+            return f.read()
+            
+    @staticmethod
+    def _write_file(path: str, data: bytes):
+        with open(path, "wb") as f:
+            f.write(data)
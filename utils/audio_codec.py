@@ -0,0 +1,124 @@
+"""
+ffmpeg based audio decoding and Opus encoding
+"""
+import os
+import time
+import asyncio
+import logging
+import subprocess
+from typing import AsyncIterator, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class DecodeError(Exception):
+    pass
+
+
+class EncodeError(Exception):
+    pass
+
+
+def ogg_duration(data: bytes) -> Optional[float]:
+    """
+    Seconds in an Ogg/Opus stream, read from the last page's granule
+    position (always 48 kHz samples for Opus) minus the OpusHead pre-skip,
+    without decoding anything. None if `data` doesn't look like one.
+    """
+    head = data.find(b"OpusHead")
+    last = data.rfind(b"OggS")
+    if head < 0 or last < 0 or len(data) < head + 12 or len(data) < last + 14 or data[last + 4] != 0:
+        return None
+    granule = int.from_bytes(data[last + 6:last + 14], "little", signed=True)
+    if granule < 0:
+        # -1: no packet finishes on this page
+        return None
+    pre_skip = int.from_bytes(data[head + 10:head + 12], "little")
+    return max(granule - pre_skip, 0) / 48000
+
+
+def decode_args(sr: int) -> List[str]:
+    """ffmpeg reading any container on stdin, writing mono f32le PCM at `sr` to stdout"""
+    return [
+        "ffmpeg", "-hide_banner", "-loglevel", "error", "-nostdin",
+        "-i", "pipe:0",
+        "-f", "f32le", "-ac", "1", "-ar", str(sr), "pipe:1",
+    ]
+
+
+def opus_args(sr: int, bitrate_kbps: int = 32, frame_ms: float = 20, complexity: int = 10,
+              output: str = "pipe:1") -> List[str]:
+    """ffmpeg reading mono f32le PCM at `sr` on stdin, writing an Opus voice note"""
+    return [
+        "ffmpeg", "-hide_banner", "-loglevel", "error", "-nostdin", "-y",
+        "-f", "f32le", "-ar", str(sr), "-ac", "1", "-i", "pipe:0",
+        "-c:a", "libopus", "-application", "voip",
+        "-b:a", f"{bitrate_kbps}k", "-vbr", "on",
+        "-frame_duration", str(frame_ms),
+        "-compression_level", str(complexity),
+        "-ac", "1", "-ar", "48000",
+        "-f", "ogg", output,
+    ]
+
+
+async def decode_stream(chunks: AsyncIterator[bytes], sr: int = 44100) -> np.ndarray:
+    """
+    Decode an encoded audio byte stream to mono float32 PCM at `sr`.
+
+    Chunks are written to ffmpeg's stdin as they arrive while its output is
+    read concurrently, so decoding overlaps with the download instead of
+    waiting for the whole file to land on disk.
+    """
+    proc = await asyncio.create_subprocess_exec(
+        *decode_args(sr),
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+
+    async def feed():
+        try:
+            async for chunk in chunks:
+                proc.stdin.write(chunk)
+                await proc.stdin.drain()
+        finally:
+            proc.stdin.close()
+
+    try:
+        _, pcm, stderr = await asyncio.gather(feed(), proc.stdout.read(), proc.stderr.read())
+        await proc.wait()
+    except BaseException:
+        # Network error mid-stream or cancellation: don't leave ffmpeg behind
+        if proc.returncode is None:
+            proc.kill()
+            await proc.wait()
+        raise
+
+    if proc.returncode != 0:
+        raise DecodeError(stderr.decode(errors="replace").strip() or f"ffmpeg exited with {proc.returncode}")
+    # frombuffer views immutable bytes; DSP kernels need a writable array
+    return np.frombuffer(pcm, dtype=np.float32).copy()
+
+
+def encode_opus(y: np.ndarray, sr: int, output_path: str, bitrate_kbps: int = 32,
+                frame_ms: float = 20, complexity: int = 10) -> dict:
+    """
+    Encode mono PCM to an Opus-in-OGG voice note (blocking).
+
+    Uses libopus' VoIP application mode at 48 kHz mono, which is what
+    Telegram voice notes are, instead of pydub's default OGG export.
+    Returns encode time and output size for reporting.
+    """
+    pcm = np.ascontiguousarray(y, dtype=np.float32)
+    start = time.perf_counter()
+    result = subprocess.run(
+        opus_args(sr, bitrate_kbps, frame_ms, complexity, output_path),
+        input=pcm.tobytes(),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+    )
+    if result.returncode != 0:
+        raise EncodeError(result.stderr.decode(errors="replace").strip() or f"ffmpeg exited with {result.returncode}")
+    return {"seconds": time.perf_counter() - start, "bytes": os.path.getsize(output_path)}
@@ -0,0 +1,182 @@
+"""
+Uniformly partitioned FFT convolution
+
+The impulse response is split into blocks of `block_size` samples, each
+transformed once and cached. Input is processed block by block: every
+input block is transformed once, multiplied with each IR partition it
+overlaps in time and the results overlap-added. Cost per sample grows with
+the number of partitions rather than the IR length (direct convolution is
+O(N·M)), and the same partitioned spectra serve both whole-buffer
+processing and low-latency streaming.
+"""
+from functools import lru_cache
+
+import numpy as np
+from scipy import fft as sp_fft
+from scipy import signal
+
+from utils.dsp_kernels import butter_sos
+
+# Whole-buffer default: few partitions for the bundled IRs, cheap FFTs
+DEFAULT_BLOCK_SIZE = 4096
+
+
+def synthetic_ir(sr: int, seconds: float, reflections, seed: int, cutoff: float = 5000) -> np.ndarray:
+    """
+    Deterministic room-like impulse response: discrete early reflections
+    followed by exponentially decaying (-60 dB at the end), low-passed
+    noise. Unit energy, so the wet/dry mix alone sets the level.
+    """
+    n = int(seconds * sr)
+    rng = np.random.default_rng(seed)
+    t = np.arange(n, dtype=np.float32) / np.float32(sr)
+    ir = rng.standard_normal(n, dtype=np.float32) * np.exp(np.float32(-6.9 / seconds) * t)
+    ir = signal.sosfilt(butter_sos(2, cutoff, "lowpass", sr), ir).astype(np.float32)
+    for delay_ms, gain in reflections:
+        ir[int(delay_ms * sr / 1000)] += np.float32(gain)
+    ir /= np.float32(np.sqrt(np.sum(ir * ir)))
+    ir.setflags(write=False)
+    return ir
+
+
+IMPULSE_RESPONSES = {
+    "room": lambda sr: synthetic_ir(sr, 0.35, ((11, 0.7), (19, 0.5), (27, 0.35)), seed=0xCAFE),
+    "hall": lambda sr: synthetic_ir(
+        sr, 1.8, ((23, 0.6), (41, 0.45), (67, 0.35), (89, 0.25)), seed=0xBEEF, cutoff=3500
+    ),
+}
+
+
+def partition_spectra(ir: np.ndarray, block_size: int) -> np.ndarray:
+    """rfft of each `block_size` slice of `ir` zero-padded to 2·block_size: (partitions, block_size + 1)"""
+    ir = np.asarray(ir, dtype=np.float32)
+    parts = max(1, -(-len(ir) // block_size))
+    padded = np.zeros((parts, 2 * block_size), dtype=np.float32)
+    flat = np.zeros(parts * block_size, dtype=np.float32)
+    flat[:len(ir)] = ir
+    padded[:, :block_size] = flat.reshape(parts, block_size)
+    spectra = sp_fft.rfft(padded, axis=-1)
+    spectra.setflags(write=False)
+    return spectra
+
+
+class PartitionedConvolver:
+    """
+    Stateless once built, so one instance can be shared between threads;
+    streaming state lives in the ConvolutionStream objects it hands out.
+    """
+
+    def __init__(self, ir: np.ndarray, block_size: int = DEFAULT_BLOCK_SIZE):
+        self.block_size = block_size
+        self.ir_len = len(ir)
+        self.spectra = partition_spectra(ir, block_size)
+
+    @property
+    def partitions(self) -> int:
+        return len(self.spectra)
+
+    def convolve(self, y: np.ndarray, tail: bool = False) -> np.ndarray:
+        """
+        Convolve a whole buffer along the last axis, so (notes, samples)
+        batches work too. Returns float32 of the input length, or the full
+        n + ir_len - 1 samples with `tail`.
+        """
+        y = np.asarray(y, dtype=np.float32)
+        B = self.block_size
+        n = y.shape[-1]
+        lead = y.shape[:-1]
+        out_len = n + self.ir_len - 1 if tail else n
+        if not n:
+            return np.zeros(lead + (out_len,), dtype=np.float32)
+        nblocks = -(-out_len // B)
+
+        # Input blocks, each zero-padded to 2B so the linear convolution fits
+        frames = np.zeros(lead + (nblocks, 2 * B), dtype=np.float32)
+        flat = np.zeros(lead + (nblocks * B,), dtype=np.float32)
+        flat[..., :n] = y
+        frames[..., :B] = flat.reshape(lead + (nblocks, B))
+        X = sp_fft.rfft(frames, axis=-1)
+        del frames, flat
+
+        # Output block k = sum over partitions p of X[k - p] · H[p]
+        Y = np.zeros_like(X)
+        for p in range(min(self.partitions, nblocks)):
+            Y[..., p:, :] += X[..., :nblocks - p, :] * self.spectra[p]
+        del X
+        blocks = sp_fft.irfft(Y, 2 * B, axis=-1)
+        del Y
+
+        # Overlap-add: each block's second half lands on the next block's first half
+        out = np.zeros(lead + ((nblocks + 1) * B,), dtype=np.float32)
+        out[..., :nblocks * B] += blocks[..., :B].reshape(lead + (nblocks * B,))
+        out[..., B:] += blocks[..., B:].reshape(lead + (nblocks * B,))
+        return out[..., :out_len]
+
+    def stream(self) -> "ConvolutionStream":
+        return ConvolutionStream(self)
+
+
+class ConvolutionStream:
+    """
+    Block-by-block convolution with a frequency-domain delay line. Feed
+    blocks of exactly `block_size` samples (only the last may be shorter);
+    output is returned with zero added latency.
+    """
+
+    def __init__(self, convolver: PartitionedConvolver):
+        self.convolver = convolver
+        B = convolver.block_size
+        self._fdl = np.zeros((convolver.partitions, B + 1), dtype=np.complex64)
+        self._overlap = np.zeros(B, dtype=np.float32)
+        self._frame = np.zeros(2 * B, dtype=np.float32)
+        self._pos = 0
+        self._lags = np.arange(convolver.partitions)
+        # Output past the end of a short final block; it belongs to the tail
+        self._leftover = np.zeros(0, dtype=np.float32)
+
+    def process(self, block: np.ndarray) -> np.ndarray:
+        B = self.convolver.block_size
+        n = len(block)
+        if n > B:
+            raise ValueError(f"block of {n} samples exceeds block_size {B}")
+
+        self._frame[:n] = block
+        self._frame[n:] = 0
+        self._fdl[self._pos] = sp_fft.rfft(self._frame)
+        # Partition p pairs with the input from p blocks ago
+        history = self._fdl[(self._pos - self._lags) % len(self._lags)]
+        y = sp_fft.irfft((history * self.convolver.spectra).sum(axis=0), 2 * B)
+        self._pos = (self._pos + 1) % len(self._lags)
+
+        out = (y[:B] + self._overlap).astype(np.float32, copy=False)
+        self._overlap[:] = y[B:]
+        self._leftover = out[n:]
+        return out[:n]
+
+    def flush(self) -> np.ndarray:
+        """The reverb tail still owed after the last input block"""
+        B = self.convolver.block_size
+        remaining = self.convolver.ir_len - 1
+        tail = [self._leftover]
+        produced = len(self._leftover)
+        while produced < remaining:
+            tail.append(self.process(np.zeros(B, dtype=np.float32)))
+            produced += B
+        return np.concatenate(tail)[:remaining]
+
+
+@lru_cache(maxsize=16)
+def convolver(name: str, sr: int, block_size: int = DEFAULT_BLOCK_SIZE) -> PartitionedConvolver:
+    """Shared convolver for a bundled IR; its partition spectra are built once per (IR, rate, block)"""
+    return PartitionedConvolver(IMPULSE_RESPONSES[name](sr), block_size)
+
+
+def reverb_(y: np.ndarray, sr: int, amount: float, ir: str = "room") -> np.ndarray:
+    """Mix `amount` of convolution reverb into `y` in place; the tail past the end is dropped"""
+    if amount <= 0 or not y.shape[-1]:
+        return y
+    wet = convolver(ir, sr).convolve(y)
+    y *= np.float32(1 - amount)
+    wet *= np.float32(amount)
+    y += wet
+    return y
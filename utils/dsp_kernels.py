@@ -0,0 +1,116 @@
+"""
+In-place float32 DSP kernels
+
+Every kernel modifies its input array and returns it. Per-thread scratch
+buffers and cached lookup tables keep the per-note allocations to zero
+beyond what scipy itself needs. Kernels work along the last axis, so a
+(notes, samples) batch is processed exactly like a single note.
+"""
+import threading
+from functools import lru_cache
+
+import numpy as np
+from scipy import signal
+
+_local = threading.local()
+
+# Period of the cached noise table (~3 s at 44.1 kHz); far below audibility at radio noise levels
+NOISE_TABLE_SIZE = 1 << 17
+
+
+def scratch(size: int) -> np.ndarray:
+    """Reusable float32 work buffer for the calling thread"""
+    buf = getattr(_local, "buf", None)
+    if buf is None or len(buf) < size:
+        buf = _local.buf = np.empty(max(size, 4096), dtype=np.float32)
+    return buf[:size]
+
+
+def as_float32(y: np.ndarray) -> np.ndarray:
+    """Return `y` itself if it is already a writable contiguous float32 array, else a float32 copy"""
+    if y.dtype == np.float32 and y.flags.writeable and y.flags.c_contiguous:
+        return y
+    return np.array(y, dtype=np.float32, order="C")
+
+
+@lru_cache(maxsize=64)
+def butter_sos(order: int, cutoff, btype: str, sr: int) -> np.ndarray:
+    """
+    Cached Butterworth design in float32 so sosfilt stays in float32. Left
+    writable: sosfilt's Cython core rejects read-only buffers (scipy 1.10).
+    Callers must not modify it.
+    """
+    return signal.butter(order, cutoff, btype, fs=sr, output="sos").astype(np.float32)
+
+
+@lru_cache(maxsize=8)
+def _ring_table(sr: int, freq: float, depth: float) -> np.ndarray:
+    # One second holds a whole number of cycles for integer `freq`, so the table tiles seamlessly
+    t = np.arange(sr, dtype=np.float32) / np.float32(sr)
+    table = np.float32(1) + np.float32(depth) * np.sin(np.float32(2 * np.pi * freq) * t)
+    table.setflags(write=False)
+    return table
+
+
+@lru_cache(maxsize=4)
+def _noise_table(std: float) -> np.ndarray:
+    rng = np.random.default_rng(0x5EED)
+    table = rng.standard_normal(NOISE_TABLE_SIZE, dtype=np.float32) * np.float32(std)
+    table.setflags(write=False)
+    return table
+
+
+def normalize_(y: np.ndarray, peak: float = 1.0) -> np.ndarray:
+    """Peak-normalise each note in place (librosa.util.normalize without the copy)"""
+    if not y.size:
+        return y
+    if y.ndim == 1:
+        current = max(float(y.max()), -float(y.min()))
+        if current > 0:
+            y *= np.float32(peak / current)
+        return y
+    current = np.maximum(y.max(axis=-1, keepdims=True), -y.min(axis=-1, keepdims=True))
+    current[current == 0] = 1
+    y *= np.float32(peak) / current
+    return y
+
+
+def ring_modulate_(y: np.ndarray, sr: int, freq: float = 50, depth: float = 0.3) -> np.ndarray:
+    """y *= 1 + depth * sin(2π·freq·t), using a one-second cached table"""
+    table = _ring_table(sr, freq, depth)
+    n = y.shape[-1]
+    for start in range(0, n, sr):
+        block = y[..., start:start + sr]
+        block *= table[:block.shape[-1]]
+    return y
+
+
+def add_noise_(y: np.ndarray, std: float) -> np.ndarray:
+    """Add Gaussian noise from a cached table instead of drawing a full-length array"""
+    table = _noise_table(std)
+    n = y.shape[-1]
+    for start in range(0, n, NOISE_TABLE_SIZE):
+        block = y[..., start:start + NOISE_TABLE_SIZE]
+        block += table[:block.shape[-1]]
+    return y
+
+
+def feedback_echo_(y: np.ndarray, delay: int, feedback: float) -> np.ndarray:
+    """
+    IIR comb filter y[n] = x[n] + feedback * y[n - delay], giving a decaying
+    train of echoes. Processed in delay-sized blocks: each block only depends
+    on the previous, already final one, so every step is a vectorised add.
+    """
+    n = y.shape[-1]
+    if delay <= 0 or delay >= n:
+        return y
+    g = np.float32(feedback)
+    rows = y.shape[:-1]
+    buf = scratch(int(np.prod(rows, dtype=np.int64)) * delay).reshape(rows + (delay,))
+    for start in range(delay, n, delay):
+        end = min(start + delay, n)
+        tmp = buf[..., :end - start]
+        np.multiply(y[..., start - delay:end - delay], g, out=tmp)
+        y[..., start:end] += tmp
+    return y
+
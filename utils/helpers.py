@@ -2,27 +2,12 @@
 Helper functions
 """
 import os
-import time
 from datetime import datetime, timedelta
 
 def cleanup_temp_files(directory: str = "temp_voices", hours: int = 24):
-    """Cleanup old temporary files"""
-    if not os.path.exists(directory):
-        return 0
-        
-    deleted = 0
-    cutoff = time.time() - (hours * 3600)
-    
-    for filename in os.listdir(directory):
-        filepath = os.path.join(directory, filename)
-        
-        try:
-            if os.path.getmtime(filepath) < cutoff:
-                os.remove(filepath)
-                deleted += 1
-        except:
-            pass
-            
+    """Cleanup old temporary files (blocking; utils.temp_storage schedules this off the loop)"""
+    from utils.temp_storage import sweep_directory
+    _, deleted = sweep_directory(directory, hours * 3600)
     return deleted
     
 def format_time(seconds: int) -> str:
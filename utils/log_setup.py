@@ -0,0 +1,123 @@
+"""
+Non-blocking structured logging
+
+Records are pushed onto a queue by a QueueHandler and written by a
+QueueListener thread, so handlers never block the event loop on disk I/O.
+"""
+import os
+import copy
+import json
+import time
+import queue
+import logging
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Dict, Optional, Tuple
+
+from config import Config
+
+LOG_DIR = "logs"
+
+# Attributes every LogRecord has; anything else was passed via `extra=`
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, including any `extra=` fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED and not key.startswith("_"):
+                payload[key] = value
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Let at most `burst` identical warnings/errors through per `window` seconds.
+
+    Records are keyed by logger and message template, so "Download error: %s"
+    is limited as one message regardless of its arguments. The first record
+    after a quiet window reports how many were suppressed.
+    """
+
+    def __init__(self, window: float = 60.0, burst: int = 5, min_level: int = logging.WARNING):
+        super().__init__()
+        self.window = window
+        self.burst = burst
+        self.min_level = min_level
+        self._state: Dict[Tuple[str, str], list] = {}  # key -> [window_start, count, suppressed]
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < self.min_level:
+            return True
+
+        key = (record.name, str(record.msg))
+        now = time.monotonic()
+        with self._lock:
+            state = self._state.get(key)
+            if state is None or now - state[0] >= self.window:
+                suppressed = state[2] if state else 0
+                self._state[key] = [now, 1, 0]
+                if suppressed:
+                    record.suppressed = suppressed
+                return True
+            if state[1] < self.burst:
+                state[1] += 1
+                return True
+            state[2] += 1
+            return False
+
+
+class StructuredQueueHandler(QueueHandler):
+    """QueueHandler that keeps `extra=` fields and exc_info for the JSON formatter"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The default prepare() flattens the record into a preformatted string
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def setup_logging(level: Optional[str] = None) -> QueueListener:
+    """Install the queue based logging pipeline and return the running listener"""
+    level = getattr(logging, (level or Config.LOG_LEVEL).upper(), logging.INFO)
+    os.makedirs(LOG_DIR, exist_ok=True)
+
+    formatter = JsonFormatter()
+    file_handler = RotatingFileHandler(
+        os.path.join(LOG_DIR, "bot.log"),
+        maxBytes=Config.LOG_MAX_BYTES,
+        backupCount=Config.LOG_BACKUP_COUNT,
+        encoding="utf-8",
+    )
+    file_handler.setFormatter(formatter)
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = StructuredQueueHandler(log_queue)
+    queue_handler.addFilter(RateLimitFilter(window=Config.LOG_RATE_WINDOW, burst=Config.LOG_RATE_BURST))
+
+    root = logging.getLogger()
+    root.handlers[:] = [queue_handler]
+    root.setLevel(level)
+
+    # Third-party libraries are chatty at DEBUG
+    for noisy in ("telethon", "aiogram", "pymongo", "asyncio", "numba"):
+        logging.getLogger(noisy).setLevel(max(level, logging.INFO))
+
+    listener = QueueListener(log_queue, file_handler, stream_handler, respect_handler_level=True)
+    listener.start()
+    return listener
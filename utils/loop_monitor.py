@@ -0,0 +1,122 @@
+"""
+Event loop lag monitor and blocking-call detector
+"""
+import os
+import sys
+import time
+import asyncio
+import logging
+import threading
+import traceback
+from collections import deque
+from typing import Optional
+
+from config import Config
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+LOOP_LAG_SECONDS = metrics.histogram(
+    "event_loop_lag_seconds", "Delay between a timer's due time and when the loop ran it",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+)
+LOOP_STALLS = metrics.counter(
+    "event_loop_stalls_total", "Times the loop was blocked longer than the stall threshold", ("handler",)
+)
+
+_HANDLERS_DIR = os.sep + "handlers" + os.sep
+
+
+def _blocking_handler(frame) -> str:
+    """Name the outermost bot handler on the blocked stack, if any"""
+    found = "unknown"
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if _HANDLERS_DIR in filename:
+            module = os.path.splitext(os.path.basename(filename))[0]
+            found = f"{module}.{frame.f_code.co_name}"
+        frame = frame.f_back
+    return found
+
+
+class LoopMonitor:
+    """
+    A loop task samples scheduling lag every `interval` seconds and bumps a
+    heartbeat. A watchdog thread notices when the heartbeat goes stale for
+    longer than `stall_threshold` and captures the loop thread's stack while
+    it is still blocked, so the report points at the offending code.
+    """
+
+    def __init__(self, interval: float = 0.1, stall_threshold: float = 0.5, window: int = 3000):
+        self.interval = interval
+        self.stall_threshold = max(stall_threshold, interval * 2)
+        self.samples = deque(maxlen=window)
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._heartbeat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+
+        for q in (0.5, 0.95, 0.99):
+            gauge = metrics.gauge(
+                f"event_loop_lag_p{int(q * 100)}_seconds",
+                f"p{int(q * 100)} event loop lag over the recent window"
+            )
+            gauge.set_function(lambda q=q: self.percentile(q))
+
+    def percentile(self, q: float) -> float:
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def start(self):
+        """Start sampling; must be called from the running loop"""
+        if self._task:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._sample())
+        self._thread = threading.Thread(target=self._watchdog, name="loop-watchdog", daemon=True)
+        self._thread.start()
+        logger.info("Loop monitor started (stall threshold %.2fs)", self.stall_threshold)
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        self._stop.set()
+
+    async def _sample(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - start - self.interval)
+            self.samples.append(lag)
+            LOOP_LAG_SECONDS.observe(lag)
+            self._heartbeat = time.monotonic()
+
+    def _watchdog(self):
+        reported_beat = None
+        while not self._stop.wait(self.interval):
+            beat = self._heartbeat
+            stalled = time.monotonic() - beat
+            if stalled < self.stall_threshold or beat == reported_beat:
+                continue
+
+            # Report each stall once, while the loop thread is still stuck in it
+            reported_beat = beat
+            frame = sys._current_frames().get(self._loop_thread_id)
+            handler = _blocking_handler(frame)
+            stack = "".join(traceback.format_stack(frame)[-12:]) if frame else ""
+            LOOP_STALLS.inc(handler=handler)
+            logger.warning(
+                "Event loop blocked for %.2fs in %s", stalled, handler,
+                extra={"handler": handler, "stack": stack}
+            )
+
+
+# Global instance
+loop_monitor = LoopMonitor(Config.LOOP_LAG_INTERVAL, Config.LOOP_STALL_THRESHOLD)
@@ -0,0 +1,331 @@
+"""
+In-process metrics registry with Prometheus text rendering
+"""
+import time
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional, Tuple
+
+# Seconds; tuned for a voice pipeline where stages range from ms to tens of seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labelnames: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        # DSP may run in executor threads, so updates must not rely on the GIL alone
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict) -> Tuple:
+        return tuple(labels.get(name, "") for name in self.labelnames)
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help_text}"
+        yield f"# TYPE {self.name} {self.kind}"
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, help_text, labelnames=()):
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def items(self):
+        with self._lock:
+            return list(self._values.items())
+
+    def render(self):
+        yield from super().render()
+        for key, value in self.items():
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {value}"
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name, help_text, labelnames=()):
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[Tuple, float] = {}
+        self._function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, function: Callable[[], float]):
+        """Compute the (unlabelled) value lazily at collection time"""
+        self._function = function
+
+    def get(self, **labels) -> float:
+        if self._function is not None:
+            return self._function()
+        return self._values.get(self._key(labels), 0)
+
+    def items(self):
+        if self._function is not None:
+            try:
+                return [((), self._function())]
+            except Exception:
+                return []
+        with self._lock:
+            return list(self._values.items())
+
+    def render(self):
+        yield from super().render()
+        for key, value in self.items():
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {value}"
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label key -> [bucket counts..., sum, count]
+        self._values: Dict[Tuple, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def items(self):
+        with self._lock:
+            return [(key, list(state)) for key, state in self._values.items()]
+
+    def quantile(self, q: float, state: list) -> float:
+        """
+        Approximate a quantile from bucket counts (upper bound of the bucket).
+        Capped at the largest bound when it falls past the last bucket; see
+        `overflows`.
+        """
+        count = state[-1]
+        if not count:
+            return 0.0
+        target = q * count
+        seen = 0
+        for i, bound in enumerate(self.buckets):
+            seen += state[i]
+            if seen >= target:
+                return bound
+        return self.buckets[-1]
+
+    def overflows(self, q: float, state: list) -> bool:
+        """True if the quantile lies above the largest bucket bound"""
+        return q * state[-1] > sum(state[:len(self.buckets)])
+
+    def quantile_text(self, q: float, state: list) -> str:
+        """Summary form of a quantile: ≤Xms, or >Xms past the largest bucket"""
+        sign = ">" if self.overflows(q, state) else "≤"
+        return f"{sign}{self.quantile(q, state) * 1000:.0f}ms"
+
+    def render(self):
+        yield from super().render()
+        for key, state in self.items():
+            cumulative = 0
+            for i, bound in enumerate(self.buckets):
+                cumulative += state[i]
+                labels = _format_labels(self.labelnames, key, f'le="{bound}"')
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, key, 'le="+Inf"')
+            yield f"{self.name}_bucket{labels} {state[-1]}"
+            plain = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{plain} {state[-2]}"
+            yield f"{self.name}_count{plain} {state[-1]}"
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, help_text, labelnames, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help_text, tuple(labelnames), **kwargs)
+            return metric
+
+    def counter(self, name: str, help_text: str, labelnames=()) -> Counter:
+        return self._get_or_create(Counter, name, help_text, labelnames)
+
+    def gauge(self, name: str, help_text: str, labelnames=()) -> Gauge:
+        return self._get_or_create(Gauge, name, help_text, labelnames)
+
+    def histogram(self, name: str, help_text: str, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, help_text, labelnames, buckets=buckets)
+
+    @contextmanager
+    def span(self, stage: str):
+        """Time a voice pipeline stage into `voice_stage_seconds`"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage)
+
+    def render_prometheus(self) -> str:
+        """Render every metric in the Prometheus text exposition format"""
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def render_summary(self) -> str:
+        """Short human readable dump for the /metrics owner command"""
+        lines = []
+        for metric in list(self._metrics.values()):
+            if isinstance(metric, Histogram):
+                for key, state in metric.items():
+                    count = state[-1]
+                    if not count:
+                        continue
+                    label = ",".join(str(v) for v in key)
+                    lines.append(
+                        f"{metric.name}[{label}] n={count} "
+                        f"avg={state[-2] / count * 1000:.0f}ms "
+                        f"p50{metric.quantile_text(0.5, state)} "
+                        f"p95{metric.quantile_text(0.95, state)}"
+                    )
+            else:
+                for key, value in metric.items():
+                    label = ",".join(str(v) for v in key)
+                    suffix = f"[{label}]" if label else ""
+                    lines.append(f"{metric.name}{suffix} = {value:g}")
+        return "\n".join(lines) if lines else "No metrics recorded yet"
+
+
+# Global instance
+metrics = MetricsRegistry()
+
+# Voice pipeline
+STAGE_SECONDS = metrics.histogram(
+    "voice_stage_seconds", "Time spent in each voice pipeline stage", ("stage",)
+)
+FILTER_SECONDS = metrics.histogram(
+    "voice_filter_seconds", "DSP time per voice filter", ("filter",)
+)
+QUEUE_WAIT_SECONDS = metrics.histogram(
+    "voice_queue_wait_seconds", "Time a voice note waits in the DSP job queue before a worker picks it up"
+)
+PIPELINE_SECONDS = metrics.histogram(
+    "voice_pipeline_seconds", "End-to-end voice pipeline latency", ("result",)
+)
+OUTPUT_BYTES = metrics.histogram(
+    "voice_output_bytes", "Size of encoded voice notes",
+    buckets=(8_000, 16_000, 32_000, 64_000, 128_000, 256_000, 512_000, 1_000_000, 2_000_000, 5_000_000)
+)
+FIRST_AUDIO_SECONDS = metrics.histogram(
+    "voice_time_to_first_audio_seconds", "From receiving a note to its first processed audio going out",
+    ("via",)
+)
+QUOTA_REJECTIONS = metrics.counter(
+    "voice_quota_rejections_total", "Notes refused by per-user daily quotas", ("kind",)
+)
+JOBS_IN_FLIGHT = metrics.gauge(
+    "voice_jobs_in_flight", "Voice notes currently being processed"
+)
+DSP_CPU_SECONDS = metrics.counter(
+    "voice_dsp_cpu_seconds_total", "CPU time spent in DSP filters", ("filter",)
+)
+
+# Bot
+UPDATES_TOTAL = metrics.counter(
+    "bot_updates_total", "Updates handled per handler", ("type", "handler")
+)
+HANDLER_SECONDS = metrics.histogram(
+    "bot_handler_seconds", "Handler execution time", ("handler",)
+)
+
+# Database
+MONGO_COMMAND_SECONDS = metrics.histogram(
+    "mongo_command_seconds", "MongoDB command latency", ("command",)
+)
+MONGO_COMMAND_FAILURES = metrics.counter(
+    "mongo_command_failures_total", "Failed MongoDB commands", ("command",)
+)
+
+# UserBot
+TELETHON_RPC_SECONDS = metrics.histogram(
+    "telethon_rpc_seconds", "Telethon RPC latency", ("method",)
+)
+TELETHON_FLOOD_WAITS = metrics.counter(
+    "telethon_flood_waits_total", "FloodWait errors returned by Telegram", ("method",)
+)
+TELETHON_FLOOD_WAIT_SECONDS = metrics.counter(
+    "telethon_flood_wait_seconds_total", "Seconds Telegram asked us to wait", ("method",)
+)
+TELETHON_RPC_WAIT_SECONDS = metrics.histogram(
+    "telethon_rpc_wait_seconds", "Time RPCs spend waiting for rate limit tokens or FloodWaits", ("method",)
+)
+TELETHON_RPC_RETRIES = metrics.counter(
+    "telethon_rpc_retries_total", "RPCs retried after a FloodWait", ("method",)
+)
+TELETHON_RPC_COALESCED = metrics.counter(
+    "telethon_rpc_coalesced_total", "Reads served by an identical call already in flight", ("method",)
+)
+TELETHON_RPC_DEADLINES = metrics.counter(
+    "telethon_rpc_deadline_exceeded_total", "RPCs given up because waiting would pass their deadline", ("method",)
+)
+
+# Storage and caches
+TEMP_DIR_BYTES = metrics.gauge(
+    "temp_dir_bytes", "Bytes currently stored in the temp voice directory"
+)
+CACHE_REQUESTS = metrics.counter(
+    "cache_requests_total", "Cache lookups by cache and result (hit/miss)", ("cache", "result")
+)
+
+
+def record_cache(cache: str, hit: bool):
+    """Count a cache lookup for hit-rate tracking"""
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
@@ -0,0 +1,44 @@
+"""
+Aiogram middleware counting handled updates and handler latency
+"""
+import time
+
+from aiogram import types
+from aiogram.dispatcher.handler import current_handler
+from aiogram.dispatcher.middlewares import BaseMiddleware
+
+from utils.metrics import UPDATES_TOTAL, HANDLER_SECONDS
+
+
+def _handler_name() -> str:
+    try:
+        return current_handler.get().__name__
+    except LookupError:
+        return "unhandled"
+
+
+class MetricsMiddleware(BaseMiddleware):
+    """Records per-handler update counts and latency"""
+
+    def _start(self, data: dict):
+        data["_metrics_handler"] = _handler_name()
+        data["_metrics_started"] = time.perf_counter()
+
+    def _finish(self, kind: str, data: dict):
+        handler = data.get("_metrics_handler", "unhandled")
+        UPDATES_TOTAL.inc(type=kind, handler=handler)
+        started = data.get("_metrics_started")
+        if started is not None:
+            HANDLER_SECONDS.observe(time.perf_counter() - started, handler=handler)
+
+    async def on_process_message(self, message: types.Message, data: dict):
+        self._start(data)
+
+    async def on_post_process_message(self, message: types.Message, results, data: dict):
+        self._finish("message", data)
+
+    async def on_process_callback_query(self, callback_query: types.CallbackQuery, data: dict):
+        self._start(data)
+
+    async def on_post_process_callback_query(self, callback_query: types.CallbackQuery, results, data: dict):
+        self._finish("callback_query", data)
@@ -0,0 +1,45 @@
+"""
+Lightweight aiohttp server exposing /metrics in Prometheus text format
+"""
+import logging
+from typing import Optional
+
+from aiohttp import web
+
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+async def _handle_metrics(request: web.Request) -> web.Response:
+    return web.Response(
+        text=metrics.render_prometheus(),
+        content_type="text/plain",
+        headers={"X-Content-Type-Options": "nosniff"},
+    )
+
+
+class MetricsServer:
+    def __init__(self):
+        self.runner: Optional[web.AppRunner] = None
+
+    async def start(self, port: int, host: str = "0.0.0.0"):
+        """Start serving /metrics on the given port"""
+        if self.runner:
+            return
+        app = web.Application()
+        app.router.add_get("/metrics", _handle_metrics)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, host, port).start()
+        logger.info("Metrics endpoint listening on %s:%d/metrics", host, port)
+
+    async def stop(self):
+        """Stop the server"""
+        if self.runner:
+            await self.runner.cleanup()
+            self.runner = None
+
+
+# Global instance
+metrics_server = MetricsServer()
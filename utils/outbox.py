@@ -0,0 +1,210 @@
+"""
+Outbound Bot API sender
+
+Bot API limits are roughly 30 messages per second overall, about one per
+second in a private chat and 20 per minute in a group. Sends and edits
+that go through the Outbox wait for a global and a per-chat token instead
+of being refused with RetryAfter, and a RetryAfter that still happens is
+slept off and retried.
+
+Broadcasts also draw from their own, lower bucket, so a bulk send leaves
+room under the global limit for replies and status edits.
+
+Edits of one message are coalesced: while an edit is waiting for its
+token, newer edits just replace its text, so a status message updated in
+a tight loop costs one request per token rather than one per update.
+"""
+import time
+import asyncio
+import logging
+from typing import AsyncIterator, Awaitable, Callable, Dict, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.utils.exceptions import ChatNotFound, MessageNotModified, RetryAfter, Unauthorized
+
+from utils.metrics import metrics
+from utils.rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_WAIT_SECONDS = metrics.histogram(
+    "bot_outbox_wait_seconds", "Time outbound Bot API calls wait for rate limit tokens", ("method",)
+)
+OUTBOX_SENT = metrics.counter(
+    "bot_outbox_requests_total", "Outbound Bot API calls by method and result", ("method", "result")
+)
+OUTBOX_COALESCED = metrics.counter(
+    "bot_outbox_edits_coalesced_total", "Message edits superseded by a newer edit before being sent"
+)
+OUTBOX_RETRY_AFTER = metrics.counter(
+    "bot_outbox_retry_after_total", "RetryAfter errors returned by the Bot API", ("method",)
+)
+
+
+class _PendingEdit:
+    __slots__ = ("text", "kwargs", "version", "done")
+
+    def __init__(self, text: str, kwargs: dict, done: asyncio.Future):
+        self.text = text
+        self.kwargs = kwargs
+        self.version = 0
+        self.done = done
+
+
+class Outbox:
+    def __init__(self, bot: Bot, rate: Tuple[float, float] = (25, 25),
+                 chat_rate: Tuple[float, float] = (1, 3), group_rate: Tuple[float, float] = (0.33, 3),
+                 broadcast_rate: Tuple[float, float] = (15, 15), retries: int = 3):
+        """Rates are (per second, burst): overall, per private chat, per group chat, for broadcasts"""
+        self.bot = bot
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate
+        self.retries = retries
+        self._global = TokenBucket(*rate)
+        self._broadcast = TokenBucket(*broadcast_rate)
+        self._chats: Dict[int, TokenBucket] = {}
+        self._edits: Dict[Tuple[int, int], _PendingEdit] = {}
+        # Claimed by the caller for the whole broadcast, not by broadcast() itself
+        self.broadcasting = False
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            # Group and channel ids are negative
+            bucket = self._chats[chat_id] = TokenBucket(*(self.group_rate if chat_id < 0 else self.chat_rate))
+            if len(self._chats) > 10_000:
+                # Drop idle (full) buckets; a new one starts full anyway
+                self._chats = {
+                    key: b for key, b in self._chats.items()
+                    if b is bucket or b.wait_time(b.capacity) > 0
+                }
+        return bucket
+
+    async def _acquire(self, method: str, chat_id: int, extra: Optional[TokenBucket] = None):
+        buckets = (self._global, self._chat_bucket(chat_id)) + ((extra,) if extra is not None else ())
+        start = time.monotonic()
+        while True:
+            now = time.monotonic()
+            wait = max(bucket.wait_time(1, now) for bucket in buckets)
+            if not wait:
+                for bucket in buckets:
+                    bucket.take(1, now)
+                break
+            await asyncio.sleep(wait)
+        OUTBOX_WAIT_SECONDS.observe(time.monotonic() - start, method=method)
+
+    async def call(self, method: str, chat_id: int, request: Callable[[], Awaitable],
+                   extra: Optional[TokenBucket] = None):
+        """Run one Bot API request under the global, `chat_id` (and `extra`) limits, sleeping off RetryAfter"""
+        for attempt in range(self.retries + 1):
+            await self._acquire(method, chat_id, extra)
+            try:
+                result = await request()
+            except RetryAfter as e:
+                OUTBOX_RETRY_AFTER.inc(method=method)
+                if attempt == self.retries:
+                    OUTBOX_SENT.inc(method=method, result="error")
+                    raise
+                logger.warning("RetryAfter %ss on %s to %s", e.timeout, method, chat_id)
+                await asyncio.sleep(e.timeout)
+                continue
+            except Exception:
+                OUTBOX_SENT.inc(method=method, result="error")
+                raise
+            OUTBOX_SENT.inc(method=method, result="ok")
+            return result
+
+    async def send_message(self, chat_id: int, text: str, **kwargs):
+        return await self.call("send_message", chat_id, lambda: self.bot.send_message(chat_id, text, **kwargs))
+
+    async def edit_text(self, chat_id: int, message_id: int, text: str, **kwargs):
+        """
+        Edit a message's text. If an edit of the same message is still
+        waiting, it is replaced by this one; both callers return once a text
+        at least as new as theirs has been sent.
+        """
+        key = (chat_id, message_id)
+        edit = self._edits.get(key)
+        if edit is not None:
+            OUTBOX_COALESCED.inc()
+            edit.text, edit.kwargs = text, kwargs
+            edit.version += 1
+        else:
+            edit = self._edits[key] = _PendingEdit(text, kwargs, asyncio.get_running_loop().create_future())
+            asyncio.ensure_future(self._run_edit(key, edit))
+        await asyncio.shield(edit.done)
+
+    async def _run_edit(self, key: Tuple[int, int], edit: _PendingEdit):
+        chat_id, message_id = key
+        sent = None
+
+        def request():
+            # Read once the tokens are granted, so edits made while waiting are folded in
+            nonlocal sent
+            sent = edit.version
+            return self.bot.edit_message_text(edit.text, chat_id, message_id, **edit.kwargs)
+
+        try:
+            while sent != edit.version:
+                try:
+                    await self.call("edit_message_text", chat_id, request)
+                except MessageNotModified:
+                    pass
+            edit.done.set_result(None)
+        except Exception as e:
+            edit.done.set_exception(e)
+        finally:
+            self._edits.pop(key, None)
+
+    async def broadcast(self, chat_ids: AsyncIterator[int], text: str,
+                        progress: Optional[Callable[[dict], Awaitable]] = None,
+                        concurrency: int = 25, progress_interval: float = 3) -> dict:
+        """
+        Send `text` to every chat id the iterator yields, at most
+        `concurrency` sends in flight, without loading the list up front.
+        `progress` gets the running counts every `progress_interval`
+        seconds and once at the end.
+        """
+        counts = {"sent": 0, "unreachable": 0, "failed": 0}
+        semaphore = asyncio.Semaphore(concurrency)
+        pending = set()
+        last_report = time.monotonic()
+
+        async def send(chat_id: int):
+            try:
+                await self.call(
+                    "broadcast", chat_id, lambda: self.bot.send_message(chat_id, text), extra=self._broadcast
+                )
+                counts["sent"] += 1
+            except (Unauthorized, ChatNotFound):
+                # Blocked the bot, deactivated, or never started it
+                counts["unreachable"] += 1
+            except Exception as e:
+                logger.warning("Broadcast to %s failed: %s", chat_id, e)
+                counts["failed"] += 1
+            finally:
+                semaphore.release()
+
+        async def report():
+            # A failed status edit (e.g. the message was deleted) must not stop the sends
+            try:
+                await progress(dict(counts))
+            except Exception as e:
+                logger.warning("Broadcast progress update failed: %s", e)
+
+        try:
+            async for chat_id in chat_ids:
+                await semaphore.acquire()
+                task = asyncio.ensure_future(send(chat_id))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+                if progress and time.monotonic() - last_report >= progress_interval:
+                    last_report = time.monotonic()
+                    await report()
+        finally:
+            # Never leave sends running behind our back, even if iterating users failed
+            if pending:
+                await asyncio.gather(*pending)
+        if progress:
+            await report()
+        return counts
@@ -0,0 +1,44 @@
+"""
+In-memory LRU of encoded voice notes
+
+Keyed by (file_unique_id, filter, params). Resending the same note with the
+same settings, e.g. forwarding it to the bot again, skips the download and
+all DSP. Encoded Opus notes are small (~240 KB for a minute at 32 kbps), so
+a few dozen MB hold plenty.
+"""
+from collections import OrderedDict
+from typing import Hashable, Optional
+
+from utils.metrics import metrics, record_cache
+
+OUTPUT_CACHE_BYTES = metrics.gauge("output_cache_bytes", "Bytes of encoded notes held in the output cache")
+
+
+class OutputCache:
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries: "OrderedDict[Hashable, bytes]" = OrderedDict()
+        OUTPUT_CACHE_BYTES.set_function(lambda: self.size)
+
+    def get(self, key: Hashable) -> Optional[bytes]:
+        data = self._entries.get(key)
+        record_cache("output", data is not None)
+        if data is not None:
+            self._entries.move_to_end(key)
+        return data
+
+    def put(self, key: Hashable, data: bytes):
+        if len(data) > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.size -= len(old)
+        self._entries[key] = data
+        self.size += len(data)
+        while self.size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= len(evicted)
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,140 @@
+"""
+Per-user store of the last decoded voice note
+
+Keeps each user's most recent PCM so it can be re-filtered without
+downloading or decoding again. Two tiers, both LRU and bounded in bytes:
+arrays in RAM, and `.npy` files that RAM evictions spill to. Spilled notes
+are memory-mapped on read, so a replay only pages in what the DSP touches.
+
+Stored arrays are made read-only: the DSP works in place, and as_float32
+hands it a private copy of a read-only input.
+"""
+import os
+import logging
+import threading
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+from utils.metrics import metrics, record_cache
+
+logger = logging.getLogger(__name__)
+
+PCM_STORE_BYTES = metrics.gauge("pcm_store_bytes", "Bytes of last-note PCM held per tier", ("tier",))
+
+
+class StoredNote(NamedTuple):
+    y: np.ndarray
+    sr: int
+    file_unique_id: Optional[str]
+
+
+class PCMStore:
+    def __init__(self, spill_dir: str, ram_bytes: int, disk_bytes: int):
+        self.spill_dir = spill_dir
+        self.ram_bytes = ram_bytes
+        self.disk_bytes = disk_bytes
+        self._ram: "OrderedDict[int, StoredNote]" = OrderedDict()
+        self._disk: "OrderedDict[int, tuple]" = OrderedDict()  # user_id -> (path, sr, file_unique_id, nbytes)
+        self._ram_size = 0
+        self._disk_size = 0
+        self._lock = threading.Lock()
+        PCM_STORE_BYTES.set(0, tier="ram")
+        PCM_STORE_BYTES.set(0, tier="disk")
+
+    def put(self, user_id: int, y: np.ndarray, sr: int, file_unique_id: Optional[str] = None):
+        """Remember `y` as the user's last note (blocking: may spill to disk)"""
+        y.setflags(write=False)
+        with self._lock:
+            self._drop(user_id)
+            self._ram[user_id] = StoredNote(y, sr, file_unique_id)
+            self._ram_size += y.nbytes
+            spill = []
+            while self._ram_size > self.ram_bytes and len(self._ram) > 1:
+                old_user, note = self._ram.popitem(last=False)
+                self._ram_size -= note.y.nbytes
+                spill.append((old_user, note))
+        # Disk writes happen outside the lock; a concurrent get just misses meanwhile
+        for old_user, note in spill:
+            self._spill(old_user, note)
+        self._report()
+
+    def has(self, user_id: int) -> bool:
+        with self._lock:
+            return user_id in self._ram or user_id in self._disk
+
+    def get(self, user_id: int) -> Optional[StoredNote]:
+        with self._lock:
+            note = self._ram.get(user_id)
+            if note is not None:
+                self._ram.move_to_end(user_id)
+                record_cache("pcm_ram", True)
+                return note
+            record_cache("pcm_ram", False)
+            entry = self._disk.get(user_id)
+            if entry is not None:
+                self._disk.move_to_end(user_id)
+        if entry is None:
+            record_cache("pcm_disk", False)
+            return None
+
+        path, sr, file_unique_id, _ = entry
+        try:
+            y = np.load(path, mmap_mode="r")
+        except (OSError, ValueError) as e:
+            # Swept or truncated behind our back
+            logger.warning("Spilled PCM for %s unreadable: %s", user_id, e)
+            with self._lock:
+                self._drop(user_id)
+            record_cache("pcm_disk", False)
+            return None
+        record_cache("pcm_disk", True)
+        return StoredNote(y, sr, file_unique_id)
+
+    def _spill(self, user_id: int, note: StoredNote):
+        if note.y.nbytes > self.disk_bytes:
+            return
+        os.makedirs(self.spill_dir, exist_ok=True)
+        path = os.path.join(self.spill_dir, f"pcm_{user_id}.npy")
+        try:
+            np.save(path, note.y, allow_pickle=False)
+        except OSError as e:
+            logger.warning("Could not spill PCM for %s: %s", user_id, e)
+            return
+        with self._lock:
+            stale = user_id in self._ram
+            if not stale:
+                self._disk[user_id] = (path, note.sr, note.file_unique_id, note.y.nbytes)
+                self._disk_size += note.y.nbytes
+            evicted = []
+            while self._disk_size > self.disk_bytes and self._disk:
+                old_user, (old_path, _, _, nbytes) = self._disk.popitem(last=False)
+                self._disk_size -= nbytes
+                evicted.append(old_path)
+        if stale:
+            # A newer note arrived while we were writing; it wins
+            evicted.append(path)
+        for old_path in evicted:
+            self._unlink(old_path)
+
+    def _drop(self, user_id: int):
+        """Forget any stored note for `user_id` (caller holds the lock)"""
+        note = self._ram.pop(user_id, None)
+        if note is not None:
+            self._ram_size -= note.y.nbytes
+        entry = self._disk.pop(user_id, None)
+        if entry is not None:
+            self._disk_size -= entry[3]
+            self._unlink(entry[0])
+
+    @staticmethod
+    def _unlink(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _report(self):
+        PCM_STORE_BYTES.set(self._ram_size, tier="ram")
+        PCM_STORE_BYTES.set(self._disk_size, tier="disk")
@@ -0,0 +1,28 @@
+"""
+DSP quality tiers
+
+Cheaper variants of the voice pipeline for when the DSP queue backs up.
+Each tier lowers the internal sample rate and STFT size; the last one also
+drops the phase vocoder, pitch shifting by resampling alone (which slows
+the note down along with the pitch) and ignoring the speed parameter.
+"""
+from typing import NamedTuple
+
+from config import Config
+
+
+class QualityTier(NamedTuple):
+    name: str
+    sample_rate: int
+    n_fft: int
+    hop_length: int
+    phase_vocoder: bool  # False: pitch shift by resampling only
+    time_stretch: bool  # False: the speed parameter is ignored
+
+
+TIERS = (
+    QualityTier("full", 44100, Config.STFT_N_FFT, Config.STFT_HOP, True, True),
+    QualityTier("reduced", 22050, max(Config.STFT_N_FFT // 2, 256), max(Config.STFT_HOP // 2, 64), True, True),
+    QualityTier("economy", 16000, 512, 128, False, False),
+)
+FULL_QUALITY = TIERS[0]
@@ -0,0 +1,100 @@
+"""
+Token bucket rate limiting
+
+Buckets live in process memory, one per (user, handler) key, and decide
+every rejection on their own. With a shared store (Mongo), requests the
+local bucket lets through are also counted in a fixed window shared by
+all bot instances; a shared rejection empties the local bucket, so the
+next attempts are turned away locally again.
+"""
+import time
+import logging
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """`capacity` tokens, refilled continuously at `rate` tokens per second"""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float, now: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic() if now is None else now
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, cost: float = 1, now: Optional[float] = None) -> float:
+        """Seconds until `cost` tokens are available, without spending any"""
+        self._refill(time.monotonic() if now is None else now)
+        if self.tokens >= cost:
+            return 0.0
+        if cost > self.capacity:
+            return float("inf")
+        return (cost - self.tokens) / self.rate if self.rate > 0 else float("inf")
+
+    def take(self, cost: float = 1, now: Optional[float] = None) -> float:
+        """Spend `cost` tokens; 0 on success, else seconds until they would be available"""
+        wait = self.wait_time(cost, now)
+        if not wait:
+            self.tokens -= cost
+        return wait
+
+    def drain(self):
+        self.tokens = 0.0
+
+
+class RateLimiter:
+    """Token buckets by key, keeping at most `max_keys` (least recently used are dropped)"""
+
+    def __init__(self, rate: float, capacity: float, store=None, max_keys: int = 50_000):
+        self.rate = rate
+        self.capacity = capacity
+        self.store = store
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[Hashable, TokenBucket]" = OrderedDict()
+        # Shared-store window: the time an empty bucket takes to refill
+        self.window = max(1, int(round(capacity / rate))) if rate > 0 else 60
+
+    def bucket(self, key: Hashable) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(self.rate, self.capacity)
+            if len(self._buckets) > self.max_keys:
+                # The oldest has usually refilled by now, and a recreated bucket starts full anyway
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
+
+    def check(self, key: Hashable, cost: float = 1) -> float:
+        """Local decision only: 0 if allowed, else seconds to wait"""
+        return self.bucket(key).take(cost)
+
+    async def check_shared(self, key: Hashable, cost: float = 1) -> float:
+        """
+        Ask the shared store about a request the local bucket allowed. A
+        window admits what a full bucket plus one window of refill would.
+        Store errors fail open.
+        """
+        if self.store is None:
+            return 0.0
+        now = time.time()
+        window_start = int(now // self.window) * self.window
+        expires_at = datetime.utcfromtimestamp(window_start) + timedelta(seconds=2 * self.window)
+        try:
+            used = await self.store.hit_rate_window(f"{key}:{window_start}", cost, expires_at)
+        except Exception as e:
+            logger.debug("Shared rate limit unavailable: %s", e)
+            return 0.0
+        if used <= self.capacity + self.rate * self.window:
+            return 0.0
+        self.bucket(key).drain()
+        return window_start + self.window - now
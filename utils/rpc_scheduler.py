@@ -0,0 +1,131 @@
+"""
+FloodWait-aware scheduler for Telethon RPCs
+
+Every UserBot client logs in with the same session, so Telegram's flood
+limits apply to all of them together. Calls go through one scheduler that:
+
+* paces each method, and each chat, with token buckets, sleeping for a
+  token rather than letting Telegram refuse the call;
+* on FloodWaitError holds every caller of that method until the wait is
+  over, then retries, as long as the call's deadline allows it;
+* coalesces identical in-flight reads (e.g. get_entity for one chat while
+  several notes fan out to it) into a single request.
+
+Calls are passed as factories, since a retry needs a fresh coroutine.
+"""
+import time
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from telethon.errors import FloodWaitError
+
+from utils.metrics import (
+    TELETHON_RPC_SECONDS, TELETHON_FLOOD_WAITS, TELETHON_FLOOD_WAIT_SECONDS,
+    TELETHON_RPC_WAIT_SECONDS, TELETHON_RPC_RETRIES, TELETHON_RPC_COALESCED, TELETHON_RPC_DEADLINES
+)
+from utils.rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+
+class RPCDeadlineExceeded(Exception):
+    pass
+
+
+class RPCScheduler:
+    def __init__(self, default_rate: Tuple[float, float], method_rates: Dict[str, Tuple[float, float]] = None,
+                 chat_rate: Tuple[float, float] = (1, 3), deadline: float = 60, max_flood_wait: float = 30):
+        """Rates are (tokens per second, burst)"""
+        self.default_rate = default_rate
+        self.method_rates = method_rates or {}
+        self.chat_rate = chat_rate
+        self.deadline = deadline
+        self.max_flood_wait = max_flood_wait
+        self._methods: Dict[str, TokenBucket] = {}
+        self._chats: Dict[Hashable, TokenBucket] = {}
+        self._blocked_until: Dict[str, float] = {}
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+
+    def _method_bucket(self, method: str) -> TokenBucket:
+        bucket = self._methods.get(method)
+        if bucket is None:
+            rate, burst = self.method_rates.get(method, self.default_rate)
+            bucket = self._methods[method] = TokenBucket(rate, burst)
+        return bucket
+
+    def _chat_bucket(self, chat_id: Hashable) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            bucket = self._chats[chat_id] = TokenBucket(*self.chat_rate)
+            if len(self._chats) > 10_000:
+                # Drop idle (full) buckets; a new one starts full anyway
+                self._chats = {
+                    key: b for key, b in self._chats.items()
+                    if b is bucket or b.wait_time(b.capacity) > 0
+                }
+        return bucket
+
+    async def _acquire(self, method: str, chat_id: Optional[Hashable], deadline: float):
+        """Sleep until the method (and chat, for writes to one) have a token, then spend it"""
+        buckets = [self._method_bucket(method)]
+        if chat_id is not None:
+            buckets.append(self._chat_bucket(chat_id))
+        start = time.monotonic()
+        while True:
+            now = time.monotonic()
+            wait = max(
+                self._blocked_until.get(method, 0) - now,
+                *(bucket.wait_time(1, now) for bucket in buckets)
+            )
+            if wait <= 0:
+                # Nothing awaits between the check and here, so the tokens are still there
+                for bucket in buckets:
+                    bucket.take(1, now)
+                break
+            if now + wait > deadline:
+                TELETHON_RPC_DEADLINES.inc(method=method)
+                raise RPCDeadlineExceeded(f"{method}: would wait {wait:.0f}s past its deadline")
+            await asyncio.sleep(wait)
+        TELETHON_RPC_WAIT_SECONDS.observe(time.monotonic() - start, method=method)
+
+    async def call(self, method: str, factory: Callable[[], Awaitable], chat_id: Optional[Hashable] = None,
+                   deadline: Optional[float] = None, coalesce: Optional[Hashable] = None) -> Any:
+        """
+        Run `factory()` under the method's (and `chat_id`'s) limits, retrying
+        after FloodWaits until `deadline` seconds from now. Calls sharing a
+        `coalesce` key while one is in flight get that call's result.
+        """
+        if coalesce is None:
+            return await self._call(method, factory, chat_id, deadline)
+
+        key = (method, coalesce)
+        task = self._inflight.get(key)
+        if task is not None:
+            TELETHON_RPC_COALESCED.inc(method=method)
+        else:
+            task = self._inflight[key] = asyncio.ensure_future(self._call(method, factory, chat_id, deadline))
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # One caller giving up must not cancel the request for the others
+        return await asyncio.shield(task)
+
+    async def _call(self, method: str, factory: Callable[[], Awaitable], chat_id: Optional[Hashable],
+                    deadline: Optional[float]) -> Any:
+        deadline = time.monotonic() + (self.deadline if deadline is None else deadline)
+        while True:
+            await self._acquire(method, chat_id, deadline)
+            start = time.perf_counter()
+            try:
+                return await factory()
+            except FloodWaitError as e:
+                TELETHON_FLOOD_WAITS.inc(method=method)
+                TELETHON_FLOOD_WAIT_SECONDS.inc(e.seconds, method=method)
+                # Telegram's wait applies to the account, so hold every caller of this method
+                until = time.monotonic() + e.seconds
+                self._blocked_until[method] = max(self._blocked_until.get(method, 0), until)
+                if e.seconds > self.max_flood_wait or until > deadline:
+                    raise
+                TELETHON_RPC_RETRIES.inc(method=method)
+                logger.warning("FloodWait of %ds on %s, retrying", e.seconds, method)
+            finally:
+                TELETHON_RPC_SECONDS.observe(time.perf_counter() - start, method=method)
@@ -0,0 +1,74 @@
+"""
+Single-STFT spectral pipeline
+
+The signal is transformed once, each spectral stage edits the same complex
+matrix in place, an optional phase-vocoder stretch runs last, and one ISTFT
+reconstructs the result. A chain of librosa effects would otherwise do an
+STFT/ISTFT round trip per effect. Works along the last axis like the
+kernels, so (notes, samples) batches go through in one call.
+"""
+from functools import lru_cache
+from typing import Callable, Sequence
+
+import numpy as np
+import librosa
+
+# (stft matrix (..., bins, frames), bin frequencies) -> stft matrix
+SpectralStage = Callable[[np.ndarray, np.ndarray], np.ndarray]
+
+
+@lru_cache(maxsize=32)
+def _shelf_gains(sr: int, n_fft: int, cutoff: float, gain: float, order: int) -> np.ndarray:
+    # Zero-phase magnitude of y + gain * butter_lowpass(y): 1 + gain * |H(f)|
+    freqs = librosa.fft_frequencies(sr=sr, n_fft=n_fft)
+    gains = (1 + gain / np.sqrt(1 + (freqs / cutoff) ** (2 * order))).astype(np.float32)
+    gains.setflags(write=False)
+    return gains[:, None]
+
+
+def bass_shelf(sr: int, n_fft: int, cutoff: float, gain: float, order: int = 4) -> SpectralStage:
+    """Low shelf equivalent to adding `gain` times a Butterworth low-passed copy"""
+    gains = _shelf_gains(sr, n_fft, float(cutoff), float(gain), order)
+
+    def stage(D, freqs):
+        D *= gains
+        return D
+    return stage
+
+
+def noise_gate(threshold_db: float, reduction_db: float, percentile: float = 10) -> SpectralStage:
+    """
+    Attenuate bins that stay within `threshold_db` of their own noise floor
+    (the given percentile of that bin's magnitude over the note) by
+    `reduction_db`, leaving speech harmonics above it untouched.
+    """
+    threshold = np.float32(10 ** (threshold_db / 20))
+    floor_gain = np.float32(10 ** (-reduction_db / 20))
+
+    def stage(D, freqs):
+        mag = np.abs(D)
+        noise = np.percentile(mag, percentile, axis=-1, keepdims=True)
+        D *= np.where(mag > noise * threshold, np.float32(1), floor_gain)
+        return D
+    return stage
+
+
+def spectral_chain(y: np.ndarray, sr: int, n_fft: int = 2048, hop_length: int = 512,
+                   stages: Sequence[SpectralStage] = (), stretch: float = 1.0) -> np.ndarray:
+    """
+    STFT -> stages -> phase-vocoder time stretch by `stretch` (librosa's
+    rate: > 1 is faster/shorter) -> ISTFT, in float32.
+    """
+    if not stages and stretch == 1:
+        return y
+    n = y.shape[-1]
+    D = librosa.stft(y, n_fft=n_fft, hop_length=hop_length)
+    freqs = librosa.fft_frequencies(sr=sr, n_fft=n_fft)
+    for stage in stages:
+        D = stage(D, freqs)
+    if stretch != 1:
+        D = librosa.phase_vocoder(D, rate=stretch, hop_length=hop_length, n_fft=n_fft)
+    return librosa.istft(
+        D, hop_length=hop_length, n_fft=n_fft,
+        length=int(round(n / stretch)), dtype=np.float32
+    )
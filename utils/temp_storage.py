@@ -0,0 +1,164 @@
+"""
+Temp file lifecycle manager with a disk quota
+"""
+import os
+import time
+import uuid
+import shutil
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Iterable, Optional, Set, Tuple
+
+from config import Config
+from utils.metrics import metrics, TEMP_DIR_BYTES
+
+logger = logging.getLogger(__name__)
+
+TEMP_JOBS_ACTIVE = metrics.gauge("temp_jobs_active", "Job scratch directories currently in use")
+TEMP_RESERVED_BYTES = metrics.gauge("temp_reserved_bytes", "Disk bytes reserved by active jobs")
+TEMP_QUOTA_REJECTIONS = metrics.counter("temp_quota_rejections_total", "Jobs refused because the temp quota was full")
+TEMP_SWEPT_FILES = metrics.counter("temp_swept_files_total", "Stale temp entries removed by the sweeper")
+
+# Never sweep the placeholders/modules that live in the temp dirs
+_KEEP = (".gitkeep", ".py")
+
+
+class QuotaExceeded(Exception):
+    pass
+
+
+def _tree_size(path: str) -> int:
+    total = 0
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                total += _tree_size(entry.path)
+            else:
+                total += entry.stat(follow_symlinks=False).st_size
+    return total
+
+
+def sweep_directory(directory: str, max_age: float, skip: Iterable[str] = ()) -> Tuple[int, int]:
+    """
+    Remove entries older than `max_age` seconds (blocking; run off the loop).
+    Returns (bytes still in use, entries removed).
+    """
+    if not os.path.isdir(directory):
+        return 0, 0
+
+    skip = set(skip)
+    cutoff = time.time() - max_age
+    total = removed = 0
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.path in skip or entry.name.endswith(_KEEP):
+                continue
+            try:
+                is_dir = entry.is_dir(follow_symlinks=False)
+                stat = entry.stat(follow_symlinks=False)
+                if stat.st_mtime < cutoff:
+                    if is_dir:
+                        shutil.rmtree(entry.path, ignore_errors=True)
+                    else:
+                        os.remove(entry.path)
+                    removed += 1
+                else:
+                    total += _tree_size(entry.path) if is_dir else stat.st_size
+            except OSError:
+                pass
+    return total, removed
+
+
+class TempStorage:
+    """
+    Hands out per-job scratch directories under `root`, refusing new jobs
+    once measured usage plus outstanding reservations would exceed the quota.
+    A background sweeper deletes anything older than `max_age` in `root` and
+    the legacy temp dirs and re-measures real usage.
+    """
+
+    def __init__(self, root: str, quota_bytes: int, job_reserve: int, max_age: float,
+                 sweep_interval: float, extra_dirs: Iterable[str] = ()):
+        self.root = root
+        self.quota_bytes = quota_bytes
+        self.job_reserve = job_reserve
+        self.max_age = max_age
+        self.sweep_interval = sweep_interval
+        self.extra_dirs = tuple(extra_dirs)
+        self.used_bytes = 0
+        self.reserved_bytes = 0
+        self.active: Set[str] = set()
+        self._task: Optional[asyncio.Task] = None
+        os.makedirs(self.root, exist_ok=True)
+        TEMP_DIR_BYTES.set_function(lambda: self.used_bytes + self.reserved_bytes)
+
+    @asynccontextmanager
+    async def job(self, reserve: Optional[int] = None):
+        """Scoped scratch directory, removed (off the loop) when the block exits"""
+        reserve = self.job_reserve if reserve is None else reserve
+        if self.used_bytes + self.reserved_bytes + reserve > self.quota_bytes:
+            TEMP_QUOTA_REJECTIONS.inc()
+            raise QuotaExceeded(
+                f"temp quota full ({(self.used_bytes + self.reserved_bytes) // (1024 * 1024)} MB in use)"
+            )
+
+        path = os.path.join(self.root, f"job_{uuid.uuid4().hex}")
+        os.mkdir(path)
+        self.reserved_bytes += reserve
+        self.active.add(path)
+        TEMP_JOBS_ACTIVE.inc()
+        TEMP_RESERVED_BYTES.set(self.reserved_bytes)
+        try:
+            yield path
+        finally:
+            self.active.discard(path)
+            self.reserved_bytes -= reserve
+            TEMP_JOBS_ACTIVE.dec()
+            TEMP_RESERVED_BYTES.set(self.reserved_bytes)
+            await asyncio.to_thread(shutil.rmtree, path, True)
+
+    def _sweep(self, active: Set[str]) -> Tuple[int, int]:
+        total = removed = 0
+        for directory in (self.root, *self.extra_dirs):
+            used, gone = sweep_directory(directory, self.max_age, skip=active)
+            total += used
+            removed += gone
+        return total, removed
+
+    async def sweep(self) -> int:
+        """Run one sweep in a worker thread; returns entries removed"""
+        used, removed = await asyncio.to_thread(self._sweep, set(self.active))
+        self.used_bytes = used
+        if removed:
+            TEMP_SWEPT_FILES.inc(removed)
+            logger.info("Temp sweeper removed %d stale entries", removed)
+        return removed
+
+    async def _sweep_forever(self):
+        while True:
+            try:
+                await self.sweep()
+            except Exception as e:
+                logger.warning("Temp sweep failed: %s", e)
+            await asyncio.sleep(self.sweep_interval)
+
+    def start(self):
+        if not self._task:
+            self._task = asyncio.create_task(self._sweep_forever())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+
+# Global instance
+temp_storage = TempStorage(
+    root="temp_voices",
+    quota_bytes=Config.TEMP_QUOTA_BYTES,
+    job_reserve=Config.TEMP_JOB_RESERVE,
+    max_age=Config.CLEANUP_HOURS * 3600,
+    sweep_interval=Config.TEMP_SWEEP_MINUTES * 60,
+    extra_dirs=("temp",),
+)
@@ -0,0 +1,78 @@
+"""
+Aiogram middleware throttling each user per handler
+
+Runs after filters have picked the handler, charges that handler's cost
+(THROTTLE_COSTS, default 1) to the user's bucket for it, and cancels the
+update when the bucket is short. Rejections never touch the database;
+the user is told once per throttled stretch how long to wait.
+"""
+import math
+
+from aiogram import types
+from aiogram.dispatcher.handler import CancelHandler, current_handler
+from aiogram.dispatcher.middlewares import BaseMiddleware
+
+from utils.metrics import metrics
+from utils.rate_limit import RateLimiter
+
+THROTTLED_TOTAL = metrics.counter(
+    "bot_throttled_updates_total", "Updates dropped by per-user throttling", ("handler",)
+)
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    def __init__(self, limiter: RateLimiter, costs: dict = None, buckets: dict = None, exempt=()):
+        """`buckets` maps a handler to another handler whose bucket it shares"""
+        super().__init__()
+        self.limiter = limiter
+        self.costs = costs or {}
+        self.buckets = buckets or {}
+        self.exempt = set(exempt)
+        # Keys already told to wait; cleared on their next allowed update
+        self._notified = set()
+
+    async def _throttle(self, user_id: int) -> float:
+        """Seconds the user must wait before this handler runs for them (0 = go ahead)"""
+        try:
+            handler = current_handler.get().__name__
+        except LookupError:
+            return 0.0
+        if user_id in self.exempt:
+            return 0.0
+
+        key = f"{user_id}:{self.buckets.get(handler, handler)}"
+        cost = self.costs.get(handler, 1)
+        wait = self.limiter.check(key, cost)
+        if not wait:
+            wait = await self.limiter.check_shared(key, cost)
+        if not wait:
+            self._notified.discard(key)
+            return 0.0
+
+        THROTTLED_TOTAL.inc(handler=handler)
+        if key in self._notified:
+            return -1.0
+        if len(self._notified) >= self.limiter.max_keys:
+            self._notified.clear()
+        self._notified.add(key)
+        return wait
+
+    @staticmethod
+    def _wait_text(wait: float) -> str:
+        if math.isinf(wait):
+            return "⏳ Too many requests, this command is disabled for you."
+        return f"⏳ Too many requests, try again in {math.ceil(wait)}s."
+
+    async def on_process_message(self, message: types.Message, data: dict):
+        wait = await self._throttle(message.from_user.id)
+        if wait > 0:
+            await message.reply(self._wait_text(wait))
+        if wait:
+            raise CancelHandler()
+
+    async def on_process_callback_query(self, callback_query: types.CallbackQuery, data: dict):
+        wait = await self._throttle(callback_query.from_user.id)
+        if wait:
+            # Callback queries must be answered either way, or the button keeps spinning
+            await callback_query.answer(self._wait_text(wait) if wait > 0 else None)
+            raise CancelHandler()
@@ -0,0 +1,318 @@
+"""
+Voice note transcoder service
+
+Every note is decoded once and encoded once. Spawning ffmpeg for each of
+those costs a fork/exec plus library and codec start-up per note, so:
+
+* where libsndfile has Ogg/Opus support, decoding (and optionally
+  encoding) runs in-process through soundfile, with no subprocess at all;
+* otherwise a WarmProcessPool keeps a few ffmpeg processes already spawned
+  and blocked on stdin. A job takes a warm one, feeds it over pipes, and a
+  background thread spawns the replacement off the critical path. The same
+  thread health-checks idle spares and replaces any that died.
+
+There is one pool per command line, so per sample rate. Pools for rates
+other than `resident_rate` (cheaper quality tiers used under load) are
+stopped once unused for `idle_seconds`, so a burst doesn't leave extra
+ffmpeg processes behind for good.
+
+In-process decoding needs the whole note in memory first, so a download
+that grows past `buffer_bytes`, or is still arriving after
+`buffer_seconds`, is handed over to a streaming ffmpeg decode instead,
+which overlaps with the rest of the download.
+
+In "auto" mode encoding stays on ffmpeg, because libsndfile exposes
+neither libopus' VoIP mode nor frame size and complexity (VOICE_OPUS_*).
+"""
+import io
+import time
+import asyncio
+import logging
+import threading
+import subprocess
+from collections import deque
+from typing import AsyncIterator, Dict, Tuple, Type
+
+import numpy as np
+import librosa
+import soundfile as sf
+
+from config import Config
+from utils.audio_codec import DecodeError, EncodeError, decode_args, decode_stream, opus_args
+from utils.metrics import metrics, record_cache
+from utils.quality import FULL_QUALITY
+
+logger = logging.getLogger(__name__)
+
+TRANSCODE_SECONDS = metrics.histogram(
+    "transcode_seconds", "Decode/encode time per note by backend", ("op", "backend")
+)
+TRANSCODER_SPARES = metrics.gauge("transcoder_spares", "Idle pre-spawned ffmpeg processes", ("pool",))
+TRANSCODER_RESTARTS = metrics.counter(
+    "transcoder_restarts_total", "ffmpeg workers replaced after dying", ("pool",)
+)
+
+OPUS_RATES = (8000, 12000, 16000, 24000, 48000)
+
+
+def soundfile_has_opus() -> bool:
+    """libsndfile >= 1.0.29 can read and write Ogg/Opus"""
+    try:
+        return "OPUS" in sf.available_subtypes("OGG")
+    except Exception:
+        return False
+
+
+class WarmProcessPool:
+    """Keeps `size` idle processes for one fixed command line spawned ahead of need"""
+
+    def __init__(self, argv, size: int, name: str, health_interval: float = 30, timeout: float = 60):
+        self.argv = list(argv)
+        self.size = size
+        self.name = name
+        self.health_interval = health_interval
+        self.timeout = timeout
+        self._spares = deque()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self.last_used = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name=f"warm-{name}", daemon=True)
+        self._thread.start()
+
+    def _spawn(self) -> subprocess.Popen:
+        return subprocess.Popen(
+            self.argv, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+
+    def _run(self):
+        while not self._stopped:
+            self.check()
+            while not self._stopped and len(self._spares) < self.size:
+                try:
+                    proc = self._spawn()
+                except OSError as e:
+                    logger.error("Could not spawn %s worker: %s", self.name, e)
+                    break
+                with self._lock:
+                    self._spares.append(proc)
+            TRANSCODER_SPARES.set(self.idle, pool=self.name)
+            self._wakeup.wait(self.health_interval)
+            self._wakeup.clear()
+
+    @property
+    def idle(self) -> int:
+        return len(self._spares)
+
+    def check(self) -> int:
+        """Drop idle spares that have exited; returns how many were lost"""
+        with self._lock:
+            alive = [proc for proc in self._spares if proc.poll() is None]
+            dead = len(self._spares) - len(alive)
+            self._spares = deque(alive)
+        if dead:
+            TRANSCODER_RESTARTS.inc(dead, pool=self.name)
+            logger.warning("Replacing %d dead %s worker(s)", dead, self.name, extra={"pool": self.name})
+        return dead
+
+    def acquire(self) -> subprocess.Popen:
+        """A live warm process if there is one, else a freshly spawned one"""
+        self.last_used = time.monotonic()
+        proc = None
+        with self._lock:
+            while self._spares:
+                candidate = self._spares.popleft()
+                if candidate.poll() is None:
+                    proc = candidate
+                    break
+                TRANSCODER_RESTARTS.inc(pool=self.name)
+        record_cache(f"warm_{self.name}", proc is not None)
+        # Refill in the background either way
+        self._wakeup.set()
+        return proc or self._spawn()
+
+    def run(self, data: bytes, error: Type[Exception] = RuntimeError) -> Tuple[int, bytes, bytes]:
+        """
+        Feed `data` to a worker and collect its output; retried once if the
+        worker crashed. A worker still running after `timeout` seconds is
+        killed and `error` raised, so a stuck ffmpeg can't hold the thread.
+        """
+        for attempt in range(2):
+            proc = self.acquire()
+            try:
+                stdout, stderr = proc.communicate(input=data, timeout=self.timeout)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.communicate()
+                TRANSCODER_RESTARTS.inc(pool=self.name)
+                raise error(f"{self.name} worker timed out after {self.timeout:.0f}s")
+            # Negative return codes mean killed by a signal: the worker, not the input, failed
+            if proc.returncode >= 0 or attempt:
+                return proc.returncode, stdout, stderr
+            TRANSCODER_RESTARTS.inc(pool=self.name)
+            logger.warning("%s worker died (signal %d), retrying", self.name, -proc.returncode)
+
+    def stop(self):
+        self._stopped = True
+        self._wakeup.set()
+        with self._lock:
+            spares, self._spares = list(self._spares), deque()
+        for proc in spares:
+            proc.kill()
+            proc.wait()
+
+
+async def _prepend(first: bytes, rest: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    yield first
+    async for chunk in rest:
+        yield chunk
+
+
+class Transcoder:
+    def __init__(self, backend: str = "auto", spares: int = 2, health_interval: float = 30,
+                 resident_rate: int = 44100, idle_seconds: float = 300,
+                 buffer_bytes: int = 256 * 1024, buffer_seconds: float = 1.0, timeout: float = 60):
+        in_process = soundfile_has_opus()
+        if backend == "soundfile" and not in_process:
+            logger.warning("libsndfile has no Ogg/Opus support, falling back to ffmpeg")
+        self.decode_backend = "soundfile" if in_process and backend != "ffmpeg" else "ffmpeg"
+        self.encode_backend = "soundfile" if in_process and backend == "soundfile" else "ffmpeg"
+        self.spares = spares
+        self.health_interval = health_interval
+        self.resident_rate = resident_rate
+        self.idle_seconds = idle_seconds
+        self.buffer_bytes = buffer_bytes
+        self.buffer_seconds = buffer_seconds
+        self.timeout = timeout
+        self._pools: Dict[tuple, WarmProcessPool] = {}
+        self._pool_rates: Dict[tuple, int] = {}
+        self._pools_lock = threading.Lock()
+
+    def _pool(self, argv, name: str, sr: int) -> WarmProcessPool:
+        self.retire_idle()
+        key = tuple(argv)
+        with self._pools_lock:
+            pool = self._pools.get(key)
+            if pool is None:
+                pool = self._pools[key] = WarmProcessPool(
+                    argv, self.spares, name, self.health_interval, self.timeout
+                )
+                self._pool_rates[key] = sr
+            return pool
+            
+    def retire_idle(self) -> int:
+        """Stop pools for non-resident sample rates unused for idle_seconds; returns how many"""
+        cutoff = time.monotonic() - self.idle_seconds
+        with self._pools_lock:
+            stale = [
+                key for key, pool in self._pools.items()
+                if self._pool_rates.get(key) != self.resident_rate and pool.last_used < cutoff
+            ]
+            retired = [self._pools.pop(key) for key in stale]
+            for key in stale:
+                self._pool_rates.pop(key, None)
+        for pool in retired:
+            logger.info("Retiring idle %s pool", pool.name)
+            pool.stop()
+        return len(retired)
+
+    def health(self) -> dict:
+        """Backend choice and the state of every warm pool"""
+        self.retire_idle()
+        with self._pools_lock:
+            pools = list(self._pools.values())
+        return {
+            "decode": self.decode_backend,
+            "encode": self.encode_backend,
+            "pools": {pool.name: {"lost": pool.check(), "spares": pool.idle} for pool in pools},
+        }
+
+    def stop(self):
+        with self._pools_lock:
+            pools, self._pools = list(self._pools.values()), {}
+            self._pool_rates = {}
+        for pool in pools:
+            pool.stop()
+
+    # Decoding
+
+    async def decode_stream(self, chunks: AsyncIterator[bytes], sr: int) -> np.ndarray:
+        """Decode a downloading note to mono float32 at `sr`"""
+        if self.decode_backend == "ffmpeg":
+            # ffmpeg starts while the first bytes are still in flight, which hides its spawn cost
+            return await decode_stream(chunks, sr)
+        data = bytearray()
+        deadline = time.monotonic() + self.buffer_seconds
+        chunks = chunks.__aiter__()
+        async for chunk in chunks:
+            data += chunk
+            if len(data) > self.buffer_bytes or time.monotonic() > deadline:
+                # Large or slow: stream what we have and the rest into ffmpeg as it arrives
+                return await decode_stream(_prepend(bytes(data), chunks), sr)
+        return await asyncio.to_thread(self.decode, bytes(data), sr)
+
+    def decode(self, data: bytes, sr: int) -> np.ndarray:
+        """Decode an in-memory note to mono float32 at `sr` (blocking)"""
+        start = time.perf_counter()
+        if self.decode_backend == "soundfile":
+            try:
+                y, native_sr = sf.read(io.BytesIO(data), dtype="float32", always_2d=True)
+            except RuntimeError as e:
+                raise DecodeError(str(e)) from e
+            y = y.mean(axis=1) if y.shape[1] > 1 else y[:, 0]
+            if native_sr != sr:
+                y = librosa.resample(y, orig_sr=native_sr, target_sr=sr, res_type="soxr_hq")
+            y = np.ascontiguousarray(y, dtype=np.float32)
+        else:
+            code, pcm, stderr = self._pool(decode_args(sr), f"decode{sr}", sr).run(data, DecodeError)
+            if code != 0:
+                raise DecodeError(stderr.decode(errors="replace").strip() or f"ffmpeg exited with {code}")
+            y = np.frombuffer(pcm, dtype=np.float32).copy()
+        TRANSCODE_SECONDS.observe(time.perf_counter() - start, op="decode", backend=self.decode_backend)
+        return y
+
+    def decode_file(self, path: str, sr: int) -> np.ndarray:
+        with open(path, "rb") as f:
+            return self.decode(f.read(), sr)
+
+    # Encoding
+
+    def encode(self, y: np.ndarray, sr: int, output_path: str, bitrate_kbps: int = 32,
+               frame_ms: float = 20, complexity: int = 10) -> dict:
+        """Encode mono PCM to an Opus-in-OGG voice note (blocking); same report as encode_opus"""
+        pcm = np.ascontiguousarray(y, dtype=np.float32)
+        start = time.perf_counter()
+        if self.encode_backend == "soundfile":
+            data = self._encode_soundfile(pcm, sr, bitrate_kbps)
+        else:
+            argv = opus_args(sr, bitrate_kbps, frame_ms, complexity)
+            code, data, stderr = self._pool(argv, f"opus{sr}", sr).run(pcm.tobytes(), EncodeError)
+            if code != 0:
+                raise EncodeError(stderr.decode(errors="replace").strip() or f"ffmpeg exited with {code}")
+        with open(output_path, "wb") as f:
+            f.write(data)
+        seconds = time.perf_counter() - start
+        TRANSCODE_SECONDS.observe(seconds, op="encode", backend=self.encode_backend)
+        return {"seconds": seconds, "bytes": len(data)}
+
+    @staticmethod
+    def _encode_soundfile(pcm: np.ndarray, sr: int, bitrate_kbps: int) -> bytes:
+        if sr not in OPUS_RATES:
+            pcm = librosa.resample(pcm, orig_sr=sr, target_sr=48000, res_type="soxr_hq")
+            sr = 48000
+        # libsndfile maps compression_level 0..1 linearly onto 256..6 kbps per channel
+        level = min(max(1 - (bitrate_kbps - 6) / 250, 0.0), 1.0)
+        buf = io.BytesIO()
+        try:
+            sf.write(buf, pcm, sr, format="OGG", subtype="OPUS", compression_level=level)
+        except RuntimeError as e:
+            raise EncodeError(str(e)) from e
+        return buf.getvalue()
+
+
+transcoder = Transcoder(
+    Config.TRANSCODER_BACKEND, Config.TRANSCODER_SPARES, Config.TRANSCODER_HEALTH_INTERVAL,
+    resident_rate=FULL_QUALITY.sample_rate, idle_seconds=Config.TRANSCODER_POOL_IDLE,
+    buffer_bytes=Config.TRANSCODER_BUFFER_BYTES, buffer_seconds=Config.TRANSCODER_BUFFER_SECONDS,
+    timeout=Config.TRANSCODER_TIMEOUT
+)
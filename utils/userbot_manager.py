@@ -5,28 +5,47 @@ from telethon import TelegramClient
 from telethon.sessions import StringSession
 from telethon.tl.functions.phone import JoinGroupCallRequest
 import asyncio
-from typing import Optional, Dict
+import logging
+from typing import Awaitable, Callable, Hashable, Optional, Dict, List
 from config import Config
+from utils.metrics import metrics
+from utils.rpc_scheduler import RPCScheduler
+
+logger = logging.getLogger(__name__)
 
 class UserBotManager:
     def __init__(self):
         self.clients: Dict[int, TelegramClient] = {}
-        self.active_chats: Dict[int, int] = {}
+        self.active_chats: Dict[int, List[int]] = {}
         self.lock = asyncio.Lock()
+        self.scheduler = RPCScheduler(
+            Config.TELETHON_RPC_RATE,
+            method_rates=Config.TELETHON_METHOD_RATES,
+            chat_rate=Config.TELETHON_CHAT_RATE,
+            deadline=Config.TELETHON_RPC_DEADLINE,
+            max_flood_wait=Config.TELETHON_MAX_FLOOD_WAIT
+        )
         
+    async def _rpc(self, method: str, call: Callable[[], Awaitable], chat_id: Optional[int] = None,
+                   coalesce: Optional[Hashable] = None):
+        """Run a Telethon call through the shared scheduler (pacing, FloodWait retries, metrics)"""
+        return await self.scheduler.call(method, call, chat_id=chat_id, coalesce=coalesce)
+            
     async def start_client(self, user_id: int) -> Optional[TelegramClient]:
         """Start Telethon client"""
-        print(f"🔧 DEBUG: Starting UserBot for user {user_id}")
+        logger.debug("Starting UserBot", extra={"user_id": user_id})
         
         async with self.lock:
             if user_id in self.clients:
-                print(f"🔧 DEBUG: Client already exists")
+                logger.debug("UserBot client already exists", extra={"user_id": user_id})
                 return self.clients[user_id]
                 
             try:
                 # CRITICAL FIX: Changed Config.HASH to Config.API_HASH
-                print(f"🔧 DEBUG: Using API_ID={Config.API_ID}, API_HASH={Config.API_HASH[:10]}...")
-                print(f"🔧 DEBUG: Session string length: {len(Config.SESSION_STRING)}")
+                logger.debug(
+                    "Creating Telethon client",
+                    extra={"api_id": Config.API_ID, "session_length": len(Config.SESSION_STRING)}
+                )
                 
                 client = TelegramClient(
                     StringSession(Config.SESSION_STRING),
@@ -34,105 +53,132 @@ class UserBotManager:
                     Config.API_HASH  # ✅ FIXED THIS LINE
                 )
                 
-                print("🔧 DEBUG: Connecting to Telegram...")
-                await client.connect()
+                logger.debug("Connecting to Telegram")
+                await self._rpc("connect", client.connect)
                 
-                if not await client.is_user_authorized():
-                    print(f"❌ ERROR: UserBot not authorized. Check session string!")
+                if not await self._rpc("is_user_authorized", client.is_user_authorized):
+                    logger.error("UserBot not authorized. Check session string!")
                     await client.disconnect()
                     return None
                     
-                me = await client.get_me()
-                print(f"✅ SUCCESS: UserBot started as @{me.username} (ID: {me.id})")
+                me = await self._rpc("get_me", client.get_me)
+                logger.info("UserBot started as @%s (ID: %s)", me.username, me.id)
                 
                 self.clients[user_id] = client
                 return client
                 
             except Exception as e:
-                print(f"❌ ERROR starting UserBot: {type(e).__name__}: {str(e)}")
-                import traceback
-                traceback.print_exc()
+                logger.exception("Error starting UserBot: %s", type(e).__name__)
                 return None
                 
     async def join_voice_chat(self, user_id: int, chat_id: int) -> bool:
         """Join voice chat"""
-        print(f"🔧 DEBUG: Joining VC - user={user_id}, chat={chat_id}")
+        logger.debug("Joining VC", extra={"user_id": user_id, "chat_id": chat_id})
         
         try:
             client = await self.start_client(user_id)
             if not client:
-                print(f"❌ ERROR: No client to join VC")
+                logger.error("No client to join VC", extra={"user_id": user_id})
                 return False
                 
-            print(f"🔧 DEBUG: Getting chat entity...")
-            chat = await client.get_entity(chat_id)
-            print(f"🔧 DEBUG: Chat found: {chat.title}")
+            logger.debug("Getting chat entity")
+            chat = await self._rpc("get_entity", lambda: client.get_entity(chat_id), coalesce=chat_id)
+            logger.debug("Chat found: %s", chat.title)
             
             # Join VC
             try:
-                print("🔧 DEBUG: Trying JoinGroupCallRequest...")
-                await client(JoinGroupCallRequest(
+                logger.debug("Trying JoinGroupCallRequest")
+                await self._rpc("JoinGroupCallRequest", lambda: client(JoinGroupCallRequest(
                     peer=chat,
                     muted=False,
                     video_stopped=False
-                ))
-                print("✅ SUCCESS: Joined VC via API")
+                )), chat_id=chat_id)
+                logger.debug("Joined VC via API")
             except Exception as e:
-                print(f"⚠️ WARNING: API method failed: {e}. Using fallback...")
+                logger.warning("JoinGroupCallRequest failed (%s), using !join fallback", e)
                 # Fallback method
-                await client.send_message(chat, "!join")
-                print("✅ SUCCESS: Sent !join command")
+                await self._rpc("send_message", lambda: client.send_message(chat, "!join"), chat_id=chat_id)
+                logger.debug("Sent !join command")
                 
-            self.active_chats[user_id] = chat_id
-            print(f"✅ SUCCESS: User {user_id} joined VC {chat_id}")
+            chats = self.active_chats.setdefault(user_id, [])
+            if chat_id not in chats:
+                chats.append(chat_id)
+            logger.info("Joined VC", extra={"user_id": user_id, "chat_id": chat_id})
             return True
             
         except Exception as e:
-            print(f"❌ ERROR joining VC: {type(e).__name__}: {str(e)}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("Error joining VC: %s", type(e).__name__, extra={"user_id": user_id, "chat_id": chat_id})
             return False
             
-    async def leave_voice_chat(self, user_id: int) -> bool:
-        """Leave voice chat"""
+    async def leave_voice_chat(self, user_id: int, chat_id: Optional[int] = None) -> bool:
+        """Leave one voice chat, or all of the user's if `chat_id` is None"""
         try:
             if user_id not in self.active_chats:
                 return True
                 
+            chats = self.active_chats[user_id]
+            leaving = [chat_id] if chat_id is not None else list(chats)
             client = self.clients.get(user_id)
-            if client:
-                chat_id = self.active_chats[user_id]
-                chat = await client.get_entity(chat_id)
-                await client.send_message(chat, "!leave")
-                print(f"✅ Left VC for user {user_id}")
+            for leave_id in leaving:
+                if leave_id not in chats:
+                    continue
+                if client:
+                    chat = await self._rpc("get_entity", lambda: client.get_entity(leave_id), coalesce=leave_id)
+                    await self._rpc("send_message", lambda: client.send_message(chat, "!leave"), chat_id=leave_id)
+                    logger.info("Left VC", extra={"user_id": user_id, "chat_id": leave_id})
+                chats.remove(leave_id)
                 
-            del self.active_chats[user_id]
+            if not chats:
+                del self.active_chats[user_id]
             return True
             
         except Exception as e:
-            print(f"Leave VC error: {e}")
+            logger.warning("Leave VC error: %s", e, extra={"user_id": user_id})
             return False
             
     async def play_audio(self, user_id: int, audio_path: str) -> bool:
-        """Play audio in VC"""
+        """Play audio in every joined VC; True only if all of them got it"""
+        results = await self.deliver_audio(user_id, audio_path)
+        return bool(results) and all(error is None for error in results.values())
+        
+    async def deliver_audio(self, user_id: int, audio_path: str,
+                            chat_ids: Optional[List[int]] = None) -> Dict[int, Optional[str]]:
+        """
+        Upload the clip once, then send the uploaded handle to each chat
+        (default: the user's joined chats), at most FANOUT_CONCURRENCY at a
+        time. Maps each chat_id to None on success or an error message.
+        """
+        chat_ids = list(chat_ids if chat_ids is not None else self.active_chats.get(user_id, []))
+        if user_id not in self.clients or user_id not in self.active_chats:
+            logger.warning("User not ready for audio", extra={"user_id": user_id})
+            return {chat_id: "UserBot not ready" for chat_id in chat_ids}
+        client = self.clients[user_id]
+        
         try:
-            if user_id not in self.clients or user_id not in self.active_chats:
-                print(f"❌ ERROR: User {user_id} not ready for audio")
-                return False
-                
-            client = self.clients[user_id]
-            chat_id = self.active_chats[user_id]
-            
-            chat = await client.get_entity(chat_id)
-            print(f"🔧 DEBUG: Playing audio in {chat.title}")
-            await client.send_file(chat, audio_path, voice_note=True)
-            
-            print(f"✅ SUCCESS: Audio played")
-            return True
-            
+            with metrics.span("upload"):
+                uploaded = await self._rpc("upload_file", lambda: client.upload_file(audio_path))
         except Exception as e:
-            print(f"❌ ERROR playing audio: {e}")
-            return False
+            logger.error("Error uploading audio: %s", e, extra={"user_id": user_id})
+            return {chat_id: f"upload failed: {e}" for chat_id in chat_ids}
+            
+        semaphore = asyncio.Semaphore(Config.FANOUT_CONCURRENCY)
+        
+        async def send(chat_id: int):
+            async with semaphore:
+                try:
+                    with metrics.span("get_entity"):
+                        chat = await self._rpc("get_entity", lambda: client.get_entity(chat_id), coalesce=chat_id)
+                    with metrics.span("send_file"):
+                        await self._rpc(
+                            "send_file", lambda: client.send_file(chat, uploaded, voice_note=True), chat_id=chat_id
+                        )
+                    logger.debug("Audio played", extra={"user_id": user_id, "chat_id": chat_id})
+                    return chat_id, None
+                except Exception as e:
+                    logger.error("Error playing audio: %s", e, extra={"user_id": user_id, "chat_id": chat_id})
+                    return chat_id, str(e) or type(e).__name__
+                    
+        return dict(await asyncio.gather(*(send(chat_id) for chat_id in chat_ids)))
             
     async def stop_client(self, user_id: int):
         """Stop UserBot client"""
@@ -144,7 +190,7 @@ class UserBotManager:
                 
                 if user_id in self.active_chats:
                     del self.active_chats[user_id]
-                print(f"✅ Stopped UserBot for user {user_id}")
+                logger.info("Stopped UserBot", extra={"user_id": user_id})
                     
     async def stop_all(self):
         """Stop all UserBots"""
@@ -0,0 +1,100 @@
+"""
+Energy / zero-crossing voice activity detection
+
+Cheap enough to run on every note before the expensive librosa stages:
+one pass for frame energies and one for zero crossings. Frames well above
+the note's own noise floor are speech; so are quieter frames with a high
+zero-crossing rate (fricatives like "s" and "f"), which pure energy
+gating tends to clip.
+"""
+import numpy as np
+
+from utils.metrics import metrics
+
+VAD_SAMPLES_IN = metrics.counter("vad_samples_in_total", "Samples entering the VAD stage")
+VAD_SAMPLES_REMOVED = metrics.counter(
+    "vad_samples_removed_total", "Samples cut by the VAD stage before DSP", ("reason",)
+)
+
+FRAME_MS = 20
+# Energies at or below this are digital silence, whatever the noise floor
+SILENCE_DB = -60.0
+
+
+def speech_frames(y: np.ndarray, sr: int, threshold_db: float = 12.0) -> np.ndarray:
+    """Boolean speech flag per FRAME_MS frame (a trailing partial frame is dropped)"""
+    frame = max(1, int(sr * FRAME_MS / 1000))
+    count = len(y) // frame
+    if not count:
+        return np.zeros(0, dtype=bool)
+    frames = y[:count * frame].reshape(count, frame)
+
+    energy = np.einsum("ij,ij->i", frames, frames) / np.float32(frame)
+    energy_db = 10 * np.log10(energy + np.float32(1e-12))
+    # Quietest decile approximates the background level of this note
+    floor_db = max(float(np.percentile(energy_db, 10)), SILENCE_DB)
+
+    negative = np.signbit(frames)
+    zcr = np.count_nonzero(negative[:, 1:] != negative[:, :-1], axis=1) / np.float32(frame)
+
+    loud = energy_db > floor_db + threshold_db
+    fricative = (energy_db > floor_db + threshold_db / 2) & (zcr > 0.25)
+    return (loud | fricative) & (energy_db > SILENCE_DB)
+
+
+def _dilate(mask: np.ndarray, radius: int) -> np.ndarray:
+    """Extend every speech run by `radius` frames on both sides"""
+    if not radius or not mask.any():
+        return mask
+    counts = np.convolve(mask.astype(np.int32), np.ones(2 * radius + 1, dtype=np.int32), mode="same")
+    return counts > 0
+
+
+def trim_silence(y: np.ndarray, sr: int, threshold_db: float = 12.0, padding_ms: float = 200,
+                 max_pause: float = 0) -> np.ndarray:
+    """
+    Cut leading/trailing silence and, with `max_pause` > 0, shorten internal
+    pauses longer than `max_pause` seconds to that length. `padding_ms` of
+    context is kept around speech so onsets and decays aren't clipped.
+    Notes with no detected speech are returned untouched.
+    """
+    n = len(y)
+    VAD_SAMPLES_IN.inc(n)
+    frame = max(1, int(sr * FRAME_MS / 1000))
+    mask = speech_frames(y, sr, threshold_db)
+    if not mask.any():
+        return y
+
+    mask = _dilate(mask, int(padding_ms / FRAME_MS))
+    speech = np.flatnonzero(mask)
+    first, last = speech[0], speech[-1]
+    start = first * frame
+    # The dropped partial frame follows the last full one
+    end = n if last == len(mask) - 1 else (last + 1) * frame
+    if start or end < n:
+        VAD_SAMPLES_REMOVED.inc(start + n - end, reason="edges")
+
+    if max_pause <= 0:
+        return y[start:end]
+
+    # Keep the first and last max_pause/2 of every longer gap
+    keep = mask[first:last + 1].copy()
+    half = max(1, int(max_pause * 1000 / FRAME_MS) // 2)
+    gaps = np.flatnonzero(np.diff(np.concatenate(([1], keep.astype(np.int8), [1]))))
+    for gap_start, gap_end in zip(gaps[::2], gaps[1::2]):
+        if gap_end - gap_start > 2 * half:
+            keep[gap_start:gap_start + half] = True
+            keep[gap_end - half:gap_end] = True
+        else:
+            keep[gap_start:gap_end] = True
+    if keep.all():
+        return y[start:end]
+
+    samples = np.repeat(keep, frame)
+    trimmed = y[start:end]
+    # A trailing partial frame is always kept
+    if len(samples) < len(trimmed):
+        samples = np.concatenate((samples, np.ones(len(trimmed) - len(samples), dtype=bool)))
+    out = trimmed[samples[:len(trimmed)]]
+    VAD_SAMPLES_REMOVED.inc(len(trimmed) - len(out), reason="pauses")
+    return out
@@ -0,0 +1,100 @@
+"""
+Per-user voice parameters
+
+Pitch, bass, reverb and speed for the deep voice filter. Values are
+quantised to fixed steps so the filter, reverb and output caches see a
+small, bounded set of keys instead of arbitrary floats.
+"""
+from typing import Dict, NamedTuple, Optional
+
+from config import Config
+
+
+class ParamSpec(NamedTuple):
+    label: str
+    minimum: float
+    maximum: float
+    step: float
+    unit: str = ""
+
+
+PARAM_SPECS: Dict[str, ParamSpec] = {
+    # Pitch is in 1/24 octave steps (quarter tones), as used by the deep filter
+    "pitch": ParamSpec("🎚️ Pitch", -12, 6, 1),
+    "bass": ParamSpec("🔊 Bass", 0, 20, 2),
+    "reverb": ParamSpec("🏛️ Reverb", 0.0, 0.5, 0.05),
+    "speed": ParamSpec("⏩ Speed", 0.7, 1.3, 0.02, "x"),
+}
+
+
+# Filters with fixed settings; anything else falls through to the tunable deep filter
+FIXED_FILTERS = {"robot", "radio", "echo", "bass", "room", "hall"}
+FILTERS = FIXED_FILTERS | {"deep"}
+
+
+def known_filter(filter_type: str) -> str:
+    """`filter_type` if it is a filter we have, else "deep" (what it would be rendered with)"""
+    return filter_type if filter_type in FILTERS else "deep"
+
+
+class VoiceParams(NamedTuple):
+    """Hashable parameter set, used directly as a cache / batch key"""
+    pitch: int
+    bass: int
+    reverb: float
+    speed: float
+
+    def as_dict(self) -> dict:
+        return self._asdict()
+
+
+def quantise(name: str, value) -> float:
+    """Clamp `value` to the parameter's range and snap it to the nearest step"""
+    spec = PARAM_SPECS[name]
+    value = min(max(float(value), spec.minimum), spec.maximum)
+    steps = round((value - spec.minimum) / spec.step)
+    value = spec.minimum + steps * spec.step
+    if float(spec.step).is_integer():
+        return int(round(value))
+    # Rounding keeps 0.1 + 0.05 from becoming a distinct 0.15000000000000002 key
+    return round(value, 4)
+
+
+def default_params() -> VoiceParams:
+    return VoiceParams(
+        pitch=quantise("pitch", Config.VOICE_PITCH_SHIFT),
+        bass=quantise("bass", Config.VOICE_BASS_BOOST),
+        reverb=quantise("reverb", Config.VOICE_REVERB),
+        speed=quantise("speed", Config.VOICE_SPEED),
+    )
+
+
+def params_from_user(user: Optional[dict]) -> VoiceParams:
+    """Resolve a user's stored preset, falling back to the Config defaults"""
+    stored = (user or {}).get("voice_params") or {}
+    defaults = default_params()
+    return VoiceParams(**{
+        name: quantise(name, stored.get(name, getattr(defaults, name)))
+        for name in PARAM_SPECS
+    })
+
+
+def params_for_filter(filter_type: str, params: VoiceParams) -> Optional[VoiceParams]:
+    """Drop params a filter ignores, so its cache and batch keys don't fragment"""
+    return None if filter_type in FIXED_FILTERS else params
+
+
+def step_param(params: VoiceParams, name: str, direction: int) -> VoiceParams:
+    """Move one parameter up (+1) or down (-1) by a single step"""
+    spec = PARAM_SPECS[name]
+    value = getattr(params, name) + direction * spec.step
+    return params._replace(**{name: quantise(name, value)})
+
+
+def format_param(name: str, value) -> str:
+    spec = PARAM_SPECS[name]
+    if name == "reverb":
+        return f"{value:.0%}"
+    if isinstance(value, int):
+        return f"{value:+d}{spec.unit}" if name == "pitch" else f"{value}{spec.unit}"
+    return f"{value:.2f}{spec.unit}"
@@ -2,138 +2,306 @@
 Instagram style voice processor
 """
 import os
+import time
+import random
+import asyncio
+import logging
+from typing import List, Optional, Tuple, Union
+
+import aiohttp
 import numpy as np
 import librosa
-import soundfile as sf
-from pydub import AudioSegment
-import tempfile
 from scipy import signal
+from aiogram.utils.exceptions import NetworkError, RetryAfter
 from config import Config
+from utils.transcoder import transcoder
+from utils.dsp_kernels import (
+    as_float32, butter_sos, normalize_, ring_modulate_, add_noise_, feedback_echo_
+)
+from utils.convolution import reverb_
+from utils.vad import trim_silence
+from utils.spectral import spectral_chain, bass_shelf, noise_gate
+from utils.voice_params import FIXED_FILTERS, VoiceParams, default_params, known_filter
+from utils.quality import QualityTier, FULL_QUALITY
+from utils.metrics import metrics, FILTER_SECONDS, DSP_CPU_SECONDS, OUTPUT_BYTES
+from utils.temp_storage import sweep_directory, temp_storage
+
+logger = logging.getLogger(__name__)
 
 class VoiceProcessor:
+    FILTERS = ("deep",) + tuple(sorted(FIXED_FILTERS))
+
     def __init__(self):
-        self.temp_dir = "temp_voices"
-        os.makedirs(self.temp_dir, exist_ok=True)
+        self.temp_dir = temp_storage.root
+        self.sample_rate = FULL_QUALITY.sample_rate
         
-    async def download_voice_note(self, file_id, bot):
-        """Download voice note from Telegram"""
-        try:
-            file = await bot.get_file(file_id)
-            temp_path = os.path.join(self.temp_dir, f"voice_{file_id}.ogg")
-            await file.download(destination_file=temp_path)
-            return temp_path
-        except Exception as e:
-            print(f"Download error: {e}")
-            return None
-            
+    async def download_and_decode(self, file_id, bot,
+                                  sample_rate: Optional[int] = None) -> Optional[Tuple[np.ndarray, int]]:
+        """Stream a voice note from Telegram straight into the decoder"""
+        sample_rate = sample_rate or self.sample_rate
+        retries = Config.DOWNLOAD_RETRIES
+        for attempt in range(retries + 1):
+            try:
+                with metrics.span("get_file"):
+                    file = await bot.get_file(file_id)
+                with metrics.span("download_decode"):
+                    y = await transcoder.decode_stream(self._stream_file(bot, file.file_path), sample_rate)
+                return y, sample_rate
+                
+            except (RetryAfter, NetworkError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+                permanent = isinstance(e, aiohttp.ClientResponseError) and e.status < 500 and e.status != 429
+                if permanent or attempt == retries:
+                    logger.error("Download error: %s", e)
+                    return None
+                if isinstance(e, RetryAfter):
+                    delay = e.timeout
+                else:
+                    delay = Config.DOWNLOAD_BACKOFF * (2 ** attempt) * random.uniform(0.8, 1.2)
+                logger.warning("Download attempt %d failed (%s), retrying in %.1fs", attempt + 1, e, delay)
+                await asyncio.sleep(delay)
+                
+            except Exception as e:
+                logger.error("Download error: %s", e)
+                return None
+                
+    async def _stream_file(self, bot, file_path: str):
+        """Yield file chunks over the bot's own aiohttp session"""
+        session = await bot.get_session()
+        timeout = aiohttp.ClientTimeout(total=Config.DOWNLOAD_TIMEOUT)
+        received = 0
+        async with session.get(bot.get_file_url(file_path), timeout=timeout) as response:
+            response.raise_for_status()
+            async for chunk in response.content.iter_chunked(Config.DOWNLOAD_CHUNK_SIZE):
+                received += len(chunk)
+                # file_size from the update is advisory; enforce the cap on the wire too
+                if received > Config.MAX_VOICE_SIZE:
+                    raise ValueError("voice note exceeds MAX_VOICE_SIZE")
+                yield chunk
+                
     async def convert_to_deep_voice(self, input_path: str, filter_type: str = "deep"):
         """Apply Instagram deep voice filter"""
         try:
-            # Convert to WAV if needed
-            if input_path.endswith('.ogg'):
-                audio = AudioSegment.from_ogg(input_path)
-                wav_path = input_path.replace('.ogg', '.wav')
-                audio.export(wav_path, format='wav')
-            else:
-                wav_path = input_path
-                
-            # Load audio
-            y, sr = librosa.load(wav_path, sr=44100)
+            with metrics.span("decode"):
+                y, sr = self._decode(input_path)
+
+            base, _ = os.path.splitext(input_path)
+            return self._render(y, sr, filter_type, f"{base}_processed.ogg")
             
-            # Apply selected filter
-            if filter_type == "deep":
-                y = self._apply_instagram_filter(y, sr)
-            elif filter_type == "robot":
-                y = self._apply_robot_filter(y, sr)
-            elif filter_type == "radio":
-                y = self._apply_radio_filter(y, sr)
-            elif filter_type == "echo":
-                y = self._apply_echo_filter(y, sr)
-            elif filter_type == "bass":
-                y = self._apply_bass_boost(y, sr)
-            else:
-                y = self._apply_instagram_filter(y, sr)  # Default
-                
-            # Save processed audio
-            output_wav = wav_path.replace('.wav', '_processed.wav')
-            sf.write(output_wav, y, sr)
+        except Exception as e:
+            logger.exception("Voice processing error: %s", e)
+            return input_path  # Return original if fails
+            
+    def _render(self, y, sr, filter_type: str, output_path: str,
+                params: Optional[VoiceParams] = None, tier: Optional[QualityTier] = None) -> str:
+        """DSP + encode, returning the OGG path"""
+        result = self.render_batch([y], sr, filter_type, [output_path], params, tier)[0]
+        if isinstance(result, Exception):
+            raise result
+        return result
+        
+    def render_batch(self, signals: List[np.ndarray], sr: int, filter_type: str,
+                     output_paths: List[str], params: Optional[VoiceParams] = None,
+                     tier: Optional[QualityTier] = None) -> List[Union[str, Exception]]:
+        """
+        DSP several same-filter notes in one vectorised call, then encode each
+        (blocking). A note that fails to encode gets its exception in place
+        of a path, so it doesn't fail the rest of the batch.
+        """
+        tier = tier or FULL_QUALITY
+        # Used as a metric label, so unknown names must not each get a series
+        filter_type = known_filter(filter_type)
+        if sr > tier.sample_rate:
+            # Notes decoded before a downgrade (replays) are brought down to the tier's rate
+            with metrics.span("resample"):
+                signals = [
+                    librosa.resample(y, orig_sr=sr, target_sr=tier.sample_rate, res_type="soxr_hq")
+                    for y in signals
+                ]
+            sr = tier.sample_rate
             
-            # Convert to OGG for Telegram
-            audio = AudioSegment.from_wav(output_wav)
-            output_ogg = output_wav.replace('.wav', '.ogg')
-            audio.export(output_ogg, format='ogg')
+        if Config.VAD_ENABLED:
+            # Silence costs as much pitch shifting as speech does
+            with metrics.span("vad"):
+                signals = [self._trim(y, sr) for y in signals]
+                
+        with metrics.span("dsp"), FILTER_SECONDS.time(filter=filter_type):
+            cpu_start = time.thread_time()
+            outputs = self.apply_filter_batch(signals, sr, filter_type, params, tier)
+            DSP_CPU_SECONDS.inc(time.thread_time() - cpu_start, filter=filter_type)
+
+        results = []
+        for y, output_path in zip(outputs, output_paths):
+            try:
+                with metrics.span("encode"):
+                    results.append(self._encode(y, sr, output_path))
+            except Exception as e:
+                logger.error("Encoding %s failed: %s", output_path, e)
+                results.append(e)
+        return results
+        
+    def apply_filter_batch(self, signals: List[np.ndarray], sr: int, filter_type: str,
+                           params: Optional[VoiceParams] = None,
+                           tier: Optional[QualityTier] = None) -> List[np.ndarray]:
+        """
+        Zero-pad notes into a (notes, samples) array and run the filter once:
+        sosfilt, the kernels and librosa's STFT stages all work along the last
+        axis. Each result is then cut back to its own (possibly stretched) length.
+        """
+        if len(signals) == 1:
+            return [self._apply_filter(signals[0], sr, filter_type, params, tier)]
             
-            # Cleanup
-            self.cleanup_file(wav_path)
-            self.cleanup_file(output_wav)
+        lengths = [len(y) for y in signals]
+        batch = np.zeros((len(signals), max(lengths)), dtype=np.float32)
+        for row, y in zip(batch, signals):
+            row[:len(y)] = y
             
-            return output_ogg
+        out = self._apply_filter(batch, sr, filter_type, params, tier)
+        # Time stretching scales every row by the same factor
+        scale = out.shape[-1] / batch.shape[-1]
+        return [out[i, :int(round(n * scale))] for i, n in enumerate(lengths)]
             
-        except Exception as e:
-            print(f"Voice processing error: {e}")
-            return input_path  # Return original if fails
+    def _trim(self, y, sr):
+        """Drop leading/trailing silence (and long pauses, if configured)"""
+        return trim_silence(
+            y, sr,
+            threshold_db=Config.VAD_THRESHOLD_DB,
+            padding_ms=Config.VAD_PADDING_MS,
+            max_pause=Config.VAD_MAX_PAUSE
+        )
+        
+    def _decode(self, input_path: str):
+        """Decode a voice note to a mono float32 signal at 44.1 kHz, without a WAV round trip"""
+        return transcoder.decode_file(input_path, self.sample_rate), self.sample_rate
+        
+    def _apply_filter(self, y, sr, filter_type: str, params: Optional[VoiceParams] = None,
+                      tier: Optional[QualityTier] = None):
+        """Apply selected filter (float32 in, float32 out); `params` tune the deep filter"""
+        y = as_float32(y)
+        tier = tier or FULL_QUALITY
+        if filter_type == "deep":
+            y = self._apply_instagram_filter(y, sr, params, tier)
+        elif filter_type == "robot":
+            y = self._apply_robot_filter(y, sr, tier)
+        elif filter_type == "radio":
+            y = self._apply_radio_filter(y, sr)
+        elif filter_type == "echo":
+            y = self._apply_echo_filter(y, sr)
+        elif filter_type == "bass":
+            y = self._apply_bass_boost(y, sr)
+        elif filter_type == "room":
+            y = self._apply_room_filter(y, sr)
+        elif filter_type == "hall":
+            y = self._apply_hall_filter(y, sr)
+        else:
+            y = self._apply_instagram_filter(y, sr, params, tier)  # Default
+        return as_float32(y)
+        
+    def _encode(self, y, sr, output_path: str) -> str:
+        """Encode processed audio to an Opus voice note for Telegram"""
+        report = transcoder.encode(
+            y, sr, output_path,
+            bitrate_kbps=Config.VOICE_OPUS_BITRATE,
+            frame_ms=Config.VOICE_OPUS_FRAME_MS,
+            complexity=Config.VOICE_OPUS_COMPLEXITY
+        )
+        OUTPUT_BYTES.observe(report["bytes"])
+        logger.debug(
+            "Encoded %.1fs of audio in %.0fms (%d bytes)",
+            len(y) / sr, report["seconds"] * 1000, report["bytes"]
+        )
+        return output_path
             
-    def _apply_instagram_filter(self, y, sr):
+    def _apply_instagram_filter(self, y, sr, params: Optional[VoiceParams] = None,
+                                tier: QualityTier = FULL_QUALITY):
         """Instagram trending deep voice"""
-        # Pitch shift
-        y = librosa.effects.pitch_shift(
-            y, sr=sr, 
-            n_steps=Config.VOICE_PITCH_SHIFT,
-            bins_per_octave=24
+        params = params or default_params()
+        n = y.shape[-1]
+        
+        # Pitch shift = stretch by pitch_rate, then resample back by the same
+        # factor (as librosa.effects.pitch_shift does), so both the pitch and
+        # tempo changes fold into one phase-vocoder pass over one STFT. Cheap
+        # tiers skip the stretch and keep the resample's slowdown.
+        pitch_rate = 2.0 ** (-params.pitch / 24)
+        stretch = (pitch_rate if tier.phase_vocoder else 1.0) * (params.speed if tier.time_stretch else 1.0)
+        stages = []
+        if Config.SPECTRAL_GATE_DB > 0:
+            stages.append(noise_gate(Config.SPECTRAL_GATE_DB, Config.SPECTRAL_GATE_REDUCTION_DB))
+        if params.bass:
+            # Frequencies here end up divided by pitch_rate after the resample
+            stages.append(bass_shelf(sr, tier.n_fft, 200 * pitch_rate, params.bass / 20))
+            
+        y = spectral_chain(
+            y, sr,
+            n_fft=tier.n_fft,
+            hop_length=tier.hop_length,
+            stages=stages,
+            stretch=stretch
         )
+        if params.pitch:
+            y = librosa.resample(y, orig_sr=sr / pitch_rate, target_sr=sr, res_type="soxr_hq")
+            y = librosa.util.fix_length(y, size=int(round(n * pitch_rate / stretch)), axis=-1)
         
-        # Time stretch
-        y = librosa.effects.time_stretch(y, rate=Config.VOICE_SPEED)
-        
-        # Bass boost
-        sos = signal.butter(4, 200, 'lowpass', fs=sr, output='sos')
-        y_bass = signal.sosfilt(sos, y)
-        y = y + (y_bass * (Config.VOICE_BASS_BOOST / 20))
+        # Reverb
+        y = as_float32(y)
+        reverb_(y, sr, params.reverb)
         
         # Normalize
-        y = librosa.util.normalize(y)
-        
-        return y
+        return normalize_(y)
         
-    def _apply_robot_filter(self, y, sr):
+    def _apply_robot_filter(self, y, sr, tier: QualityTier = FULL_QUALITY):
         """Robot voice effect"""
-        y = librosa.effects.pitch_shift(y, sr=sr, n_steps=-3)
+        y = librosa.effects.pitch_shift(y, sr=sr, n_steps=-3, n_fft=tier.n_fft, hop_length=tier.hop_length)
         
         # Ring modulation
-        t = np.arange(len(y)) / sr
-        modulator = np.sin(2 * np.pi * 50 * t)
-        y = y * (1 + 0.3 * modulator)
+        y = as_float32(y)
+        ring_modulate_(y, sr, freq=50, depth=0.3)
         
-        return librosa.util.normalize(y)
+        return normalize_(y)
         
     def _apply_radio_filter(self, y, sr):
         """AM radio effect"""
-        # Bandpass filter
-        sos = signal.butter(4, [300, 3000], 'bandpass', fs=sr, output='sos')
-        y = signal.sosfilt(sos, y)
+        # Bandpass filter (sosfilt allocates its output, everything after is in place)
+        sos = butter_sos(4, (300, 3000), 'bandpass', sr)
+        y = signal.sosfilt(sos, as_float32(y))
         
         # Add noise
-        noise = np.random.normal(0, 0.005, len(y))
-        y = y * 0.9 + noise * 0.1
+        y *= np.float32(0.9)
+        add_noise_(y, std=0.005 * 0.1)
         
-        return librosa.util.normalize(y)
+        return normalize_(y)
         
     def _apply_echo_filter(self, y, sr):
         """Echo effect"""
-        delay = int(0.3 * sr)  # 300ms delay
-        delay_signal = np.zeros_like(y)
-        delay_signal[delay:] = y[:-delay] * 0.5
-        y = y + delay_signal
+        # 300ms feedback echo: repeats at 0.5, 0.25, 0.125...
+        y = as_float32(y)
+        feedback_echo_(y, delay=int(0.3 * sr), feedback=0.5)
         
-        return librosa.util.normalize(y)
+        return normalize_(y)
         
     def _apply_bass_boost(self, y, sr):
         """Bass boost effect"""
-        sos = signal.butter(4, 150, 'lowpass', fs=sr, output='sos')
+        y = as_float32(y)
+        sos = butter_sos(4, 150, 'lowpass', sr)
         y_bass = signal.sosfilt(sos, y)
-        y = y * 0.7 + y_bass * 0.3
+        y *= np.float32(0.7)
+        y_bass *= np.float32(0.3)
+        y += y_bass
         
-        return librosa.util.normalize(y)
+        return normalize_(y)
+        
+    def _apply_room_filter(self, y, sr):
+        """Small room ambience"""
+        y = as_float32(y)
+        reverb_(y, sr, 0.35, ir="room")
+        
+        return normalize_(y)
+        
+    def _apply_hall_filter(self, y, sr):
+        """Concert hall reverb"""
+        y = as_float32(y)
+        reverb_(y, sr, 0.5, ir="hall")
+        
+        return normalize_(y)
         
     def cleanup_file(self, file_path: str):
         """Delete temporary file"""
@@ -144,9 +312,5 @@ class VoiceProcessor:
             pass
             
     def cleanup_all(self):
-        """Cleanup all temp files"""
-        for file in os.listdir(self.temp_dir):
-            try:
-                os.remove(os.path.join(self.temp_dir, file))
-            except:
-                pass
+        """Cleanup all temp files, including job directories and the PCM spill (blocking)"""
+        sweep_directory(self.temp_dir, 0)